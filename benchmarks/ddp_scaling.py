@@ -0,0 +1,81 @@
+"""
+Scaling efficiency of CPU data-parallel training from 1 to N processes.
+
+Runs a training script under torchrun once per process count and parses the
+throughput it prints ("... (1234 tokens/s, ..." or "... (56.7 pairs/s, ..."):
+
+    python -m benchmarks.ddp_scaling --processes 1 2 4 8 -- \\
+        src/models/rlhf_train_reward_model.py --prefs models/rlhf/preferences.jsonl --batch_size 8
+
+Arguments after `--` go to the training script. Each process gets
+cores / processes intra-op threads unless the script is given `--threads`.
+Efficiency is throughput(N) / (N * throughput(1)); the per-process batch
+stays fixed, so the effective batch grows with N.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+THROUGHPUT = re.compile(r"\(([\d.]+) (tokens|pairs)/s")
+
+
+def run(processes: int, script_args: List[str]) -> Optional[Dict]:
+    with tempfile.TemporaryDirectory() as scratch:
+        command = [sys.executable, "-m", "torch.distributed.run", "--standalone", f"--nproc_per_node={processes}",
+                   *script_args]
+        # Keep checkpoints and models from the runs out of the real output dirs
+        if "--run_dir" not in script_args:
+            command += ["--run_dir", scratch]
+        started = time.time()
+        result = subprocess.run(command, capture_output=True, text=True)
+        wall = time.time() - started
+    match = THROUGHPUT.search(result.stdout)
+    if result.returncode != 0 or match is None:
+        print(result.stdout[-2000:] + result.stderr[-2000:], file=sys.stderr)
+        return None
+    return {"processes": processes, "throughput": float(match.group(1)), "unit": match.group(2) + "/s",
+            "wall_seconds": wall}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure CPU data-parallel training scaling.")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--json", type=str, default=None, help="Also write results to this file")
+    parser.add_argument("script_args", nargs=argparse.REMAINDER, help="-- script.py [script args]")
+    args = parser.parse_args()
+    script_args = args.script_args[1:] if args.script_args[:1] == ["--"] else args.script_args
+    if not script_args:
+        parser.error("give the training script and its arguments after --")
+
+    cores = os.cpu_count() or 1
+    print(f"{cores} CPU cores")
+    results = []
+    for processes in sorted(set(args.processes)):
+        if processes > cores:
+            print(f"note: {processes} processes on {cores} cores will oversubscribe the CPU", file=sys.stderr)
+        result = run(processes, script_args)
+        if result is None:
+            print(f"run with {processes} process(es) failed", file=sys.stderr)
+            sys.exit(1)
+        results.append(result)
+
+    base = results[0]
+    print(f"\n{'processes':>9s} {'throughput':>18s} {'speedup':>8s} {'efficiency':>10s}")
+    for result in results:
+        speedup = result["throughput"] / base["throughput"]
+        result["efficiency"] = speedup * base["processes"] / result["processes"]
+        print(f"{result['processes']:9d} {result['throughput']:12.1f} {result['unit']:>5s} "
+              f"{speedup:7.2f}x {result['efficiency']:10.0%}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"cores": cores, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
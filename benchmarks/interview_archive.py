@@ -0,0 +1,92 @@
+"""
+Build an interview archive spanning several months and time typical report queries.
+
+    python -m benchmarks.interview_archive --sessions 50000 --days 180
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from src.analytics.archive import InterviewArchive, query_interviews, query_turns, report
+from src.scoring.voice_scorer import voice_scorer
+
+POSITIONS = ['Software Engineer', 'Data Scientist', 'Product Manager', 'DevOps Engineer', 'Designer']
+ANSWERS = [
+    "I built a REST API in Python with a Postgres database and deployed it with Docker on AWS.",
+    "We had a production issue, so I debugged the logs, found the problem and wrote a test for the fix.",
+    "I enjoy mentoring; I led a team of four and we improved our release process.",
+    "I designed the data pipeline and optimized the slowest queries, which I found fascinating.",
+]
+
+
+def build(directory: str, sessions: int, days: int, turns: int, seed: int = 0) -> float:
+    """Archive synthetic sessions ending over the last `days` days; returns seconds taken"""
+    rng = random.Random(seed)
+    archive = InterviewArchive(directory, scorer=voice_scorer.score_interview_session, batch_size=2000)
+    now = time.time()
+    # Sessions expire in time order, so batches mostly fall within one day
+    endings = sorted(now - rng.random() * days * 86400 for _ in range(sessions))
+    started = time.perf_counter()
+    for i, ended in enumerate(endings):
+        history = []
+        for n in range(turns):
+            history.append({'type': 'ai', 'content': f"Question {n}?", 'timestamp': ended - 60 * (turns - n)})
+            history.append({'type': 'candidate', 'content': rng.choice(ANSWERS), 'timestamp': ended - 30 * (turns - n)})
+        archive.archive_session(f"session-{i:07d}", {
+            'session_id': f"session-{i:07d}",
+            'data': {'candidate_name': f"Candidate {i}", 'position_applied': rng.choice(POSITIONS),
+                     'start_time': ended - 60 * turns},
+            'created_at': ended - 60 * turns,
+            'last_activity': ended,
+            'questions_asked': [{'question': turn['content']} for turn in history if turn['type'] == 'ai'],
+            'responses_received': [{'message': turn['content']} for turn in history if turn['type'] == 'candidate'],
+            'conversation_history': history
+        })
+    archive.close()
+    return time.perf_counter() - started
+
+
+def timed(label: str, query):
+    started = time.perf_counter()
+    table = query()
+    print(f"{label:55s} {table.num_rows:8d} rows in {time.perf_counter() - started:.3f}s")
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark interview archive queries.")
+    parser.add_argument("--sessions", type=int, default=50000)
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--turns", type=int, default=6, help="Question/answer pairs per session")
+    parser.add_argument("--dir", type=str, default=None, help="Archive directory (default: temporary)")
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp(prefix="interview-archive-")
+    try:
+        elapsed = build(directory, args.sessions, args.days, args.turns)
+        size = sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(directory) for name in names)
+        print(f"archived {args.sessions} sessions in {elapsed:.1f}s, {size / 1e6:.1f} MB on disk")
+
+        since = time.strftime('%Y-%m-%d', time.gmtime(time.time() - 30 * 86400))
+        scores = timed("all interviews, score columns only",
+                       lambda: query_interviews(directory, columns=['position_applied', 'session_score']))
+        median = sorted(scores.column('session_score').to_pylist())[scores.num_rows // 2]
+        top = timed(f"Software Engineer, last 30 days, score >= {median:.2f}",
+                    lambda: query_interviews(directory, position='Software Engineer', since=since, min_score=median))
+        timed("turns of those interviews, without transcripts",
+              lambda: query_turns(directory, since=since, session_ids=top.column('session_id').to_pylist()))
+        table = timed("per-position report over all months",
+                      lambda: query_interviews(directory, columns=['session_id', 'position_applied', 'session_score']))
+        for row in report(table):
+            print(f"  {row['position_applied']:20s} {row['session_id_count']:7d}  mean {row['session_score_mean']:.2f}")
+    finally:
+        if args.dir is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Simulate concurrent candidates running full interviews against the API.
+
+Each candidate starts an interview, answers `--turns` questions with text built
+from data/samples, then fetches the summary and scores the session. By default
+the app runs in-process over an ASGI transport with deterministic fakes in place
+of the chatbot and TTS engine, so the run measures the service itself and is
+repeatable in CI:
+
+    python -m benchmarks.load_test --candidates 50 --interviews 500 --turns 8 \\
+        --budget chat:p95=50 --budget score:p99=200
+
+`--url http://localhost:8000` drives a running server instead (its chatbot and
+TTS are whatever it was started with). The exit status is 1 when any request
+fails or a latency budget is exceeded.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import re
+import sys
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'samples')
+ENDPOINTS = ('start', 'chat', 'summary', 'score')
+POSITIONS = ['Software Engineer', 'Data Scientist', 'Product Manager', 'DevOps Engineer']
+
+
+class FakeChatbot:
+    """Deterministic stand-in for InterviewChatbot; `delay` simulates response matching"""
+
+    RESPONSES = [
+        "That's great! Can you tell me more about the technical challenges you faced?",
+        "Excellent! How did you measure the impact of that work?",
+        "Interesting. What would you do differently if you started that project today?",
+        "Thank you. How do you usually work with other teams on projects like that?",
+    ]
+
+    def __init__(self, delay: float = 0.0):
+        # app.py reports readiness from `interview_chatbot.chatbot`
+        self.chatbot = self
+        self.trained = True
+        self.name = "FakeInterviewBot"
+        self.delay = delay
+
+    def get_response(self, message: str, session_id: str = None) -> Dict:
+        if self.delay:
+            time.sleep(self.delay)
+        response = self.RESPONSES[zlib.crc32(message.encode('utf-8')) % len(self.RESPONSES)]
+        return {"response": response, "confidence": 0.8, "session_id": session_id, "tts_enabled": True}
+
+    def get_status(self) -> Dict:
+        return {"initialized": True, "trained": True, "name": self.name, "tts_available": True}
+
+
+class FakeTTS:
+    """Silent stand-in for TTSModule that only counts what it was asked to say"""
+
+    def __init__(self):
+        self.engine = None
+        self.initialized = True
+        self.spoken = 0
+
+    def speak(self, text: str) -> bool:
+        self.spoken += 1
+        return True
+
+    def stop(self):
+        pass
+
+    def set_voice_rate(self, rate: int):
+        pass
+
+    def set_volume(self, volume: float):
+        pass
+
+    def is_available(self) -> bool:
+        return True
+
+
+def install_fakes(chat_delay: float = 0.0):
+    """Swap the app's chatbot and TTS engine for deterministic fakes"""
+    import src.api.app as app_module
+    import src.core.chatbot as chatbot_module
+    tts = FakeTTS()
+    app_module.interview_chatbot = FakeChatbot(chat_delay)
+    app_module.tts_module = tts
+    chatbot_module.tts_module = tts
+
+
+def load_answers(directory: str = SAMPLES_DIR) -> List[str]:
+    """Answer fragments from the sample resume and job description"""
+    fragments = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.txt'):
+            continue
+        with open(os.path.join(directory, name), encoding='utf-8') as f:
+            for line in f:
+                line = re.sub(r'^[-*•\s]+', '', line).strip()
+                # Headings, contact details and short labels are not answer material
+                if len(line.split()) >= 5 and not line.endswith(':'):
+                    fragments.append(line.rstrip('.'))
+    if not fragments:
+        raise ValueError(f"No answer text found in {directory}")
+    return fragments
+
+
+def make_answer(rng: random.Random, fragments: List[str]) -> str:
+    """An answer of one to three resume / job description sentences"""
+    parts = rng.sample(fragments, min(len(fragments), rng.randint(1, 3)))
+    return '. '.join(parts) + '.'
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of sorted `values`"""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def parse_budget(text: str) -> Tuple[str, float, float]:
+    """'chat:p95=50' -> ('chat', 95.0, 0.050)"""
+    match = re.fullmatch(r'(\w+):p(\d+(?:\.\d+)?)=(\d+(?:\.\d+)?)', text)
+    if not match or match.group(1) not in ENDPOINTS:
+        raise argparse.ArgumentTypeError(f"Expected ENDPOINT:pNN=MS with ENDPOINT in {ENDPOINTS}, got {text!r}")
+    return match.group(1), float(match.group(2)), float(match.group(3)) / 1000
+
+
+class LoadTest:
+    """Drives interviews through an httpx client and records per-endpoint latency"""
+
+    def __init__(self, client: httpx.AsyncClient, fragments: List[str], turns: int, seed: int = 0):
+        self.client = client
+        self.fragments = fragments
+        self.turns = turns
+        self.rng = random.Random(seed)
+        self.latencies: Dict[str, List[float]] = {endpoint: [] for endpoint in ENDPOINTS}
+        self.errors: Dict[str, int] = {endpoint: 0 for endpoint in ENDPOINTS}
+        self.first_error: Optional[str] = None
+
+    async def _request(self, endpoint: str, method: str, path: str, **kwargs) -> Optional[Dict]:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, **kwargs)
+            self.latencies[endpoint].append(time.perf_counter() - started)
+            if response.status_code == 200:
+                return response.json()
+            error = f"{method} {path}: HTTP {response.status_code} {response.text[:200]}"
+        except httpx.HTTPError as e:
+            error = f"{method} {path}: {e!r}"
+        self.errors[endpoint] += 1
+        self.first_error = self.first_error or error
+        return None
+
+    async def interview(self, number: int):
+        started = await self._request('start', 'POST', '/api/v1/interviews/start', json={
+            'candidate_name': f"Candidate {number}",
+            'position_applied': self.rng.choice(POSITIONS),
+            'resume_text': "",
+            'job_description': ""
+        })
+        if started is None:
+            return
+        session_id = started['session_id']
+        for _ in range(self.turns):
+            answer = make_answer(self.rng, self.fragments)
+            if await self._request('chat', 'POST', '/api/v1/interviews/chat',
+                                   json={'session_id': session_id, 'message': answer}) is None:
+                return
+        await self._request('summary', 'GET', f'/api/v1/interviews/{session_id}/summary')
+        await self._request('score', 'POST', f'/api/v1/interviews/{session_id}/score')
+
+    async def run(self, interviews: int, concurrency: int) -> float:
+        """Run `interviews` interviews, `concurrency` at a time; returns wall seconds"""
+        remaining = iter(range(interviews))
+
+        async def candidate():
+            for number in remaining:
+                await self.interview(number)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(candidate() for _ in range(concurrency)))
+        return time.perf_counter() - started
+
+    def report(self, elapsed: float) -> Dict:
+        endpoints = {}
+        for endpoint in ENDPOINTS:
+            values = sorted(self.latencies[endpoint])
+            endpoints[endpoint] = {
+                'requests': len(values),
+                'errors': self.errors[endpoint],
+                'p50': percentile(values, 50),
+                'p95': percentile(values, 95),
+                'p99': percentile(values, 99),
+                'max': values[-1] if values else 0.0
+            }
+        requests = sum(row['requests'] for row in endpoints.values())
+        return {'elapsed': elapsed, 'requests': requests, 'requests_per_second': requests / elapsed,
+                'endpoints': endpoints}
+
+
+def check_budgets(latencies: Dict[str, List[float]], budgets: List[Tuple[str, float, float]]) -> List[str]:
+    violations = []
+    for endpoint, q, limit in budgets:
+        values = sorted(latencies[endpoint])
+        observed = percentile(values, q)
+        if observed > limit:
+            violations.append(f"{endpoint} p{q:g} {observed * 1000:.1f} ms > budget {limit * 1000:.1f} ms")
+    return violations
+
+
+async def run(args) -> int:
+    fragments = load_answers(args.samples)
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        if not args.real_backends:
+            install_fakes(args.chat_delay / 1000)
+        from src.api.app import app
+        logging.getLogger().setLevel(logging.WARNING)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://load-test",
+                                   timeout=args.timeout)
+
+    async with client:
+        test = LoadTest(client, fragments, args.turns, args.seed)
+        elapsed = await test.run(args.interviews or args.candidates, args.candidates)
+
+    report = test.report(elapsed)
+    print(f"{args.interviews or args.candidates} interviews, {args.candidates} concurrent, {args.turns} answers each: "
+          f"{report['requests']} requests in {elapsed:.2f}s ({report['requests_per_second']:.1f} req/s)")
+    print(f"{'endpoint':10s} {'requests':>9s} {'errors':>7s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'max ms':>9s}")
+    for endpoint, row in report['endpoints'].items():
+        print(f"{endpoint:10s} {row['requests']:9d} {row['errors']:7d} {row['p50'] * 1000:9.2f} "
+              f"{row['p95'] * 1000:9.2f} {row['p99'] * 1000:9.2f} {row['max'] * 1000:9.2f}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    failures = check_budgets(test.latencies, args.budget)
+    if test.first_error:
+        failures.insert(0, f"{sum(test.errors.values())} failed requests, first: {test.first_error}")
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the interview API with concurrent candidates.")
+    parser.add_argument("--candidates", type=int, default=20, help="Concurrent candidates")
+    parser.add_argument("--interviews", type=int, default=0, help="Total interviews (default: one per candidate)")
+    parser.add_argument("--turns", type=int, default=6, help="Answers per interview")
+    parser.add_argument("--url", type=str, default=None, help="Drive a running server instead of the in-process app")
+    parser.add_argument("--real-backends", action="store_true",
+                        help="In-process: keep the real chatbot and TTS engine instead of fakes")
+    parser.add_argument("--chat-delay", type=float, default=0.0, help="Simulated chatbot latency (ms) for the fake")
+    parser.add_argument("--budget", type=parse_budget, action="append", default=[],
+                        help="Latency budget ENDPOINT:pNN=MS, e.g. chat:p95=50 (repeatable)")
+    parser.add_argument("--samples", type=str, default=SAMPLES_DIR, help="Directory of answer source texts")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=str, default=None, help="Also write the report to this file")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Measure what a timing span adds to an instrumented call, and the scrape cost.
+
+    python -m benchmarks.metrics_overhead --calls 1000000 --threads 4
+"""
+import argparse
+import threading
+import time
+
+from src.utils.metrics import MetricsRegistry, SPAN_SECONDS, span, timed
+
+
+def noop():
+    return None
+
+
+@timed('benchmark.noop')
+def timed_noop():
+    return None
+
+
+def per_call(function, calls: int) -> float:
+    """Nanoseconds per call"""
+    started = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return (time.perf_counter() - started) / calls * 1e9
+
+
+def with_span():
+    with span('benchmark.span'):
+        return None
+
+
+def contended(calls: int, threads: int) -> float:
+    """Nanoseconds per span when `threads` threads record into the same histogram"""
+    workers = [threading.Thread(target=per_call, args=(timed_noop, calls // threads)) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - started) / calls * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark metrics instrumentation overhead.")
+    parser.add_argument("--calls", type=int, default=1000000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--spans", type=int, default=50, help="Distinct span names to render")
+    args = parser.parse_args()
+
+    baseline = per_call(noop, args.calls)
+    child = SPAN_SECONDS.labels('benchmark.observe')
+    rows = [
+        ("observe() on a resolved child", per_call(lambda: child.observe(0.001), args.calls) - baseline),
+        ("@timed decorator", per_call(timed_noop, args.calls) - baseline),
+        ("with span(name)", per_call(with_span, args.calls) - baseline),
+        (f"@timed, {args.threads} threads", contended(args.calls, args.threads) - baseline),
+    ]
+    print(f"{'':35s} {'overhead per call':>18s}")
+    for label, nanoseconds in rows:
+        print(f"{label:35s} {nanoseconds / 1000:15.2f} µs")
+
+    registry = MetricsRegistry()
+    histogram = registry.histogram('benchmark_seconds', 'Benchmark spans', ('span',))
+    for i in range(args.spans):
+        histogram.labels(f"span-{i}").observe(0.001)
+    started = time.perf_counter()
+    text = registry.render()
+    print(f"render {args.spans} histograms: {(time.perf_counter() - started) * 1000:.2f} ms, {len(text)} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Microbenchmarks for the per-request hot functions, with a saved baseline to
+compare against.
+
+    python -m benchmarks.microbench --save baseline.json
+    # ... change code ...
+    python -m benchmarks.microbench --compare baseline.json --threshold 0.10
+
+Each case runs on synthetic inputs of realistic size. Timings are per call
+(median of `--repeat` runs, each calibrated to last at least `--min-time`).
+Compare mode exits with status 1 when any case is slower than its baseline
+by more than the threshold. Baselines are machine-specific: compare runs from
+the same host.
+"""
+import argparse
+import json
+import logging
+import platform
+import random
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.core.chatbot import interview_chatbot
+from src.core.session_backends import InMemorySessionBackend
+from src.core.session_manager import SessionManager
+from src.scoring.voice_scorer import voice_scorer
+from src.speech_interface.tts_module import tts_module
+
+TABLE_SIZES = (1000, 10000, 100000)
+ANSWER_WORDS = (40, 120, 400)
+SESSION_ANSWERS = (5, 20, 80)
+
+WORDS = ("the a we I my our team project system service data users design build improve test deploy "
+         "because so then when after before with for using into across about experience problem solution "
+         "performance latency release pipeline review feature customer requirement tradeoff approach result").split()
+TECH = ["Python", "SQL", "API", "AWS", "Docker", "Kubernetes", "React", "Node.js", "JSON", "HTTP", "GitHub",
+        "REST", "CI/CD", "PostgreSQL", "Redis", "UI", "ML"]
+
+# A case builds its input once, then returns the zero-argument function to time
+Case = Tuple[str, Callable[[], Callable[[], object]]]
+
+
+def make_text(rng: random.Random, words: int) -> str:
+    """Interview-style answer text with technical terms and sentence breaks"""
+    out = []
+    for i in range(words):
+        out.append(rng.choice(TECH) if rng.random() < 0.08 else rng.choice(WORDS))
+        if i % 14 == 13:
+            out[-1] += '.'
+    return ' '.join(out) + '.'
+
+
+def make_bot_text(rng: random.Random) -> str:
+    """A chatbot reply carrying the markdown and acronyms _clean_text strips"""
+    return (f"**Great answer!** You mentioned {rng.choice(TECH)} and {rng.choice(TECH)}. "
+            f"## Follow-up\nCan you describe how your `{rng.choice(TECH)}` [service](url) handled "
+            f"{make_text(rng, 30)} What would you change about the API design?")
+
+
+def populated_manager(sessions: int, turns: int = 3) -> SessionManager:
+    manager = SessionManager(InMemorySessionBackend())
+    now = time.time()
+    for i in range(sessions):
+        session_id = f"session-{i:07d}"
+        manager.create_session(session_id, {'candidate_name': f"Candidate {i}",
+                                            'position_applied': 'Software Engineer', 'start_time': now})
+        for turn in range(turns):
+            manager.add_chat_turn(session_id, chat_turns(f"Answer {turn} about Python services"),
+                                  response={'message': f"Answer {turn}", 'analysis': {'score': 0.8}, 'timestamp': now},
+                                  question={'question': "Tell me more.", 'timestamp': now, 'type': 'follow_up'})
+    return manager
+
+
+def chat_turns(answer: str) -> List[Dict]:
+    now = time.time()
+    return [{'type': 'candidate', 'content': answer, 'timestamp': now},
+            {'type': 'ai', 'content': "Can you walk me through a project you're proud of?", 'timestamp': now}]
+
+
+def cycling(function: Callable, inputs: List[tuple]) -> Callable[[], Callable[[], object]]:
+    """Case builder calling `function(*args)` on each of `inputs` in turn"""
+    def build():
+        it = _cycle(inputs)
+        return lambda: function(*next(it))
+    return build
+
+
+def cases() -> List[Case]:
+    rng = random.Random(0)
+    found: List[Case] = [
+        ("tts.clean_text[reply]", cycling(tts_module._clean_text, [(make_bot_text(rng),) for _ in range(64)])),
+        ("tts.clean_text[2kB]", cycling(tts_module._clean_text, [(make_text(rng, 350),) for _ in range(16)])),
+    ]
+    for words in ANSWER_WORDS:
+        found.append((f"scorer.score_response[{words} words]",
+                      cycling(voice_scorer.score_response, [(make_text(rng, words),) for _ in range(32)])))
+    for answers in SESSION_ANSWERS:
+        history = []
+        for _ in range(answers):
+            history.extend(chat_turns(make_text(rng, rng.randint(40, 200))))
+        found.append((f"scorer.score_interview_session[{answers} answers]",
+                      cycling(voice_scorer.score_interview_session, [(history,)])))
+
+    replies = [make_text(rng, rng.randint(3, 40)) for _ in range(64)]
+    messages = [make_text(rng, rng.randint(10, 80)) for _ in range(64)]
+    found.append(("chatbot.enhance_response",
+                  cycling(interview_chatbot._enhance_response, list(zip(replies, messages)))))
+    found.append(("chatbot.get_contextual_response",
+                  cycling(interview_chatbot._get_contextual_response, [(message,) for message in messages])))
+
+    for size in TABLE_SIZES:
+        found.extend(session_cases(size))
+    return found
+
+
+def session_cases(size: int) -> List[Case]:
+    state: Dict[str, SessionManager] = {}
+
+    def manager(name: str = 'shared') -> SessionManager:
+        # Built on first use. Cases that leave sessions behind get their own
+        # table, so the shared one keeps `size` sessions whatever --min-time is
+        if name not in state:
+            state[name] = populated_manager(size)
+        return state[name]
+
+    def create():
+        m, counter = manager('create'), iter(range(10 ** 9))
+        return lambda: m.create_session(f"new-{next(counter)}", {'candidate_name': "New", 'start_time': 0})
+
+    def sample(seed: int) -> List[str]:
+        return [f"session-{i:07d}" for i in random.Random(seed).sample(range(size), min(size, 4096))]
+
+    def append():
+        m, it = manager(), _cycle(sample(1))
+        turns = chat_turns("I built the service in Python and measured latency before and after.")
+        return lambda: m.add_chat_turn(next(it), turns, response={'message': "answer", 'timestamp': 0})
+
+    def summary():
+        m, it = manager(), _cycle(sample(2))
+        return lambda: m.get_session_summary(next(it))
+
+    def cleanup():
+        # Each call adds a session that is already idle past the timeout and
+        # expires it, so the shared table stays at `size` live sessions
+        m, counter = manager(), iter(range(10 ** 9))
+
+        def run():
+            session_id = f"expiring-{next(counter)}"
+            m.backend.create(session_id, {'session_id': session_id, 'data': {'candidate_name': "Gone"},
+                                          'created_at': 0.0, 'last_activity': 0.0, 'questions_asked': [],
+                                          'responses_received': [], 'conversation_history': []})
+            m.expiry.schedule(session_id, 0.0)
+            m.cleanup_expired_sessions()
+        return run
+
+    return [(f"session_manager.create_session[{size}]", create),
+            (f"session_manager.add_chat_turn[{size}]", append),
+            (f"session_manager.get_session_summary[{size}]", summary),
+            (f"session_manager.create+expire[{size}]", cleanup)]
+
+
+def _cycle(items):
+    while True:
+        yield from items
+
+
+def measure(function: Callable[[], object], min_time: float, repeat: int) -> Dict[str, float]:
+    """Nanoseconds per call, with loops grown until one run takes at least `min_time`"""
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            function()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        # Aim straight for min_time, growing at most tenfold per step
+        loops = min(loops * 10, max(loops * 2, int(loops * min_time / max(elapsed, 1e-9)) + 1))
+    runs = [elapsed / loops]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(loops):
+            function()
+        runs.append((time.perf_counter() - started) / loops)
+    return {'median_ns': statistics.median(runs) * 1e9, 'min_ns': min(runs) * 1e9, 'loops': loops}
+
+
+def run(selected: List[Case], min_time: float, repeat: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for name, build in selected:
+        results[name] = measure(build(), min_time, repeat)
+        print(f"{name:55s} {_format(results[name]['median_ns']):>12s}", flush=True)
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float) -> List[str]:
+    """Print current vs baseline and return the names of regressed cases"""
+    regressed = []
+    print(f"\n{'case':55s} {'baseline':>12s} {'current':>12s} {'change':>8s}")
+    for name, row in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:55s} {'-':>12s} {_format(row['median_ns']):>12s} {'new':>8s}")
+            continue
+        change = row['median_ns'] / before['median_ns'] - 1
+        flag = ''
+        if change > threshold:
+            regressed.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:55s} {_format(before['median_ns']):>12s} {_format(row['median_ns']):>12s} {change:+8.1%}{flag}")
+    return regressed
+
+
+def _format(nanoseconds: float) -> str:
+    if nanoseconds >= 1e6:
+        return f"{nanoseconds / 1e6:.2f} ms"
+    if nanoseconds >= 1e3:
+        return f"{nanoseconds / 1e3:.2f} us"
+    return f"{nanoseconds:.0f} ns"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark hot functions and track regressions.")
+    parser.add_argument("--filter", type=str, default=None, help="Only run cases whose name contains this")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per timed run")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save", type=str, default=None, help="Write results to this baseline file")
+    parser.add_argument("--compare", type=str, default=None, help="Baseline file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed slowdown, e.g. 0.10 for 10%%")
+    parser.add_argument("--list", action="store_true", help="List case names and exit")
+    args = parser.parse_args()
+
+    # Per-call log records would dominate the smallest cases
+    logging.getLogger().setLevel(logging.WARNING)
+
+    selected = [case for case in cases() if args.filter is None or args.filter in case[0]]
+    if args.list:
+        print('\n'.join(name for name, _ in selected))
+        return
+    baseline: Optional[Dict] = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+
+    results = run(selected, args.min_time, args.repeat)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                       'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                       'min_time': args.min_time, 'repeat': args.repeat, 'results': results}, f, indent=2)
+    if baseline is not None:
+        regressed = compare(results, baseline, args.threshold)
+        if regressed:
+            print(f"\n{len(regressed)} case(s) slower than baseline by more than {args.threshold:.0%}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+CPU latency and throughput of the reward model criterion.
+
+    python -m benchmarks.reward_model --model_dir models/rlhf --concurrency 1 4 16 --max_batch 1 8 32
+
+For each batching setting and number of concurrent callers, every caller
+thread scores distinct answers one `score()` call at a time, as the score
+endpoints do from the asyncio worker threads they run the scorer on. The
+run reports per-call latency and texts/s, then the cost of a cache hit.
+`--max_batch 1` is the unbatched baseline.
+"""
+import argparse
+import random
+import threading
+import time
+from typing import Dict, List
+
+from benchmarks.microbench import make_text
+from src.scoring.reward_model import RewardScorer
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def run(scorer: RewardScorer, texts: List[str], concurrency: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    lock = threading.Lock()
+    shares = [texts[i::concurrency] for i in range(concurrency)]
+
+    def caller(share: List[str]):
+        mine = []
+        for text in share:
+            started = time.perf_counter()
+            scorer.score(text)
+            mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=caller, args=(share,)) for share in shares]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {'p50_ms': percentile(latencies, 0.5) * 1000, 'p95_ms': percentile(latencies, 0.95) * 1000,
+            'texts_per_s': len(texts) / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark reward model scoring on CPU.")
+    parser.add_argument("--model_dir", type=str, default="models/rlhf")
+    parser.add_argument("--texts", type=int, default=512, help="Distinct answers scored per run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--max_batch", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--words", type=int, nargs=2, default=[40, 200], help="Answer length range in words")
+    parser.add_argument("--max_wait_ms", type=float, default=5.0)
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    question = "Tell me about a challenging bug you fixed recently."
+    print(f"{'max_batch':>9s} {'callers':>7s} {'p50':>10s} {'p95':>10s} {'texts/s':>9s}")
+    scorer = None
+    for max_batch in args.max_batch:
+        for concurrency in args.concurrency:
+            # A fresh scorer per run: every text is a cache miss
+            scorer = RewardScorer(args.model_dir, max_batch=max_batch, max_wait_ms=args.max_wait_ms,
+                                  cache_size=args.texts, threads=args.threads)
+            texts = [f"{question}\n{make_text(rng, rng.randint(*args.words))}" for _ in range(args.texts)]
+            scorer.score(texts[0])  # warm up
+            result = run(scorer, texts[1:], concurrency)
+            print(f"{max_batch:9d} {concurrency:7d} {result['p50_ms']:8.2f}ms {result['p95_ms']:8.2f}ms "
+                  f"{result['texts_per_s']:9.1f}", flush=True)
+            scorer.close()
+
+    calls = 10000
+    started = time.perf_counter()
+    for _ in range(calls):
+        scorer.score(texts[1])
+    print(f"\ncache hit: {(time.perf_counter() - started) / calls * 1e6:.1f}us per call")
+
+
+if __name__ == "__main__":
+    main()
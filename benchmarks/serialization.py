@@ -0,0 +1,143 @@
+"""
+Serialization time and bytes on the wire for the hot interview responses.
+
+    python -m benchmarks.serialization --turns 10 100 1000
+
+Payloads are built the way the endpoints build them from a session with the
+given number of conversation turns: a conversation page holding every turn,
+the interview summary and a chat response. Each is encoded three ways:
+
+- `fastapi`: what FastAPI does for a returned dict (`jsonable_encoder`, then
+  `json.dumps`), or for `ChatResponse` (construct the model, dump it,
+  validate it again against the response model, dump it in JSON mode)
+- `stdlib`: `FastJSONResponse` without orjson (compact `json.dumps`)
+- `orjson`: `FastJSONResponse` with orjson
+
+Then the orjson body is gzipped at several levels, which shows the size on
+the wire and what compression costs per response.
+"""
+import argparse
+import gzip
+import json
+import logging
+import random
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from starlette.responses import JSONResponse
+
+from benchmarks.microbench import _format, chat_turns, make_bot_text, make_text, measure
+from src.api.app import ChatResponse
+from src.api.responses import FastJSONResponse, orjson
+from src.core.session_backends import InMemorySessionBackend
+from src.core.session_manager import SessionManager
+
+GZIP_LEVELS = (1, 5, 9)
+
+
+def build_session(manager: SessionManager, session_id: str, turns: int, rng: random.Random):
+    now = time.time()
+    manager.create_session(session_id, {'candidate_name': "Candidate", 'position_applied': 'Software Engineer',
+                                        'start_time': now})
+    # Each exchange adds a candidate turn and an interviewer turn
+    for _ in range(max(1, turns // 2)):
+        answer = make_text(rng, rng.randint(40, 200))
+        exchange = chat_turns(answer)
+        exchange[1]['content'] = make_bot_text(rng)
+        manager.add_chat_turn(session_id, exchange,
+                              response={'message': answer, 'analysis': {'score': 0.8, 'feedback': 'Good response'},
+                                        'timestamp': now},
+                              question={'question': "Tell me more.", 'timestamp': now, 'type': 'follow_up'})
+
+
+def payloads(manager: SessionManager, session_id: str, turns: int) -> Dict[str, Dict[str, Any]]:
+    page = manager.get_conversation_page(session_id, limit=turns)
+    session = manager.get_session(session_id)
+    conversation = session['conversation_history']
+    return {
+        'conversation': {
+            'session_id': session_id,
+            'conversation_history': page['conversation_history'],
+            'questions_asked': page['questions_asked'],
+            'responses_received': page['responses_received'],
+            'next_cursor': page['next_cursor'],
+        },
+        'summary': {
+            'session_id': session_id,
+            'candidate_name': session['data']['candidate_name'],
+            'position_applied': session['data']['position_applied'],
+            'total_questions': len(session['questions_asked']),
+            'total_responses': len(session['responses_received']),
+            'average_score': 80.0,
+            'conversation_turns': len(conversation),
+            'interview_duration': 1234.5,
+            'recommendation': 'hire',
+            'conversation_history': conversation[-10:],
+        },
+        'chat': {
+            'response': conversation[-1]['content'],
+            'next_question': "Thank you for your response. Let me ask you another question about your experience.",
+            'analysis': {'score': 0.8, 'feedback': 'Good response'},
+            'session_summary': manager.get_session_summary(session_id),
+        },
+    }
+
+
+def encoders(name: str, payload: Dict[str, Any]) -> List[Tuple[str, Callable[[], bytes]]]:
+    if name == 'chat':
+        adapter = TypeAdapter(ChatResponse)
+
+        def fastapi_default():
+            model = ChatResponse(**payload)
+            return JSONResponse(adapter.dump_python(adapter.validate_python(model.model_dump()), mode='json')).body
+    else:
+        def fastapi_default():
+            return JSONResponse(jsonable_encoder(payload)).body
+
+    found = [('fastapi', fastapi_default),
+             ('stdlib', lambda: json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))]
+    if orjson is not None:
+        found.append(('orjson', lambda: FastJSONResponse(payload).body))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark response serialization and compression.")
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per timed run")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    rng = random.Random(0)
+    manager = SessionManager(InMemorySessionBackend())
+
+    print(f"{'payload':24s} {'encoder':8s} {'time':>10s} {'speedup':>8s} {'bytes':>10s}")
+    compressed = []
+    for turns in args.turns:
+        session_id = f"session-{turns}"
+        build_session(manager, session_id, turns, rng)
+        for name, payload in payloads(manager, session_id, turns).items():
+            label = f"{name}[{turns} turns]"
+            baseline = None
+            body = b''
+            for encoder, function in encoders(name, payload):
+                body = function()
+                median = measure(function, args.min_time, args.repeat)['median_ns']
+                baseline = baseline or median
+                print(f"{label:24s} {encoder:8s} {_format(median):>10s} {baseline / median:7.1f}x {len(body):10d}",
+                      flush=True)
+            compressed.append((label, body))
+
+    print(f"\n{'payload':24s} {'gzip':>4s} {'time':>10s} {'bytes':>10s} {'ratio':>6s}")
+    for label, body in compressed:
+        for level in GZIP_LEVELS:
+            size = len(gzip.compress(body, compresslevel=level))
+            median = measure(lambda: gzip.compress(body, compresslevel=level), args.min_time, args.repeat)['median_ns']
+            print(f"{label:24s} {level:4d} {_format(median):>10s} {size:10d} {len(body) / size:5.1f}x", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Measure journaling overhead on the chat path and recovery time after a restart.
+
+    python -m benchmarks.session_journal --sessions 100000 --turns 4
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from src.core.session_backends import InMemorySessionBackend
+from src.core.session_journal import SessionJournal, JournaledSessionBackend
+
+
+def populate(backend, sessions: int, turns: int) -> list:
+    """Create sessions and record `turns` chat exchanges each; returns per-exchange latencies"""
+    latencies = []
+    for i in range(sessions):
+        session_id = f"session-{i:07d}"
+        now = time.time()
+        backend.create(session_id, {
+            'session_id': session_id,
+            'data': {'candidate_name': f"Candidate {i}", 'position_applied': 'Software Engineer'},
+            'created_at': now,
+            'last_activity': now,
+            'questions_asked': [],
+            'responses_received': [],
+            'conversation_history': []
+        })
+        for turn in range(turns):
+            items = {
+                'conversation_history': [
+                    {'type': 'candidate', 'content': f"Answer {turn} about Python and APIs", 'timestamp': now},
+                    {'type': 'ai', 'content': "Can you walk me through a project you're proud of?", 'timestamp': now}
+                ],
+                'responses_received': [{'message': f"Answer {turn}", 'analysis': {'score': 0.8}, 'timestamp': now}],
+                'questions_asked': [{'question': "Tell me more.", 'timestamp': now, 'type': 'follow_up'}]
+            }
+            started = time.perf_counter()
+            backend.append(session_id, items, now)
+            latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def describe(latencies: list) -> str:
+    ordered = sorted(latencies)
+    p99 = ordered[int(len(ordered) * 0.99)]
+    return f"mean {statistics.mean(ordered) * 1e6:.1f}us, p99 {p99 * 1e6:.1f}us, max {ordered[-1] * 1e3:.2f}ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the session journal.")
+    parser.add_argument("--sessions", type=int, default=100000)
+    parser.add_argument("--turns", type=int, default=4, help="Chat exchanges per session")
+    parser.add_argument("--fsync", type=str, default="interval", choices=["always", "interval", "never"])
+    parser.add_argument("--dir", type=str, default=None, help="Journal directory (default: temporary)")
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp(prefix="session-journal-")
+    try:
+        baseline = populate(InMemorySessionBackend(), args.sessions, args.turns)
+        print(f"memory backend   append: {describe(baseline)}")
+
+        backend = JournaledSessionBackend(SessionJournal(directory, fsync=args.fsync), snapshot_every=0)
+        journaled = populate(backend, args.sessions, args.turns)
+        print(f"journal backend  append: {describe(journaled)} (fsync={args.fsync})")
+        backend.close()
+
+        started = time.perf_counter()
+        restored = JournaledSessionBackend(SessionJournal(directory), snapshot_every=0)
+        print(f"recovery from log only:      {restored.count()} sessions in {time.perf_counter() - started:.2f}s")
+
+        started = time.perf_counter()
+        restored.snapshot(background=False)
+        print(f"snapshot write:              {time.perf_counter() - started:.2f}s")
+        populate_tail = min(args.sessions, 1000)
+        populate(restored, populate_tail, 1)
+        restored.close()
+
+        started = time.perf_counter()
+        restored = JournaledSessionBackend(SessionJournal(directory), snapshot_every=0)
+        print(f"recovery from snapshot+tail: {restored.count()} sessions in {time.perf_counter() - started:.2f}s")
+        restored.close()
+
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        print(f"on-disk size: {size / 1e6:.1f} MB")
+    finally:
+        if args.dir is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Measure resident memory of in-memory sessions: bytes per session and per turn.
+
+Compares the compact SessionRecord store against plain nested dicts (the
+previous layout). Message texts are generated before measuring, so the
+numbers are the cost of holding them rather than of the texts themselves;
+with --decoded every item is a fresh JSON-decoded object, as after a
+journal replay or a Redis read.
+
+    python -m benchmarks.session_memory --sessions 100000 --exchanges 6
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+from src.core.session_backends import InMemorySessionBackend
+
+QUESTIONS = [
+    "Can you walk me through a project you're proud of?",
+    "How do you approach debugging a production issue?",
+    "Tell me about a time you disagreed with a teammate.",
+]
+
+
+class DictStore:
+    """The previous layout: one dict per session holding lists of item dicts"""
+
+    def __init__(self):
+        self.sessions = {}
+
+    def create(self, session_id, session_data):
+        self.sessions[session_id] = session_data
+
+    def append(self, session_id, items, now):
+        session = self.sessions[session_id]
+        for field, values in items.items():
+            session[field].extend(values)
+        session['last_activity'] = now
+
+
+def exchange(message: str, question: str, now: float) -> dict:
+    """Items recorded by one /chat call, shaped as the API builds them"""
+    return {
+        'conversation_history': [
+            {'type': 'candidate', 'content': message, 'timestamp': now},
+            {'type': 'ai', 'content': question, 'timestamp': now}
+        ],
+        'responses_received': [{'message': message, 'analysis': {'score': 0.8, 'feedback': 'Good response'},
+                                'timestamp': now}],
+        'questions_asked': [{'question': question, 'timestamp': now, 'type': 'follow_up'}]
+    }
+
+
+def measure(store, sessions: int, messages: list, decoded: bool) -> int:
+    """Bytes allocated by `store` for the sessions, excluding the pre-built message texts"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(sessions):
+        session_id = f"session-{i:07d}"
+        now = time.time()
+        store.create(session_id, {
+            'session_id': session_id,
+            'data': {'candidate_name': f"Candidate {i}", 'position_applied': 'Software Engineer'},
+            'created_at': now,
+            'last_activity': now,
+            'questions_asked': [],
+            'responses_received': [],
+            'conversation_history': []
+        })
+        for n, message in enumerate(messages[i]):
+            # Each AI question is its own string object, as model output would be
+            question = "".join(QUESTIONS[n % len(QUESTIONS)])
+            items = exchange(message, question, now)
+            if decoded:
+                items = json.loads(json.dumps(items))
+            store.append(session_id, items, now)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark memory used per session.")
+    parser.add_argument("--sessions", type=int, default=100000)
+    parser.add_argument("--exchanges", type=int, default=6, help="Chat exchanges per session (two turns each)")
+    parser.add_argument("--decoded", action="store_true", help="Store JSON-decoded items instead of shared objects")
+    args = parser.parse_args()
+
+    messages = [
+        [f"Answer {n} from candidate {i}: I built the service in Python with FastAPI and Postgres."
+         for n in range(args.exchanges)]
+        for i in range(args.sessions)
+    ]
+    empty = [[] for _ in range(args.sessions)]
+    turns = args.sessions * args.exchanges * 2
+
+    for name, factory in (('dicts', DictStore), ('records', InMemorySessionBackend)):
+        base = measure(factory(), args.sessions, empty, args.decoded)
+        full = measure(factory(), args.sessions, messages, args.decoded)
+        print(f"{name:8s} {full / 1e6:7.1f} MB total, {base / args.sessions:6.0f} B per empty session, "
+              f"{full / args.sessions:7.0f} B per session, {(full - base) / turns:5.0f} B per turn "
+              f"({args.sessions} sessions x {args.exchanges * 2} turns)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Concurrent-writer stress check for the session store.
+
+Writer threads record chat exchanges on a few shared sessions and on their
+own private sessions while reader threads take summaries and conversation
+snapshots and an expiry thread runs cleanup. Exits non-zero if any append
+was lost or a reader saw a torn exchange.
+
+    python -m benchmarks.session_stress --threads 16 --exchanges 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from src.core.session_backends import InMemorySessionBackend
+from src.core.session_journal import SessionJournal, JournaledSessionBackend
+from src.core.session_manager import SessionManager
+from src.core.session_spill import SpillStore
+
+
+def run(manager: SessionManager, threads: int, exchanges: int, shared_sessions: int) -> list:
+    errors = []
+    shared = [f"shared-{i}" for i in range(shared_sessions)]
+    private = [f"private-{i}" for i in range(threads)]
+    for session_id in shared + private:
+        manager.create_session(session_id, {'candidate_name': session_id})
+
+    stop = threading.Event()
+
+    def writer(index: int):
+        for n in range(exchanges):
+            session_id = shared[n % len(shared)] if n % 2 else private[index]
+            ok = manager.add_chat_turn(
+                session_id,
+                [{'type': 'candidate', 'content': f"{index}:{n}", 'timestamp': time.time()},
+                 {'type': 'ai', 'content': f"{index}:{n}", 'timestamp': time.time()}],
+                response={'message': f"{index}:{n}", 'timestamp': time.time()},
+                question={'question': f"{index}:{n}", 'timestamp': time.time()}
+            )
+            if not ok:
+                errors.append(f"append to {session_id} failed")
+
+    def reader():
+        while not stop.is_set():
+            for session_id in shared:
+                summary = manager.get_session_summary(session_id)
+                # Each exchange adds two turns, one response and one question atomically
+                if summary['conversation_turns'] != 2 * summary['total_responses'] or \
+                        summary['total_responses'] != summary['total_questions']:
+                    errors.append(f"torn summary for {session_id}: {summary}")
+                session = manager.get_session(session_id)
+                if len(session['conversation_history']) != 2 * len(session['responses_received']):
+                    errors.append(f"torn snapshot for {session_id}")
+
+    def sweeper():
+        while not stop.is_set():
+            manager.cleanup_expired_sessions()
+
+    workers = [threading.Thread(target=writer, args=(i,)) for i in range(threads)]
+    background = [threading.Thread(target=reader) for _ in range(2)] + [threading.Thread(target=sweeper)]
+    for thread in background + workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    stop.set()
+    for thread in background:
+        thread.join()
+
+    # Every exchange must be present exactly once
+    expected = {session_id: 0 for session_id in shared + private}
+    for index in range(threads):
+        for n in range(exchanges):
+            expected[shared[n % len(shared)] if n % 2 else private[index]] += 1
+    for session_id, count in expected.items():
+        summary = manager.get_session_summary(session_id)
+        if summary['total_responses'] != count or summary['conversation_turns'] != 2 * count:
+            errors.append(f"lost updates on {session_id}: expected {count}, got {summary}")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress the session store with concurrent writers.")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--exchanges", type=int, default=2000, help="Chat exchanges per writer thread")
+    parser.add_argument("--shared", type=int, default=3, help="Sessions written by every thread")
+    parser.add_argument("--shards", type=int, default=64)
+    parser.add_argument("--hot-items", type=int, default=0, help="Spill history beyond this many items (0: keep all)")
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as directory:
+        def spill():
+            return SpillStore(os.path.join(directory, 'spill'), args.hot_items) if args.hot_items else None
+
+        backends = {
+            'memory': InMemorySessionBackend(args.shards, spill()),
+            'journal': JournaledSessionBackend(SessionJournal(directory), snapshot_every=5000, shards=args.shards,
+                                               spill=spill()),
+        }
+        for name, backend in backends.items():
+            manager = SessionManager(backend)
+            started = time.perf_counter()
+            errors = run(manager, args.threads, args.exchanges, args.shared)
+            elapsed = time.perf_counter() - started
+            total = args.threads * args.exchanges
+            print(f"{name:8s} {total} exchanges in {elapsed:.2f}s ({total / elapsed:.0f}/s), {len(errors)} errors")
+            for error in errors[:10]:
+                print(f"  {error}")
+            failed = failed or bool(errors)
+            manager.close()
+
+        if not failed:
+            # The journal must replay to the same state
+            restored = JournaledSessionBackend(SessionJournal(directory), snapshot_every=0)
+            for session_id in [f"shared-{i}" for i in range(args.shared)]:
+                if restored.summary(session_id)['total_responses'] != backends['journal'].summary(session_id)['total_responses']:
+                    print(f"journal replay mismatch on {session_id}")
+                    failed = True
+            restored.close()
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
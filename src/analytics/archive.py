@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Columnar archive of completed interviews
+
+Finished sessions are written as compressed Parquet files in two datasets
+under the archive directory, each partitioned by the day the interview
+ended (``date=YYYY-MM-DD``):
+
+- ``interviews/``: one row per session with its metadata and scores
+- ``turns/``: one row per conversation turn, with per-answer scores
+
+Reports read only the columns and day partitions they need, so filtering
+months of interviews by position, date and score never loads transcripts.
+
+    python -m src.analytics.archive --dir data/archive --position "Software Engineer" --since 2026-01-01
+"""
+import argparse
+import datetime
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Any, Optional, Union
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # optional: the archive is disabled without pyarrow
+    pa = None
+
+from src.utils.config import config
+
+logger = logging.getLogger(__name__)
+
+# Scores a conversation history; VoiceInterviewScorer.score_interview_session
+SessionScorer = Callable[[List[Dict[str, Any]]], Dict[str, Any]]
+
+DateLike = Union[str, datetime.date]
+
+if pa is not None:
+    SCORES = pa.map_(pa.string(), pa.float64())
+
+    INTERVIEW_SCHEMA = pa.schema([
+        ('session_id', pa.string()),
+        ('candidate_name', pa.string()),
+        ('position_applied', pa.string()),
+        ('started_at', pa.timestamp('us', tz='UTC')),
+        ('ended_at', pa.timestamp('us', tz='UTC')),
+        ('duration_sec', pa.float64()),
+        ('total_questions', pa.int32()),
+        ('total_responses', pa.int32()),
+        ('conversation_turns', pa.int32()),
+        ('session_score', pa.float64()),
+        ('session_rating', pa.string()),
+        ('average_scores', SCORES),
+    ])
+
+    TURN_SCHEMA = pa.schema([
+        ('session_id', pa.string()),
+        ('position_applied', pa.string()),
+        ('turn_index', pa.int32()),
+        ('type', pa.string()),
+        ('content', pa.string()),
+        ('timestamp', pa.timestamp('us', tz='UTC')),
+        ('recording', pa.string()),
+        ('overall_score', pa.float64()),
+        ('rating', pa.string()),
+        ('criterion_scores', SCORES),
+    ])
+
+    PARTITIONING = ds.partitioning(pa.schema([('date', pa.string())]), flavor='hive')
+
+
+def _utc(timestamp: Optional[float]) -> Optional[datetime.datetime]:
+    if timestamp is None:
+        return None
+    return datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc)
+
+
+def interview_rows(session_id: str, session: Dict[str, Any],
+                   score_data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """The interview row and turn rows for one session, keyed by dataset"""
+    data = session.get('data') or {}
+    history = session.get('conversation_history') or []
+    score_data = score_data or {}
+    position = data.get('position_applied')
+    started = data.get('start_time', session.get('created_at'))
+    ended = session.get('last_activity', started)
+
+    interview = {
+        'session_id': session_id,
+        'candidate_name': data.get('candidate_name'),
+        'position_applied': position,
+        'started_at': _utc(started),
+        'ended_at': _utc(ended),
+        'duration_sec': (ended - started) if started is not None and ended is not None else None,
+        'total_questions': len(session.get('questions_asked') or []),
+        'total_responses': len(session.get('responses_received') or []),
+        'conversation_turns': len(history),
+        'session_score': score_data.get('session_score'),
+        'session_rating': score_data.get('session_rating'),
+        'average_scores': list((score_data.get('average_scores') or {}).items()),
+    }
+
+    # The scorer rates non-empty candidate turns in order
+    individual = iter(score_data.get('individual_scores') or [])
+    turns = []
+    for index, turn in enumerate(history):
+        scored = {}
+        if turn.get('type') == 'candidate' and (turn.get('content') or '').strip():
+            scored = next(individual, None) or {}
+        turns.append({
+            'session_id': session_id,
+            'position_applied': position,
+            'turn_index': index,
+            'type': turn.get('type'),
+            'content': turn.get('content'),
+            'timestamp': _utc(turn.get('timestamp')),
+            'recording': turn.get('recording'),
+            'overall_score': scored.get('overall_score'),
+            'rating': scored.get('rating'),
+            'criterion_scores': list((scored.get('criterion_scores') or {}).items()) if scored else None,
+        })
+    return {'interviews': [interview], 'turns': turns}
+
+
+class InterviewArchive:
+    """Background writer that scores finished sessions and appends them in batches.
+
+    `archive_session` only queues the session, so it is safe to register
+    as a SessionManager expiry hook; a worker thread scores it and buffers
+    the rows per day, writing one Parquet file per dataset and day once
+    `batch_size` sessions are buffered or the oldest buffered session has
+    waited `flush_interval` seconds.
+    """
+
+    def __init__(self, directory: str, scorer: Optional[SessionScorer] = None, batch_size: int = 500,
+                 flush_interval: float = 30.0, compression: str = 'zstd'):
+        if pa is None:
+            raise RuntimeError("The interview archive requires pyarrow")
+        self.directory = directory
+        self.scorer = scorer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compression = compression
+        self.archived = 0
+        self._queue: 'queue.Queue' = queue.Queue()
+        self._buffers: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+        self._buffered = 0
+        self._first_buffered = 0.0
+        self._worker = threading.Thread(target=self._run, name='interview-archive', daemon=True)
+        self._worker.start()
+
+    def archive_session(self, session_id: str, session: Optional[Dict[str, Any]]):
+        """Queue a finished session; sessions already gone (None) are skipped"""
+        if session is not None:
+            self._queue.put((session_id, session))
+
+    def pending(self) -> int:
+        """Sessions queued or buffered but not yet written"""
+        return self._queue.qsize() + self._buffered
+
+    def _run(self):
+        while True:
+            timeout = None
+            if self._buffered:
+                timeout = max(0.0, self._first_buffered + self.flush_interval - time.time())
+            try:
+                entry = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._flush_logged()
+                continue
+            if entry is None:
+                self._flush_logged()
+                return
+            try:
+                self._add(*entry)
+            except Exception as e:
+                logger.error(f"Could not archive session {entry[0]}: {e}")
+            if self._buffered >= self.batch_size:
+                self._flush_logged()
+
+    def _add(self, session_id: str, session: Dict[str, Any]):
+        score_data = None
+        if self.scorer is not None:
+            score_data = self.scorer(session.get('conversation_history') or [])
+        rows = interview_rows(session_id, session, score_data)
+        ended = rows['interviews'][0]['ended_at'] or datetime.datetime.now(datetime.timezone.utc)
+        buffers = self._buffers.setdefault(ended.date().isoformat(), {'interviews': [], 'turns': []})
+        for dataset, dataset_rows in rows.items():
+            buffers[dataset].extend(dataset_rows)
+        if not self._buffered:
+            self._first_buffered = time.time()
+        self._buffered += 1
+
+    def _flush_logged(self):
+        try:
+            self._flush()
+        except Exception as e:
+            # Rows stay buffered and the write is retried after another interval
+            self._first_buffered = time.time()
+            logger.error(f"Interview archive flush failed: {e}")
+
+    def _flush(self):
+        if not self._buffered:
+            return
+        started = time.time()
+        written = 0
+        for day, buffers in list(self._buffers.items()):
+            for dataset, schema in (('turns', TURN_SCHEMA), ('interviews', INTERVIEW_SCHEMA)):
+                if buffers[dataset]:
+                    self._write(dataset, day, pa.Table.from_pylist(buffers[dataset], schema=schema))
+            # Days already written are not written again if a later one fails
+            del self._buffers[day]
+            written += len(buffers['interviews'])
+            self._buffered -= len(buffers['interviews'])
+            self.archived += len(buffers['interviews'])
+        logger.info(f"Archived {written} interviews in {time.time() - started:.2f}s")
+
+    def _write(self, dataset: str, day: str, table: 'pa.Table'):
+        partition = os.path.join(self.directory, dataset, f"date={day}")
+        os.makedirs(partition, exist_ok=True)
+        _write_file(partition, f"part-{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}.parquet",
+                    table, self.compression)
+
+    def close(self):
+        """Archive everything queued so far and stop the worker"""
+        if self._worker.is_alive():
+            self._queue.put(None)
+            self._worker.join()
+
+
+def _write_file(partition: str, name: str, table: 'pa.Table', compression: str):
+    # Written under a dot-prefixed name, which dataset discovery skips, so readers never see a partial file
+    temporary = os.path.join(partition, '.' + name)
+    pq.write_table(table, temporary, compression=compression)
+    os.replace(temporary, os.path.join(partition, name))
+
+
+def _dataset(directory: str, name: str, schema: 'pa.Schema') -> Optional['ds.Dataset']:
+    path = os.path.join(directory, name)
+    if not os.path.isdir(path):
+        return None
+    return ds.dataset(path, schema=schema.append(pa.field('date', pa.string())), format='parquet',
+                      partitioning=PARTITIONING)
+
+
+def _filter(position: Optional[str], since: Optional[DateLike], until: Optional[DateLike],
+            score_column: str, min_score: Optional[float], max_score: Optional[float]):
+    # Date bounds prune whole day partitions; the rest is pushed down to row groups
+    conditions = []
+    if position is not None:
+        conditions.append(ds.field('position_applied') == position)
+    if since is not None:
+        conditions.append(ds.field('date') >= str(since))
+    if until is not None:
+        conditions.append(ds.field('date') <= str(until))
+    if min_score is not None:
+        conditions.append(ds.field(score_column) >= min_score)
+    if max_score is not None:
+        conditions.append(ds.field(score_column) <= max_score)
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def query_interviews(directory: str, position: Optional[str] = None, since: Optional[DateLike] = None,
+                     until: Optional[DateLike] = None, min_score: Optional[float] = None,
+                     max_score: Optional[float] = None, columns: Optional[List[str]] = None) -> 'pa.Table':
+    """Archived interviews matching the filters; dates are inclusive days (UTC) of the interview's end"""
+    if pa is None:
+        raise RuntimeError("Querying the interview archive requires pyarrow")
+    dataset = _dataset(directory, 'interviews', INTERVIEW_SCHEMA)
+    if dataset is None:
+        return INTERVIEW_SCHEMA.empty_table() if columns is None else \
+            INTERVIEW_SCHEMA.empty_table().select(columns)
+    return dataset.to_table(columns=columns or INTERVIEW_SCHEMA.names,
+                            filter=_filter(position, since, until, 'session_score', min_score, max_score))
+
+
+def query_turns(directory: str, position: Optional[str] = None, since: Optional[DateLike] = None,
+                until: Optional[DateLike] = None, min_score: Optional[float] = None,
+                max_score: Optional[float] = None, session_ids: Optional[List[str]] = None,
+                columns: Optional[List[str]] = None) -> 'pa.Table':
+    """Archived turns matching the filters; scores filter on each answer's overall_score.
+
+    The default columns leave out `content`; ask for it explicitly to read transcripts.
+    """
+    if pa is None:
+        raise RuntimeError("Querying the interview archive requires pyarrow")
+    columns = columns or [name for name in TURN_SCHEMA.names if name != 'content']
+    dataset = _dataset(directory, 'turns', TURN_SCHEMA)
+    if dataset is None:
+        return TURN_SCHEMA.empty_table().select(columns)
+    expression = _filter(position, since, until, 'overall_score', min_score, max_score)
+    if session_ids is not None:
+        in_sessions = ds.field('session_id').isin(pa.array(session_ids, type=pa.string()))
+        expression = in_sessions if expression is None else expression & in_sessions
+    return dataset.to_table(columns=columns, filter=expression)
+
+
+def compact(directory: str, day: DateLike, compression: str = 'zstd'):
+    """Merge one day's batch files per dataset into a single file"""
+    for dataset in ('interviews', 'turns'):
+        partition = os.path.join(directory, dataset, f"date={day}")
+        if not os.path.isdir(partition):
+            continue
+        # Like dataset discovery, skip dot- and underscore-prefixed names: those include
+        # _write_file's temporary files, which may still be being written
+        parts = sorted(os.path.join(partition, name) for name in os.listdir(partition)
+                       if name.endswith('.parquet') and not name.startswith(('.', '_')))
+        if len(parts) < 2:
+            continue
+        table = pa.concat_tables(pq.read_table(part) for part in parts)
+        _write_file(partition, f"part-{int(time.time() * 1000)}-compacted.parquet", table, compression)
+        for part in parts:
+            os.remove(part)
+
+
+def create_interview_archive(scorer: Optional[SessionScorer] = None) -> Optional[InterviewArchive]:
+    """Archive configured by `analytics.archive`, or None when disabled or pyarrow is missing"""
+    archive_config = config.get('analytics.archive', {}) or {}
+    if not archive_config.get('enabled', False):
+        return None
+    if pa is None:
+        logger.warning("analytics.archive is enabled but pyarrow is not installed; interviews will not be archived")
+        return None
+    return InterviewArchive(
+        archive_config.get('directory', 'data/archive'),
+        scorer=scorer,
+        batch_size=archive_config.get('batch_size', 500),
+        flush_interval=archive_config.get('flush_interval', 30.0),
+        compression=archive_config.get('compression', 'zstd')
+    )
+
+
+def report(table: 'pa.Table') -> List[Dict[str, Any]]:
+    """Interview count and mean/min/max session score per position"""
+    if table.num_rows == 0:
+        return []
+    grouped = table.group_by('position_applied').aggregate([
+        ('session_id', 'count'),
+        ('session_score', 'mean'),
+        ('session_score', 'min'),
+        ('session_score', 'max'),
+    ])
+    return sorted(grouped.to_pylist(), key=lambda row: -row['session_id_count'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the interview archive.")
+    parser.add_argument("--dir", type=str, default="data/archive")
+    parser.add_argument("--position", type=str, default=None)
+    parser.add_argument("--since", type=str, default=None, help="First day, YYYY-MM-DD")
+    parser.add_argument("--until", type=str, default=None, help="Last day, YYYY-MM-DD")
+    parser.add_argument("--min-score", type=float, default=None)
+    parser.add_argument("--max-score", type=float, default=None)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    table = query_interviews(args.dir, args.position, args.since, args.until, args.min_score, args.max_score,
+                             columns=['session_id', 'position_applied', 'session_score'])
+    rows = report(table)
+    for row in rows:
+        print(f"{row['position_applied'] or '(none)':30s} {row['session_id_count']:8d} interviews  "
+              f"score mean {row['session_score_mean'] or 0:.2f}  "
+              f"min {row['session_score_min'] or 0:.2f}  max {row['session_score_max'] or 0:.2f}")
+    print(f"{table.num_rows} interviews matched in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Export of finished interviews as fine-tuning data
+
+Expired sessions are converted to the conversation format of
+``models/training_data/schema.json`` and appended, in batches, to a JSONL
+file that the fine-tuning and RLHF scripts read directly:
+
+- AI turns become ``interviewer`` messages and candidate turns
+  ``candidate`` messages, led by a ``system`` message naming the position
+- ``metadata`` holds the position, start/end times and, with a scorer,
+  the session score, per-criterion averages and each answer's score
+
+An index file next to the output records the sessions exported within
+the last `dedup_window` seconds, so a session delivered again (e.g.
+replayed from the journal after a restart) is not written twice.
+"""
+import heapq
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Any, Optional, Set, Tuple
+
+from src.utils.config import config
+
+logger = logging.getLogger(__name__)
+
+# Scores a conversation history; VoiceInterviewScorer.score_interview_session
+SessionScorer = Callable[[List[Dict[str, Any]]], Dict[str, Any]]
+
+# Session turn type -> training data role
+ROLES = {'ai': 'interviewer', 'candidate': 'candidate'}
+
+
+def training_record(session_id: str, session: Dict[str, Any],
+                    score_data: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """The schema.json record for one session, or None if the candidate never answered"""
+    data = session.get('data') or {}
+    position = data.get('position_applied')
+    messages = []
+    if position:
+        messages.append({'role': 'system',
+                         'content': f"You are an AI interviewer evaluating candidates for a {position} role."})
+    answered = False
+    for turn in session.get('conversation_history') or []:
+        role = ROLES.get(turn.get('type'))
+        content = turn.get('content')
+        if role is None or not isinstance(content, str) or not content.strip():
+            continue
+        answered = answered or role == 'candidate'
+        messages.append({'role': role, 'content': content})
+    if not answered:
+        return None
+
+    # Candidate names, resumes and recordings are left out of training data
+    metadata = {
+        'role': position,
+        'source': 'live',
+        'started_at': data.get('start_time', session.get('created_at')),
+        'ended_at': session.get('last_activity'),
+    }
+    if score_data:
+        metadata['session_score'] = score_data.get('session_score')
+        metadata['session_rating'] = score_data.get('session_rating')
+        metadata['average_scores'] = score_data.get('average_scores') or {}
+        metadata['answer_scores'] = [scored.get('overall_score')
+                                     for scored in score_data.get('individual_scores') or []]
+    return {'id': session_id, 'metadata': metadata, 'messages': messages}
+
+
+class TrainingDataExporter:
+    """Background writer appending finished sessions to a training JSONL file.
+
+    `export_session` only queues the session, so it is safe to register as
+    a SessionManager expiry hook; a worker thread scores and converts it,
+    and appends a batch once `batch_size` sessions are buffered or the
+    oldest has waited `flush_interval` seconds.
+
+    Sessions arrive in no particular order: stale expiry heap entries,
+    other workers and journal replays all reorder them. Each exported
+    session is recorded as (last_activity, session_id) in an append-only
+    index, and a session whose pair is already there is skipped. Pairs more
+    than `dedup_window` seconds older than the newest one are forgotten.
+    The index is appended after its batch is on disk, so a crash can repeat
+    a batch but never skip one.
+    """
+
+    def __init__(self, path: str, scorer: Optional[SessionScorer] = None, batch_size: int = 100,
+                 flush_interval: float = 30.0, fsync: bool = True, dedup_window: float = 7 * 86400):
+        self.path = path
+        self.index_path = path + '.exported'
+        self.scorer = scorer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.dedup_window = dedup_window
+        self.exported = 0
+        self.skipped = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Exported (last_activity, session_id) pairs, with a heap to forget the oldest
+        self._seen: Set[Tuple[float, str]] = set()
+        self._seen_order: List[Tuple[float, str]] = []
+        self._newest = 0.0
+        self._index_lines = 0
+        self._load_index()
+        self._queue: 'queue.Queue' = queue.Queue()
+        # (index key, JSONL line) per buffered session
+        self._buffer: List[Tuple[Tuple[float, str], str]] = []
+        self._first_buffered = 0.0
+        self._worker = threading.Thread(target=self._run, name='training-export', daemon=True)
+        self._worker.start()
+
+    def export_session(self, session_id: str, session: Optional[Dict[str, Any]]):
+        """Queue a finished session; sessions already gone (None) are skipped"""
+        if session is not None:
+            self._queue.put((session_id, session))
+
+    def pending(self) -> int:
+        """Sessions queued or buffered but not yet written"""
+        return self._queue.qsize() + len(self._buffer)
+
+    def _remember(self, key: Tuple[float, str]):
+        if key not in self._seen:
+            self._seen.add(key)
+            heapq.heappush(self._seen_order, key)
+        self._newest = max(self._newest, key[0])
+        horizon = self._newest - self.dedup_window
+        while self._seen_order[0][0] < horizon:
+            self._seen.discard(heapq.heappop(self._seen_order))
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    self._index_lines += 1
+                    try:
+                        last_activity, session_id = json.loads(line)
+                        self._remember((float(last_activity), str(session_id)))
+                    except (ValueError, TypeError) as e:
+                        # A line cut off by a crash; its batch may be exported again
+                        logger.error(f"Ignoring unreadable line in {self.index_path}: {e}")
+        except FileNotFoundError:
+            return
+        self._compact_index()
+
+    def _append_index(self, keys: List[Tuple[float, str]]):
+        with open(self.index_path, 'a', encoding='utf-8') as f:
+            f.writelines(json.dumps([last_activity, session_id]) + '\n' for last_activity, session_id in keys)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        self._index_lines += len(keys)
+        if self._index_lines > 2 * len(self._seen) + 1000:
+            self._compact_index()
+
+    def _compact_index(self):
+        """Rewrite the index with only the pairs still inside the window"""
+        if self._index_lines == len(self._seen):
+            return
+        temporary = self.index_path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps([last_activity, session_id]) + '\n'
+                         for last_activity, session_id in sorted(self._seen))
+        os.replace(temporary, self.index_path)
+        self._index_lines = len(self._seen)
+
+    def _run(self):
+        while True:
+            timeout = None
+            if self._buffer:
+                timeout = max(0.0, self._first_buffered + self.flush_interval - time.time())
+            try:
+                entry = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._flush_logged()
+                continue
+            if entry is None:
+                self._flush_logged()
+                return
+            try:
+                self._add(*entry)
+            except Exception as e:
+                logger.error(f"Could not export session {entry[0]} as training data: {e}")
+            if len(self._buffer) >= self.batch_size:
+                self._flush_logged()
+
+    def _add(self, session_id: str, session: Dict[str, Any]):
+        key = (float(session.get('last_activity') or 0.0), session_id)
+        if key in self._seen or any(key == buffered for buffered, _ in self._buffer):
+            self.skipped += 1
+            return
+        score_data = None
+        if self.scorer is not None:
+            score_data = self.scorer(session.get('conversation_history') or [])
+        record = training_record(session_id, session, score_data)
+        if record is None:
+            self.skipped += 1
+            return
+        if not self._buffer:
+            self._first_buffered = time.time()
+        self._buffer.append((key, json.dumps(record, ensure_ascii=False) + '\n'))
+
+    def _flush_logged(self):
+        try:
+            self._flush()
+        except Exception as e:
+            # The batch stays buffered and the write is retried after another interval
+            self._first_buffered = time.time()
+            logger.error(f"Training data export failed: {e}")
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        started = time.time()
+        with open(self.path, 'a', encoding='utf-8') as f:
+            size = f.tell()
+            try:
+                f.writelines(line for _, line in self._buffer)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            except OSError:
+                # Cut off a partly written batch so the retry does not leave a broken line
+                f.truncate(size)
+                raise
+        keys = [key for key, _ in self._buffer]
+        for key in keys:
+            self._remember(key)
+        self.exported += len(keys)
+        logger.info(f"Exported {len(keys)} sessions as training data in {time.time() - started:.2f}s")
+        self._buffer = []
+        # After the buffer is cleared: if this fails, the batch is only repeated after a restart
+        self._append_index(keys)
+
+    def close(self):
+        """Export everything queued so far and stop the worker"""
+        if self._worker.is_alive():
+            self._queue.put(None)
+            self._worker.join()
+
+
+def create_training_exporter(scorer: Optional[SessionScorer] = None) -> Optional[TrainingDataExporter]:
+    """Exporter configured by `analytics.training_export`, or None when disabled"""
+    export_config = config.get('analytics.training_export', {}) or {}
+    if not export_config.get('enabled', False):
+        return None
+    try:
+        return TrainingDataExporter(
+            export_config.get('path', 'models/training_data/live_conversations.jsonl'),
+            scorer=scorer if export_config.get('score', True) else None,
+            batch_size=export_config.get('batch_size', 100),
+            flush_interval=export_config.get('flush_interval', 30.0),
+            fsync=export_config.get('fsync', True),
+            dedup_window=export_config.get('dedup_window', 7 * 86400)
+        )
+    except OSError as e:
+        logger.error(f"Training data export disabled: {e}")
+        return None
@@ -2,11 +2,14 @@
 """
 Nishu AI Interview System - Clean Chatterbox Implementation
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
+import asyncio
 import uuid
 import time
 import os
@@ -15,17 +18,28 @@ import logging
 # Import core modules
 from src.core.chatbot import interview_chatbot
 from src.scoring.voice_scorer import voice_scorer
-from src.core.session_manager import session_manager
+from src.core.session_manager import decode_cursor, session_manager
 from src.speech_interface.tts_module import tts_module
+from src.speech_interface.audio_ingest import ENCODINGS, create_audio_ingestor
+from src.scoring.prosody import resolve_recording_path, shutdown_analysis_pool
+from src.analytics.archive import create_interview_archive
+from src.analytics.training_export import create_training_exporter
+from src.api.responses import FastJSONResponse, cache_headers, etag_matches, not_modified, session_etag
+from src.utils.config import config
+from src.utils.logger import setup_logging
+from src.utils.metrics import metrics, CONTENT_TYPE
+from src.utils.profiling import create_request_profiler
+from src.utils.request_context import begin_request, end_request, current, bind
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging (queued JSON lines, written off the request path)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="Nishu AI Interview System",
     description="Intelligent AI-powered interview system with Chatterbox",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=FastJSONResponse
 )
 
 # Enable CORS
@@ -37,6 +51,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Large JSON bodies (conversation pages, summaries) are gzipped for clients that accept it
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=config.get('api.gzip_minimum_size', 1024),
+    compresslevel=config.get('api.gzip_level', 1)
+)
+
 # Mount static files (ensure directory exists)
 RECORDINGS_DIR = os.environ.get("RECORDINGS_DIR", os.path.join(os.getcwd(), "recordings"))
 try:
@@ -46,6 +67,84 @@ try:
 except Exception as e:
     logger.warning(f"Skipping /recordings mount: {e}")
 
+# Expired interviews are scored and appended to the columnar archive
+interview_archive = create_interview_archive(scorer=voice_scorer.score_interview_session)
+if interview_archive is not None:
+    session_manager.add_expiry_hook(interview_archive.archive_session)
+
+# ... and converted to fine-tuning conversations for the training scripts
+training_exporter = create_training_exporter(scorer=voice_scorer.score_interview_session)
+if training_exporter is not None:
+    session_manager.add_expiry_hook(training_exporter.export_session)
+
+# Streamed answer audio is segmented into utterances and transcribed as it arrives
+audio_ingestor = create_audio_ingestor()
+
+# Request latency per route template (not raw path, which would include session ids)
+HTTP_REQUEST_SECONDS = metrics.histogram('nishu_http_request_seconds', 'HTTP request latency',
+                                         ('method', 'route', 'status'))
+
+# Selected requests are profiled (admin header or sampling); None when not configured
+request_profiler = create_request_profiler()
+
+@app.middleware("http")
+async def instrument_request(request: Request, call_next):
+    started = time.perf_counter()
+    request_id = request.headers.get('x-request-id') or uuid.uuid4().hex
+    token = begin_request(request_id=request_id)
+    profile = request_profiler.start(request.headers) if request_profiler is not None else None
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers['X-Request-ID'] = request_id
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        route = getattr(request.scope.get('route'), 'path', 'unmatched')
+        HTTP_REQUEST_SECONDS.labels(request.method, route, str(status)).observe(elapsed)
+        if profile is not None:
+            request_profiler.stop(profile)
+            info = {
+                'request_id': request_id,
+                'session_id': current().get('session_id') or request.scope.get('path_params', {}).get('session_id'),
+                'method': request.method,
+                'endpoint': route,
+                'path': request.url.path,
+                'status': status,
+                'duration_ms': round(elapsed * 1000, 3),
+                'timestamp': time.time()
+            }
+            # Written off the event loop; the response does not wait for it
+            asyncio.get_running_loop().run_in_executor(None, request_profiler.save, profile, info)
+        end_request(token)
+
+# Gauges are read when /metrics is scraped
+metrics.gauge('nishu_sessions_active', 'Live interview sessions').set_function(session_manager.count_sessions)
+QUEUE_DEPTH = metrics.gauge('nishu_queue_depth', 'Work waiting in background queues', ('queue',))
+QUEUE_DEPTH.labels('session_expiry').set_function(lambda: len(session_manager.expiry))
+if interview_archive is not None:
+    QUEUE_DEPTH.labels('interview_archive').set_function(interview_archive.pending)
+if training_exporter is not None:
+    QUEUE_DEPTH.labels('training_export').set_function(training_exporter.pending)
+
+@app.on_event("startup")
+async def start_session_expiry():
+    # Idle sessions are expired by a background task as their deadlines come due
+    session_manager.start_expiry()
+
+@app.on_event("shutdown")
+async def close_session_store():
+    await session_manager.stop_expiry()
+    # Flush journaled sessions / close the Redis connection
+    session_manager.close()
+    if interview_archive is not None:
+        interview_archive.close()
+    if training_exporter is not None:
+        training_exporter.close()
+    audio_ingestor.close()
+    shutdown_analysis_pool()
+
 # Pydantic models
 class InterviewStartRequest(BaseModel):
     candidate_name: Optional[str] = "Candidate"
@@ -62,6 +161,7 @@ class InterviewStartResponse(BaseModel):
 class ChatRequest(BaseModel):
     session_id: str
     message: str
+    recording: Optional[str] = None  # answer audio, relative to RECORDINGS_DIR
 
 class ChatResponse(BaseModel):
     response: str
@@ -94,9 +194,14 @@ async def health_check():
         "status": "healthy",
         "timestamp": time.time(),
         "chatbot_available": interview_chatbot.chatbot is not None,
-        "sessions_active": len(session_manager.sessions)
+        "sessions_active": session_manager.count_sessions()
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
+
 @app.get("/api/v1/system/status", response_model=SystemStatusResponse)
 async def get_system_status():
     """Get comprehensive system status"""
@@ -105,7 +210,7 @@ async def get_system_status():
         
         return SystemStatusResponse(
             chatbot_status=chatbot_status,
-            session_count=len(session_manager.sessions),
+            session_count=session_manager.count_sessions(),
             system_health="excellent" if chatbot_status['initialized'] else "degraded"
         )
     except Exception as e:
@@ -117,6 +222,7 @@ async def start_interview(request: InterviewStartRequest):
     """Start a new interview session"""
     try:
         session_id = str(uuid.uuid4())
+        bind(session_id=session_id)
         
         # Create session
         initial_data = {
@@ -134,25 +240,27 @@ async def start_interview(request: InterviewStartRequest):
         welcome_message = f"Hello {request.candidate_name}! Welcome to your interview for the {request.position_applied} position. I'm Nishu, your AI interviewer. Let's begin!"
         first_question = "Hello! I'm Nishu, your AI interview assistant. Welcome to your interview today. Let's begin with a few questions about your background and experience."
         
-        # Add first question to session
-        session_manager.add_question(session_id, {
-            'question': first_question,
-            'timestamp': time.time(),
-            'type': 'initial'
-        })
-        
-        # Add conversation turn
-        session_manager.add_conversation_turn(session_id, {
-            'type': 'ai',
-            'content': welcome_message,
-            'timestamp': time.time()
-        })
-        
-        session_manager.add_conversation_turn(session_id, {
-            'type': 'ai',
-            'content': first_question,
-            'timestamp': time.time()
-        })
+        # Add first question and opening conversation turns
+        session_manager.add_chat_turn(
+            session_id,
+            [
+                {
+                    'type': 'ai',
+                    'content': welcome_message,
+                    'timestamp': time.time()
+                },
+                {
+                    'type': 'ai',
+                    'content': first_question,
+                    'timestamp': time.time()
+                }
+            ],
+            question={
+                'question': first_question,
+                'timestamp': time.time(),
+                'type': 'initial'
+            }
+        )
         
         return InterviewStartResponse(
             session_id=session_id,
@@ -169,54 +277,61 @@ async def start_interview(request: InterviewStartRequest):
 async def chat_with_interviewer(request: ChatRequest):
     """Chat with the AI interviewer"""
     try:
-        # Get session
-        session = session_manager.get_session(request.session_id)
-        if not session:
+        bind(session_id=request.session_id)
+        
+        # Check session
+        if not session_manager.session_exists(request.session_id):
             raise HTTPException(status_code=404, detail="Interview session not found")
         
         # Get chatbot response (dict)
         bot = interview_chatbot.get_response(request.message, request.session_id)
         bot_text = bot.get("response", "")
         
-        # Add candidate message to conversation
-        session_manager.add_conversation_turn(request.session_id, {
+        # Candidate message, chatbot response (if any), analysis and follow-up question
+        candidate_turn = {
             'type': 'candidate',
             'content': request.message,
             'timestamp': time.time()
-        })
-        
-        # Add chatbot response to conversation (if any)
+        }
+        if request.recording:
+            candidate_turn['recording'] = request.recording
+        turns = [candidate_turn]
         if bot_text:
-            session_manager.add_conversation_turn(request.session_id, {
+            turns.append({
                 'type': 'ai',
                 'content': bot_text,
                 'timestamp': time.time()
             })
         
-        # Store basic analysis placeholder
-        session_manager.add_response(request.session_id, {
-            'message': request.message,
-            'analysis': {'score': 0.8, 'feedback': 'Good response'},
-            'timestamp': time.time()
-        })
-        
         # Simple next question placeholder
         next_question = "Thank you for your response. Let me ask you another question about your experience."
-        session_manager.add_question(request.session_id, {
-            'question': next_question,
-            'timestamp': time.time(),
-            'type': 'follow_up'
-        })
+        
+        # Store everything in one backend write
+        session_manager.add_chat_turn(
+            request.session_id,
+            turns,
+            response={
+                'message': request.message,
+                'analysis': {'score': 0.8, 'feedback': 'Good response'},
+                'timestamp': time.time()
+            },
+            question={
+                'question': next_question,
+                'timestamp': time.time(),
+                'type': 'follow_up'
+            }
+        )
         
         # Get session summary
         session_summary = session_manager.get_session_summary(request.session_id)
         
-        return ChatResponse(
-            response=bot_text,
-            next_question=next_question,
-            analysis={"score": 0.8, "feedback": "Good response"},
-            session_summary=session_summary
-        )
+        # Returned as-is: ChatResponse documents the shape without re-validating every turn
+        return FastJSONResponse({
+            "response": bot_text,
+            "next_question": next_question,
+            "analysis": {"score": 0.8, "feedback": "Good response"},
+            "session_summary": session_summary
+        })
         
     except HTTPException:
         raise
@@ -224,10 +339,67 @@ async def chat_with_interviewer(request: ChatRequest):
         logger.error(f"Error in chat: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to process chat: {str(e)}")
 
+@app.post("/api/v1/interviews/{session_id}/audio")
+async def upload_answer_audio(
+    session_id: str,
+    request: Request,
+    sample_rate: int = Query(16000, ge=8000, le=192000),
+    channels: int = Query(1, ge=1, le=8),
+    encoding: str = Query('s16le'),
+    score: bool = Query(False, description="Score the transcript, with delivery features from the audio")
+):
+    """Stream a spoken answer as raw PCM (chunked request body).
+
+    Chunks are written to a WAV file under RECORDINGS_DIR and split into
+    utterances as they arrive; the returned `recording` can be passed to
+    the chat endpoint with the answer.
+    """
+    bind(session_id=session_id)
+    if not session_manager.session_exists(session_id):
+        raise HTTPException(status_code=404, detail="Interview session not found")
+    if encoding not in ENCODINGS:
+        raise HTTPException(status_code=400, detail=f"Unsupported encoding; expected one of {', '.join(ENCODINGS)}")
+    recording = f"{session_id}/{uuid.uuid4().hex}.wav"
+    try:
+        path = resolve_recording_path(recording, RECORDINGS_DIR)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid session id")
+    
+    max_bytes = config.get('api.max_file_size', 10485760)
+    stream = await asyncio.to_thread(audio_ingestor.open, path, sample_rate, channels, encoding)
+    try:
+        async for chunk in request.stream():
+            if stream.data_bytes + len(chunk) > max_bytes:
+                raise HTTPException(status_code=413, detail=f"Recording exceeds {max_bytes} bytes")
+            # Disk writes and VAD run off the event loop
+            await asyncio.to_thread(stream.write, chunk)
+        result = await asyncio.to_thread(stream.close)
+    except BaseException as e:
+        await asyncio.to_thread(stream.abort)
+        if isinstance(e, Exception) and not isinstance(e, HTTPException):
+            logger.error(f"Error receiving answer audio: {e}")
+            raise HTTPException(status_code=500, detail=f"Failed to receive audio: {str(e)}")
+        raise
+    
+    response = {"success": True, "session_id": session_id, "recording": recording, **result}
+    if score and result['transcript']:
+        response['score_data'] = await asyncio.to_thread(
+            voice_scorer.score_response, result['transcript'], recording=recording)
+    return response
+
 @app.get("/api/v1/interviews/{session_id}/summary")
-async def get_interview_summary(session_id: str):
-    """Get interview summary"""
+async def get_interview_summary(session_id: str, if_none_match: Optional[str] = Header(None)):
+    """Get interview summary; 304 when If-None-Match has the current ETag"""
+    bind(session_id=session_id)
     try:
+        # Version before content: a write in between leaves the tag older than the body, never newer
+        version = session_manager.get_session_version(session_id)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Interview session not found")
+        etag = session_etag(version)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        
         session = session_manager.get_session(session_id)
         if not session:
             raise HTTPException(status_code=404, detail="Interview session not found")
@@ -243,7 +415,10 @@ async def get_interview_summary(session_id: str):
         # Get conversation history
         conversation = session.get('conversation_history', [])
         
-        return {
+        # Measured to the last activity, so the body only changes when the session does
+        start_time = session.get('data', {}).get('start_time', session.get('created_at', 0))
+        
+        return FastJSONResponse({
             "session_id": session_id,
             "candidate_name": session.get('data', {}).get('candidate_name', 'Unknown'),
             "position_applied": session.get('data', {}).get('position_applied', 'Unknown'),
@@ -251,30 +426,55 @@ async def get_interview_summary(session_id: str):
             "total_responses": len(responses),
             "average_score": round(avg_score * 100, 2),
             "conversation_turns": len(conversation),
-            "interview_duration": time.time() - session.get('data', {}).get('start_time', time.time()),
+            "interview_duration": session.get('last_activity', start_time) - start_time,
             "recommendation": "hire" if avg_score > 0.7 else "consider" if avg_score > 0.5 else "not_hire",
             "conversation_history": conversation[-10:]  # Last 10 turns
-        }
+        }, headers=cache_headers(etag))
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting interview summary: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to get interview summary: {str(e)}")
 
 @app.get("/api/v1/interviews/{session_id}/conversation")
-async def get_conversation_history(session_id: str):
-    """Get full conversation history"""
+async def get_conversation_history(
+    session_id: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(config.get('session.history.page_size', 100), ge=1,
+                       le=config.get('session.history.max_page_size', 1000)),
+    if_none_match: Optional[str] = Header(None)
+):
+    """Get conversation history a page at a time; pass back next_cursor for the following page.
+
+    Responds 304 when If-None-Match has the current ETag of the session.
+    """
+    bind(session_id=session_id)
     try:
-        session = session_manager.get_session(session_id)
-        if not session:
+        decode_cursor(cursor)
+        version = session_manager.get_session_version(session_id)
+        if version is None:
             raise HTTPException(status_code=404, detail="Interview session not found")
+        etag = session_etag(version)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
         
-        return {
+        page = session_manager.get_conversation_page(session_id, cursor, limit)
+        if page is None:
+            raise HTTPException(status_code=404, detail="Interview session not found")
+        
+        return FastJSONResponse({
             "session_id": session_id,
-            "conversation_history": session.get('conversation_history', []),
-            "questions_asked": session.get('questions_asked', []),
-            "responses_received": session.get('responses_received', [])
-        }
+            "conversation_history": page['conversation_history'],
+            "questions_asked": page['questions_asked'],
+            "responses_received": page['responses_received'],
+            "next_cursor": page['next_cursor']
+        }, headers=cache_headers(etag))
         
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting conversation history: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to get conversation history: {str(e)}")
@@ -363,16 +563,16 @@ async def get_voice_info():
 @app.post("/api/v1/interviews/{session_id}/score")
 async def score_interview_session(session_id: str):
     """Score an interview session"""
+    bind(session_id=session_id)
     try:
-        session = session_manager.get_session(session_id)
-        if not session:
+        if not session_manager.session_exists(session_id):
             raise HTTPException(status_code=404, detail="Interview session not found")
         
         # Get conversation history
         conversation = session_manager.get_conversation(session_id)
         
-        # Score the session
-        score_data = voice_scorer.score_interview_session(conversation)
+        # Score the session off the event loop (recording analysis, reward model)
+        score_data = await asyncio.to_thread(voice_scorer.score_interview_session, conversation)
         
         return {
             "success": True,
@@ -387,13 +587,15 @@ async def score_interview_session(session_id: str):
 @app.post("/api/v1/interviews/{session_id}/score/response")
 async def score_response(session_id: str, request: dict):
     """Score a single response"""
+    bind(session_id=session_id)
     try:
         response_text = request.get('response_text', '')
         if not response_text:
             raise HTTPException(status_code=400, detail="Response text is required")
         
-        # Score the response
-        score_data = voice_scorer.score_response(response_text)
+        # Score the response (delivery is included when a recording is given)
+        score_data = await asyncio.to_thread(
+            voice_scorer.score_response, response_text, recording=request.get('recording'))
         
         return {
             "success": True,
@@ -410,10 +612,10 @@ async def score_response(session_id: str, request: dict):
 async def cleanup_sessions():
     """Clean up expired sessions"""
     try:
-        cleaned_count = session_manager.cleanup_expired_sessions()
+        cleaned_count = await asyncio.to_thread(session_manager.cleanup_expired_sessions)
         return {
             "message": f"Cleaned up {cleaned_count} expired sessions",
-            "active_sessions": len(session_manager.sessions)
+            "active_sessions": session_manager.count_sessions()
         }
     except Exception as e:
         logger.error(f"Error cleaning up sessions: {e}")
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Fast JSON responses for the API
+
+`FastJSONResponse` is the app's default response class. It encodes with
+orjson when installed and falls back to a compact standard library
+encoding otherwise. Hot endpoints return it directly with plain dicts,
+which skips FastAPI's `jsonable_encoder` pass and response-model
+re-validation; their response models still document the shape.
+
+Session read endpoints tag responses with an ETag derived from the
+session version and answer a matching `If-None-Match` with 304 before
+building anything.
+"""
+import datetime
+import json
+from typing import Any, Dict, Optional, Tuple
+
+from starlette.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # optional: the standard library encoder is used without it
+    orjson = None
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(value: Any) -> Any:
+    """Types neither encoder handles natively"""
+    if hasattr(value, 'model_dump'):
+        return value.model_dump(mode='json')
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if hasattr(value, 'tolist'):
+        # numpy scalars and arrays on the standard library path
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=_ORJSON_OPTIONS)
+    return json.dumps(content, ensure_ascii=False, separators=(',', ':'), default=_default).encode('utf-8')
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded with `dumps`"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def session_etag(version: Tuple[int, float]) -> str:
+    """ETag for a session state from SessionManager.get_session_version.
+
+    last_activity is part of the tag so a version number reused after a
+    restart that lost the newest writes cannot match an old tag. The tag is
+    weak because gzip may re-encode the body.
+    """
+    number, last_activity = version
+    return f'W/"{number}.{int(last_activity * 1e6)}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against `etag`"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith('W/') else tag) == opaque:
+            return True
+    return False
+
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    # no-cache: clients may keep the body but must revalidate it on every poll
+    return {'ETag': etag, 'Cache-Control': 'no-cache'}
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag))
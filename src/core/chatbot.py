@@ -10,6 +10,7 @@ import json
 import time
 import random
 from src.speech_interface.tts_module import tts_module
+from src.utils.metrics import span, timed
 
 logger = logging.getLogger(__name__)
 
@@ -107,6 +108,7 @@ class InterviewChatbot:
             logger.error(f"Chatbot training failed: {e}")
             self.trained = False
     
+    @timed('chatbot.get_response')
     def get_response(self, message: str, session_id: str = None) -> Dict[str, Any]:
         """Get enhanced response from chatbot with TTS"""
         if not self.chatbot:
@@ -118,7 +120,8 @@ class InterviewChatbot:
         
         try:
             # Get response from Chatterbox
-            response = self.chatbot.get_response(message)
+            with span('chatbot.match'):
+                response = self.chatbot.get_response(message)
             response_text = str(response)
             
             # Enhance the response to be more interview-appropriate
@@ -128,7 +131,7 @@ class InterviewChatbot:
             if tts_module.is_available() and enhanced_response.strip():
                 try:
                     tts_module.speak(enhanced_response)
-                    logger.info(f"TTS: Spoke response for session {session_id}")
+                    logger.info("TTS: Spoke response for session %s", session_id)
                 except Exception as tts_error:
                     logger.error(f"TTS Error: {tts_error}")
             else:
@@ -161,7 +164,7 @@ class InterviewChatbot:
             # Speak the response using TTS
             if tts_module.is_available():
                 tts_module.speak(enhanced_response)
-                logger.info(f"TTS: Spoke response for session {session_id}")
+                logger.info("TTS: Spoke response for session %s", session_id)
             else:
                 logger.warning("TTS not available, response not spoken")
             
@@ -191,6 +194,7 @@ class InterviewChatbot:
             "tts_available": tts_module.is_available()
         }
 
+    @timed('chatbot.enhance_response')
     def _enhance_response(self, response: str, original_message: str) -> str:
         """Enhance responses to be more interview-appropriate"""
         # Filter out inappropriate responses
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+In-process stand-in for the subset of redis-py used by the session backend
+"""
+import fnmatch
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Any, Optional, Sequence
+
+from src.core.session_backends import POP_EXPIRED_SCRIPT, WRITE_EXISTING_SCRIPT
+
+
+class InProcessRedis:
+    """Thread-safe, single-process Redis replacement with lazy key expiry.
+
+    Values are stored and returned as strings, matching a redis-py client
+    created with ``decode_responses=True``. Lua scripts cannot run here:
+    register_script() accepts only the session backend's scripts and runs a
+    Python equivalent of each under the client lock.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.RLock()
+
+    # Key management
+
+    def _live(self, key: str) -> bool:
+        deadline = self._expires.get(key)
+        if deadline is not None and deadline <= time.time():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    def _get(self, key: str, kind: type, create: bool = False):
+        if not self._live(key):
+            if not create:
+                return None
+            self._data[key] = kind()
+        value = self._data[key]
+        if not isinstance(value, kind):
+            raise TypeError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def _drop_if_empty(self, key: str):
+        if key in self._data and not self._data[key]:
+            del self._data[key]
+            self._expires.pop(key, None)
+
+    def exists(self, *keys: str) -> int:
+        with self._lock:
+            return sum(1 for key in keys if self._live(key))
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            removed = 0
+            for key in keys:
+                if self._live(key):
+                    del self._data[key]
+                    self._expires.pop(key, None)
+                    removed += 1
+            return removed
+
+    def expire(self, key: str, seconds: float) -> bool:
+        with self._lock:
+            if not self._live(key):
+                return False
+            self._expires[key] = time.time() + seconds
+            return True
+
+    def ttl(self, key: str) -> int:
+        with self._lock:
+            if not self._live(key):
+                return -2
+            deadline = self._expires.get(key)
+            if deadline is None:
+                return -1
+            return max(0, int(round(deadline - time.time())))
+
+    def keys(self, pattern: str = '*') -> List[str]:
+        with self._lock:
+            return [key for key in list(self._data) if self._live(key) and fnmatch.fnmatchcase(key, pattern)]
+
+    def scan_iter(self, match: str = '*', count: Optional[int] = None):
+        return iter(self.keys(match))
+
+    def flushdb(self) -> bool:
+        with self._lock:
+            self._data.clear()
+            self._expires.clear()
+            return True
+
+    def ping(self) -> bool:
+        return True
+
+    # Hashes
+
+    def hset(self, name: str, key: Optional[str] = None, value: Any = None,
+             mapping: Optional[Dict[str, Any]] = None) -> int:
+        with self._lock:
+            fields = dict(mapping or {})
+            if key is not None:
+                fields[key] = value
+            store = self._get(name, dict, create=True)
+            added = sum(1 for field in fields if field not in store)
+            for field, field_value in fields.items():
+                store[field] = str(field_value)
+            return added
+
+    def hget(self, name: str, key: str) -> Optional[str]:
+        with self._lock:
+            store = self._get(name, dict)
+            return store.get(key) if store else None
+
+    def hmget(self, name: str, keys: List[str], *args: str) -> List[Optional[str]]:
+        with self._lock:
+            store = self._get(name, dict) or {}
+            return [store.get(key) for key in list(keys) + list(args)]
+
+    def hgetall(self, name: str) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._get(name, dict) or {})
+
+    def hincrby(self, name: str, key: str, amount: int = 1) -> int:
+        with self._lock:
+            store = self._get(name, dict, create=True)
+            value = int(store.get(key, 0)) + amount
+            store[key] = str(value)
+            return value
+
+    def hdel(self, name: str, *keys: str) -> int:
+        with self._lock:
+            store = self._get(name, dict)
+            if not store:
+                return 0
+            removed = sum(1 for key in keys if store.pop(key, None) is not None)
+            self._drop_if_empty(name)
+            return removed
+
+    # Lists
+
+    def rpush(self, name: str, *values: Any) -> int:
+        with self._lock:
+            items = self._get(name, list, create=True)
+            items.extend(str(value) for value in values)
+            return len(items)
+
+    def lrange(self, name: str, start: int, end: int) -> List[str]:
+        with self._lock:
+            items = self._get(name, list) or []
+            end = len(items) if end == -1 else end + 1
+            return items[start:end]
+
+    def llen(self, name: str) -> int:
+        with self._lock:
+            return len(self._get(name, list) or [])
+
+    # Sorted sets
+
+    def zadd(self, name: str, mapping: Dict[str, float]) -> int:
+        with self._lock:
+            store = self._get(name, dict, create=True)
+            added = sum(1 for member in mapping if member not in store)
+            for member, score in mapping.items():
+                store[member] = float(score)
+            return added
+
+    def zrem(self, name: str, *members: str) -> int:
+        with self._lock:
+            store = self._get(name, dict)
+            if not store:
+                return 0
+            removed = sum(1 for member in members if store.pop(member, None) is not None)
+            self._drop_if_empty(name)
+            return removed
+
+    def zcard(self, name: str) -> int:
+        with self._lock:
+            return len(self._get(name, dict) or {})
+
+    def zscore(self, name: str, member: str) -> Optional[float]:
+        with self._lock:
+            store = self._get(name, dict) or {}
+            return store.get(member)
+
+    def zrangebyscore(self, name: str, min: Any, max: Any) -> List[str]:
+        with self._lock:
+            store = self._get(name, dict) or {}
+            low, high = float(min), float(max)
+            ranked = sorted(store.items(), key=lambda item: (item[1], item[0]))
+            return [member for member, score in ranked if low <= score <= high]
+
+    def zremrangebyscore(self, name: str, min: Any, max: Any) -> int:
+        with self._lock:
+            members = self.zrangebyscore(name, min, max)
+            return self.zrem(name, *members) if members else 0
+
+    def zrange(self, name: str, start: int, end: int) -> List[str]:
+        with self._lock:
+            store = self._get(name, dict) or {}
+            ranked = [member for member, _ in sorted(store.items(), key=lambda item: (item[1], item[0]))]
+            end = len(ranked) if end == -1 else end + 1
+            return ranked[start:end]
+
+    # Pipelines and scripts
+
+    def pipeline(self, transaction: bool = True) -> 'InProcessPipeline':
+        return InProcessPipeline(self)
+
+    def register_script(self, script: str) -> 'InProcessScript':
+        if script not in SCRIPTS:
+            raise NotImplementedError("InProcessRedis only runs the session backend's scripts")
+        return InProcessScript(self, SCRIPTS[script])
+
+
+class InProcessPipeline:
+    """Buffers commands and runs them under the client lock on execute()"""
+
+    def __init__(self, client: InProcessRedis):
+        self._client = client
+        self._commands: List[tuple] = []
+
+    def __getattr__(self, name: str):
+        method = getattr(self._client, name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((method, args, kwargs))
+            return self
+
+        return queue
+
+    def __len__(self) -> int:
+        return len(self._commands)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._commands = []
+
+    def execute(self) -> List[Any]:
+        with self._client._lock:
+            results = [method(*args, **kwargs) for method, args, kwargs in self._commands]
+        self._commands = []
+        return results
+
+
+class InProcessScript:
+    """Callable like redis-py's Script, running a Python equivalent atomically"""
+
+    def __init__(self, client: InProcessRedis, function: Callable[[InProcessRedis, List[str], List[str]], Any]):
+        self._client = client
+        self._function = function
+
+    def __call__(self, keys: Sequence[str] = (), args: Sequence[Any] = (), client=None) -> Any:
+        with self._client._lock:
+            return self._function(self._client, list(keys), [str(arg) for arg in args])
+
+
+def _write_existing(client: InProcessRedis, keys: List[str], args: List[str]) -> int:
+    meta_key, *list_keys, index_key = keys
+    ttl, now, session_id, changes = args
+    if not client.exists(meta_key):
+        return 0
+    changes = json.loads(changes)
+    if changes['meta']:
+        client.hset(meta_key, mapping=changes['meta'])
+    client.hincrby(meta_key, 'version', 1)
+    client.expire(meta_key, float(ttl))
+    for n, key in enumerate(list_keys, 1):
+        change = changes['lists'].get(str(n))
+        if change:
+            if change['replace']:
+                client.delete(key)
+            if change['values']:
+                client.rpush(key, *change['values'])
+        client.expire(key, float(ttl))
+    client.zadd(index_key, {session_id: float(now)})
+    return 1
+
+
+def _pop_expired(client: InProcessRedis, keys: List[str], args: List[str]) -> Optional[List[Any]]:
+    meta_key, *list_keys, index_key = keys
+    now, timeout, session_id = args
+    last_activity = client.hget(meta_key, 'last_activity')
+    if last_activity is None or float(now) - float(last_activity) <= float(timeout):
+        return None
+    meta = [item for pair in client.hgetall(meta_key).items() for item in pair]
+    session = [meta] + [client.lrange(key, 0, -1) for key in list_keys]
+    client.delete(meta_key, *list_keys)
+    client.zrem(index_key, session_id)
+    return session
+
+
+SCRIPTS = {WRITE_EXISTING_SCRIPT: _write_existing, POP_EXPIRED_SCRIPT: _pop_expired}
@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+Storage backends for the interview SessionManager
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Any, Optional, Iterator, Tuple
+
+from src.core.session_record import LIST_FIELDS, SessionRecord
+from src.core.session_spill import SpillStore
+
+logger = logging.getLogger(__name__)
+
+# Lua scripts run by RedisSessionBackend (emulated by InProcessRedis). Both
+# take KEYS = the session hash, its list keys in LIST_FIELDS order, the index.
+
+# ARGV: key TTL, last_activity, session id, JSON {"meta": {field: value},
+# "lists": {"<n>": {"replace": bool, "values": [...]}}} with n the list's
+# position. Returns 0 without writing anything if the session does not exist.
+WRITE_EXISTING_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+local changes = cjson.decode(ARGV[4])
+for field, value in pairs(changes.meta) do
+    redis.call('HSET', KEYS[1], field, value)
+end
+redis.call('HINCRBY', KEYS[1], 'version', 1)
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+for n = 2, #KEYS - 1 do
+    local list = changes.lists[tostring(n - 1)]
+    if list then
+        if list.replace then
+            redis.call('DEL', KEYS[n])
+        end
+        for i = 1, #list.values, 1000 do
+            redis.call('RPUSH', KEYS[n], unpack(list.values, i, math.min(i + 999, #list.values)))
+        end
+    end
+    redis.call('EXPIRE', KEYS[n], ARGV[1])
+end
+redis.call('ZADD', KEYS[#KEYS], ARGV[2], ARGV[3])
+return 1
+"""
+
+# ARGV: now, timeout, session id. Deletes the session and returns
+# {HGETALL, LRANGE per list} if it has been idle for longer than the
+# timeout; otherwise returns nil and changes nothing.
+POP_EXPIRED_SCRIPT = """
+local last_activity = redis.call('HGET', KEYS[1], 'last_activity')
+if not last_activity or tonumber(ARGV[1]) - tonumber(last_activity) <= tonumber(ARGV[2]) then
+    return false
+end
+local session = {redis.call('HGETALL', KEYS[1])}
+for n = 2, #KEYS - 1 do
+    session[n] = redis.call('LRANGE', KEYS[n], 0, -1)
+end
+redis.call('DEL', unpack(KEYS, 1, #KEYS - 1))
+redis.call('ZREM', KEYS[#KEYS], ARGV[3])
+return session
+"""
+
+
+class SessionBackend:
+    """Interface implemented by every session store"""
+
+    def create(self, session_id: str, session_data: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def exists(self, session_id: str) -> bool:
+        raise NotImplementedError
+
+    def update(self, session_id: str, updates: Dict[str, Any], now: float) -> bool:
+        raise NotImplementedError
+
+    def append(self, session_id: str, items: Dict[str, List[Dict[str, Any]]], now: float) -> bool:
+        """Append to one or more list fields and touch last_activity in a single operation"""
+        raise NotImplementedError
+
+    def get_list(self, session_id: str, field: str) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def get_range(self, session_id: str, field: str, start: int, stop: int) -> List[Dict[str, Any]]:
+        """Items [start, stop) of a list field; positions never change once appended"""
+        return self.get_list(session_id, field)[start:stop]
+
+    def summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def version(self, session_id: str) -> Optional[Tuple[int, float]]:
+        """(version, last_activity) of a session, or None if it does not exist.
+
+        The version goes up by one with every update or append, so the pair
+        changes whenever the session's content does.
+        """
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> bool:
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def last_activity(self, session_id: str) -> Optional[float]:
+        raise NotImplementedError
+
+    def pop_expired(self, session_id: str, now: float, timeout: float) -> Optional[Dict[str, Any]]:
+        """Remove and return the session if it has been idle for longer than timeout"""
+        raise NotImplementedError
+
+    def activity(self) -> Iterator[Tuple[str, float]]:
+        """(session_id, last_activity) for sessions whose expiry the SessionManager must schedule"""
+        return iter(())
+
+    def close(self) -> None:
+        """Release connections, files or threads held by the backend"""
+
+
+class InMemorySessionBackend(SessionBackend):
+    """Process-local sessions, sharded by session id with one lock per shard.
+
+    Sessions are held as compact SessionRecords. Every operation on a
+    session holds its shard lock, so concurrent writers never lose appends
+    and readers get copies that reflect whole writes; reads copy the
+    record's columns under the lock and build the dicts after releasing it.
+    With a SpillStore, each session keeps only its most recent items in
+    memory and the rest on disk.
+    """
+
+    def __init__(self, shards: int = 64, spill: Optional[SpillStore] = None):
+        self.shards: List[Dict[str, SessionRecord]] = [{} for _ in range(shards)]
+        self.locks = [threading.RLock() for _ in range(shards)]
+        self.spill = spill
+
+    def _shard(self, session_id: str) -> Tuple[Dict[str, SessionRecord], threading.RLock]:
+        index = hash(session_id) % len(self.shards)
+        return self.shards[index], self.locks[index]
+
+    # Lock-free helpers; callers hold the shard lock
+
+    def _update_locked(self, shard, session_id: str, updates: Dict[str, Any], now: float) -> bool:
+        record = shard.get(session_id)
+        if record is None:
+            return False
+        record.update(updates, now, self.spill)
+        record.version += 1
+        return True
+
+    def _append_locked(self, shard, session_id: str, items: Dict[str, List[Dict[str, Any]]], now: float) -> bool:
+        record = shard.get(session_id)
+        if record is None:
+            return False
+        record.append(items, now, self.spill)
+        record.version += 1
+        return True
+
+    def _pop_expired_locked(self, shard, session_id: str, now: float, timeout: float) -> Optional[SessionRecord]:
+        record = shard.get(session_id)
+        if record is None or now - record.last_activity <= timeout:
+            return None
+        return shard.pop(session_id)
+
+    def _release(self, session_id: str, record: Optional[SessionRecord]):
+        # Spill files of a removed session; called after the shard lock is released
+        if record is not None and record.spilled and self.spill is not None:
+            self.spill.remove(session_id)
+
+    def create(self, session_id: str, session_data: Dict[str, Any]) -> None:
+        record = SessionRecord(session_data, self.spill)
+        shard, lock = self._shard(session_id)
+        with lock:
+            shard[session_id] = record
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        shard, lock = self._shard(session_id)
+        with lock:
+            record = shard.get(session_id)
+            if record is None:
+                return None
+            record = record.copy()
+        return record.to_dict(self.spill)
+
+    def exists(self, session_id: str) -> bool:
+        shard, lock = self._shard(session_id)
+        with lock:
+            return session_id in shard
+
+    def update(self, session_id: str, updates: Dict[str, Any], now: float) -> bool:
+        shard, lock = self._shard(session_id)
+        with lock:
+            return self._update_locked(shard, session_id, updates, now)
+
+    def append(self, session_id: str, items: Dict[str, List[Dict[str, Any]]], now: float) -> bool:
+        shard, lock = self._shard(session_id)
+        with lock:
+            return self._append_locked(shard, session_id, items, now)
+
+    def get_list(self, session_id: str, field: str) -> List[Dict[str, Any]]:
+        shard, lock = self._shard(session_id)
+        with lock:
+            record = shard.get(session_id)
+            if record is None or field not in LIST_FIELDS:
+                return []
+            record = record.copy()
+        return record.items(field, spill=self.spill)
+
+    def get_range(self, session_id: str, field: str, start: int, stop: int) -> List[Dict[str, Any]]:
+        shard, lock = self._shard(session_id)
+        with lock:
+            record = shard.get(session_id)
+            if record is None or field not in LIST_FIELDS:
+                return []
+            record = record.copy()
+        return record.items(field, start, stop, self.spill)
+
+    def summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        shard, lock = self._shard(session_id)
+        with lock:
+            record = shard.get(session_id)
+            if record is None:
+                return None
+            summary = record.summary()
+            summary['session_id'] = session_id
+            return summary
+
+    def version(self, session_id: str) -> Optional[Tuple[int, float]]:
+        shard, lock = self._shard(session_id)
+        with lock:
+            record = shard.get(session_id)
+            return (record.version, record.last_activity) if record is not None else None
+
+    def delete(self, session_id: str) -> bool:
+        shard, lock = self._shard(session_id)
+        with lock:
+            record = shard.pop(session_id, None)
+        self._release(session_id, record)
+        return record is not None
+
+    def count(self) -> int:
+        return sum(len(shard) for shard in self.shards)
+
+    def last_activity(self, session_id: str) -> Optional[float]:
+        shard, lock = self._shard(session_id)
+        with lock:
+            record = shard.get(session_id)
+            return record.last_activity if record is not None else None
+
+    def pop_expired(self, session_id: str, now: float, timeout: float) -> Optional[Dict[str, Any]]:
+        shard, lock = self._shard(session_id)
+        with lock:
+            record = self._pop_expired_locked(shard, session_id, now, timeout)
+        if record is None:
+            return None
+        session = record.to_dict(self.spill)
+        self._release(session_id, record)
+        return session
+
+    def activity(self) -> Iterator[Tuple[str, float]]:
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                entries = [(session_id, record.last_activity) for session_id, record in shard.items()]
+            yield from entries
+
+    def close(self) -> None:
+        if self.spill is not None:
+            self.spill.close()
+
+
+class RedisSessionBackend(SessionBackend):
+    """Redis store: one hash per session, one list per appended field.
+
+    Every key carries a native TTL of the session timeout plus
+    `expiry_grace`, refreshed on each write. The expiry scheduler pops an
+    idle session (and hands it to the expiry hooks) once the timeout
+    passes; the grace period keeps the keys alive until it gets there, and
+    the TTL still clears sessions no scheduler is watching. A sorted set
+    keyed by last_activity is kept only to answer count() cheaply.
+
+    Writes to an existing session and expiry run as Lua scripts, so each
+    is one atomic round trip: a write never recreates a session that is
+    gone, and only one worker can pop an expired session.
+    """
+
+    def __init__(self, client, session_timeout: int = 3600, prefix: str = 'nishu:session:',
+                 expiry_grace: int = 300):
+        self.client = client
+        self.session_timeout = int(session_timeout)
+        self.key_ttl = self.session_timeout + int(expiry_grace)
+        self.prefix = prefix
+        self.index_key = prefix.rstrip(':') + 's'
+        self._write_script = client.register_script(WRITE_EXISTING_SCRIPT)
+        self._pop_script = client.register_script(POP_EXPIRED_SCRIPT)
+
+    @classmethod
+    def from_config(cls, redis_config: Dict[str, Any], session_timeout: int) -> 'RedisSessionBackend':
+        """Connect using config.yaml settings, overridden by REDIS_HOST/REDIS_PORT/REDIS_DB"""
+        import redis
+
+        client = redis.Redis(
+            host=os.environ.get('REDIS_HOST', redis_config.get('host', 'localhost')),
+            port=int(os.environ.get('REDIS_PORT', redis_config.get('port', 6379))),
+            db=int(os.environ.get('REDIS_DB', redis_config.get('db', 0))),
+            decode_responses=True
+        )
+        client.ping()
+        return cls(client, session_timeout, expiry_grace=redis_config.get('expiry_grace', 300))
+
+    def _meta_key(self, session_id: str) -> str:
+        return f"{self.prefix}{session_id}"
+
+    def _list_key(self, session_id: str, field: str) -> str:
+        return f"{self.prefix}{session_id}:{field}"
+
+    def _all_keys(self, session_id: str) -> List[str]:
+        return [self._meta_key(session_id)] + [self._list_key(session_id, f) for f in LIST_FIELDS]
+
+    def _touch(self, pipe, session_id: str, now: float):
+        """Queue TTL refresh for every key of the session"""
+        for key in self._all_keys(session_id):
+            pipe.expire(key, self.key_ttl)
+        pipe.zadd(self.index_key, {session_id: now})
+
+    @staticmethod
+    def _encode(value: Any) -> str:
+        return json.dumps(value, default=str)
+
+    def _encode_meta(self, fields: Dict[str, Any]) -> Dict[str, str]:
+        return {key: self._encode(value) for key, value in fields.items() if key not in LIST_FIELDS}
+
+    @staticmethod
+    def _decode_meta(meta: Dict[str, str]) -> Dict[str, Any]:
+        return {key: json.loads(value) for key, value in meta.items()}
+
+    def create(self, session_id: str, session_data: Dict[str, Any]) -> None:
+        pipe = self.client.pipeline()
+        pipe.delete(*self._all_keys(session_id))
+        meta = self._encode_meta(session_data)
+        meta.setdefault('version', '0')
+        pipe.hset(self._meta_key(session_id), mapping=meta)
+        for field in LIST_FIELDS:
+            values = session_data.get(field)
+            if values:
+                pipe.rpush(self._list_key(session_id, field), *[self._encode(v) for v in values])
+        self._touch(pipe, session_id, session_data.get('last_activity', 0))
+        pipe.execute()
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hgetall(self._meta_key(session_id))
+        for field in LIST_FIELDS:
+            pipe.lrange(self._list_key(session_id, field), 0, -1)
+        meta, *lists = pipe.execute()
+        if not meta:
+            return None
+        session = self._decode_meta(meta)
+        for field, values in zip(LIST_FIELDS, lists):
+            session[field] = [json.loads(v) for v in values]
+        return session
+
+    def exists(self, session_id: str) -> bool:
+        return bool(self.client.exists(self._meta_key(session_id)))
+
+    def _write_existing(self, session_id: str, now: float, meta: Dict[str, Any],
+                        lists: Dict[str, Tuple[bool, List[Dict[str, Any]]]]) -> bool:
+        """Set `meta` and extend (or, flagged True, replace) `lists` only if the session exists.
+
+        Also bumps the version and refreshes the TTLs, all in WRITE_EXISTING_SCRIPT.
+        """
+        changes = {
+            'meta': self._encode_meta(meta),
+            'lists': {str(LIST_FIELDS.index(field) + 1): {'replace': replace,
+                                                          'values': [self._encode(v) for v in values]}
+                      for field, (replace, values) in lists.items()}
+        }
+        written = self._write_script(keys=self._all_keys(session_id) + [self.index_key],
+                                     args=[self.key_ttl, now, session_id, json.dumps(changes)])
+        return bool(written)
+
+    def update(self, session_id: str, updates: Dict[str, Any], now: float) -> bool:
+        meta = dict(updates)
+        meta['last_activity'] = now
+        lists = {field: (True, updates[field] or []) for field in LIST_FIELDS if field in updates}
+        return self._write_existing(session_id, now, meta, lists)
+
+    def append(self, session_id: str, items: Dict[str, List[Dict[str, Any]]], now: float) -> bool:
+        lists = {field: (False, values) for field, values in items.items() if values}
+        return self._write_existing(session_id, now, {'last_activity': now}, lists)
+
+    def get_list(self, session_id: str, field: str) -> List[Dict[str, Any]]:
+        return [json.loads(v) for v in self.client.lrange(self._list_key(session_id, field), 0, -1)]
+
+    def get_range(self, session_id: str, field: str, start: int, stop: int) -> List[Dict[str, Any]]:
+        if stop <= start:
+            return []
+        return [json.loads(v) for v in self.client.lrange(self._list_key(session_id, field), start, stop - 1)]
+
+    def summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hmget(self._meta_key(session_id), ['created_at', 'last_activity'])
+        for field in LIST_FIELDS:
+            pipe.llen(self._list_key(session_id, field))
+        (created_at, last_activity), questions, responses, turns = pipe.execute()
+        if created_at is None:
+            return None
+        return {
+            'session_id': session_id,
+            'total_questions': questions,
+            'total_responses': responses,
+            'conversation_turns': turns,
+            'created_at': json.loads(created_at),
+            'last_activity': json.loads(last_activity) if last_activity else 0
+        }
+
+    def version(self, session_id: str) -> Optional[Tuple[int, float]]:
+        version, last_activity = self.client.hmget(self._meta_key(session_id), ['version', 'last_activity'])
+        if last_activity is None:
+            return None
+        return int(version or 0), json.loads(last_activity)
+
+    def delete(self, session_id: str) -> bool:
+        pipe = self.client.pipeline()
+        pipe.delete(*self._all_keys(session_id))
+        pipe.zrem(self.index_key, session_id)
+        removed, _ = pipe.execute()
+        return bool(removed)
+
+    def count(self) -> int:
+        # Keys expire on their own; the index only needs its stale members trimmed
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(self.index_key, '-inf', time.time() - self.session_timeout)
+        pipe.zcard(self.index_key)
+        return pipe.execute()[1]
+
+    def last_activity(self, session_id: str) -> Optional[float]:
+        value = self.client.hget(self._meta_key(session_id), 'last_activity')
+        return json.loads(value) if value is not None else None
+
+    def pop_expired(self, session_id: str, now: float, timeout: float) -> Optional[Dict[str, Any]]:
+        # The key TTLs run expiry_grace past the timeout, so the session is normally still here
+        popped = self._pop_script(keys=self._all_keys(session_id) + [self.index_key],
+                                  args=[now, timeout, session_id])
+        if not popped:
+            return None
+        meta, *lists = popped
+        session = self._decode_meta(dict(zip(meta[::2], meta[1::2])))
+        for field, values in zip(LIST_FIELDS, lists):
+            session[field] = [json.loads(v) for v in values]
+        return session
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Deadline-driven session expiry
+"""
+import asyncio
+import heapq
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Called as hook(session_id, session) after a session expired; session is None if it was already gone
+ExpiryHook = Callable[[str, Optional[Dict[str, Any]]], None]
+
+
+class SessionExpiryScheduler:
+    """Min-heap of (deadline, session_id) entries.
+
+    Deadlines are only pushed when a session is created, so touching a
+    session costs nothing here. When an entry comes due, the session's
+    real last_activity is checked: if it was touched in the meantime the
+    entry is pushed back with the new deadline, otherwise the session is
+    removed and the expiry hooks run.
+    """
+
+    def __init__(self, backend, session_timeout: float, batch_size: int = 500, max_sleep: float = 60.0):
+        self.backend = backend
+        self.session_timeout = session_timeout
+        self.batch_size = batch_size
+        self.max_sleep = max_sleep
+        self.hooks: List[ExpiryHook] = []
+        self._heap: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._batch: Optional[asyncio.Future] = None
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def add_hook(self, hook: ExpiryHook):
+        self.hooks.append(hook)
+
+    def schedule(self, session_id: str, last_activity: float):
+        with self._lock:
+            heapq.heappush(self._heap, (last_activity + self.session_timeout, session_id))
+
+    def next_deadline(self) -> Optional[float]:
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def run_due(self, now: Optional[float] = None, limit: Optional[int] = None) -> List[str]:
+        """Process entries whose deadline has passed; returns the ids that expired"""
+        now = time.time() if now is None else now
+        expired = []
+        processed = 0
+        while limit is None or processed < limit:
+            with self._lock:
+                if not self._heap or self._heap[0][0] > now:
+                    break
+                _, session_id = heapq.heappop(self._heap)
+            processed += 1
+
+            last_activity = self.backend.last_activity(session_id)
+            if last_activity is None:
+                # Deleted explicitly, or already expired by the store itself (Redis TTL);
+                # hooks still run so per-session resources are released
+                self._run_hooks(session_id, None)
+                continue
+            if last_activity + self.session_timeout > now:
+                self.schedule(session_id, last_activity)
+                continue
+
+            session = self.backend.pop_expired(session_id, now, self.session_timeout)
+            if session is None:
+                # Touched between the check and the removal
+                last_activity = self.backend.last_activity(session_id)
+                if last_activity is not None:
+                    self.schedule(session_id, last_activity)
+                continue
+            expired.append(session_id)
+            self._run_hooks(session_id, session)
+        return expired
+
+    def _run_hooks(self, session_id: str, session: Optional[Dict[str, Any]]):
+        for hook in self.hooks:
+            try:
+                hook(session_id, session)
+            except Exception as e:
+                logger.error(f"Session expiry hook {getattr(hook, '__name__', hook)} failed for {session_id}: {e}")
+
+    async def run(self):
+        """Sleep until the earliest deadline, expire what is due, repeat"""
+        while True:
+            deadline = self.next_deadline()
+            delay = self.max_sleep if deadline is None else min(max(deadline - time.time(), 0.0), self.max_sleep)
+            await asyncio.sleep(delay)
+            try:
+                # Bounded batches on a worker thread: run_due makes blocking backend calls
+                # (Redis round trips, journal shard locks), and the heap has its own lock
+                while True:
+                    self._batch = asyncio.ensure_future(asyncio.to_thread(self.run_due, None, self.batch_size))
+                    # Shielded: stop() waits for a running batch rather than leaving it behind
+                    expired = await asyncio.shield(self._batch)
+                    if expired:
+                        logger.info("Expired %d idle sessions", len(expired))
+                    deadline = self.next_deadline()
+                    if deadline is None or deadline > time.time():
+                        break
+            except Exception as e:
+                logger.error(f"Session expiry pass failed: {e}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._batch is not None:
+            # A batch still running on its thread must finish before the backend is closed
+            try:
+                await self._batch
+            except Exception as e:
+                logger.error(f"Session expiry pass failed: {e}")
+            self._batch = None
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Append-only journal and snapshots for crash-safe in-memory sessions
+"""
+import gc
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Any, Optional, Iterable, Iterator, Tuple
+
+from src.core.session_backends import InMemorySessionBackend
+from src.core.session_record import SessionRecord
+from src.core.session_spill import SpillStore
+
+try:
+    import orjson
+except ImportError:  # optional: roughly 3-5x faster journal encoding and recovery
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ('always', 'interval', 'never')
+_SEGMENT_RE = re.compile(r'(?:journal|snapshot)-(\d+)\.')
+
+
+def _dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=str)
+    return json.dumps(obj, separators=(',', ':'), default=str).encode('utf-8')
+
+
+def _loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _segment_number(path: str) -> int:
+    match = _SEGMENT_RE.search(os.path.basename(path))
+    return int(match.group(1)) if match else -1
+
+
+class SessionJournal:
+    """Batched append-only log split into numbered segments.
+
+    ``snapshot-N.jsonl`` holds the full state as of the start of
+    ``journal-N.log``; recovery loads the newest snapshot and replays
+    segments N and later. Records are buffered and written by a background
+    thread every ``flush_interval`` seconds; callers only pay for JSON
+    encoding unless the buffer exceeds ``max_pending_bytes``.
+    """
+
+    def __init__(self, directory: str, fsync: str = 'interval', flush_interval: float = 0.05,
+                 max_pending_bytes: int = 4 * 1024 * 1024):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, got {fsync!r}")
+        self.directory = directory
+        self.fsync = fsync
+        self.flush_interval = flush_interval
+        self.max_pending_bytes = max_pending_bytes
+        self.segment = 0
+        self.segment_records = 0
+
+        self._file = None
+        self._pending: List[bytes] = []
+        self._pending_bytes = 0
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._closed = False
+        self._flusher: Optional[threading.Thread] = None
+        self._snapshotter: Optional[threading.Thread] = None
+
+        os.makedirs(directory, exist_ok=True)
+
+    # Reading
+
+    def _paths(self, kind: str) -> List[str]:
+        pattern = os.path.join(self.directory, f"{kind}-*.log" if kind == 'journal' else f"{kind}-*.jsonl")
+        return sorted(glob.glob(pattern), key=_segment_number)
+
+    def latest_snapshot(self) -> Optional[Tuple[int, str]]:
+        snapshots = self._paths('snapshot')
+        if not snapshots:
+            return None
+        return _segment_number(snapshots[-1]), snapshots[-1]
+
+    @staticmethod
+    def read_snapshot(path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        with open(path, 'rb') as f:
+            f.readline()  # header
+            for line in f:
+                entry = _loads(line)
+                yield entry['sid'], entry['session']
+
+    def read_records(self, from_segment: int = 0) -> Iterator[Dict[str, Any]]:
+        """Yield logged records from segment `from_segment` onwards, stopping at a torn tail"""
+        for path in self._paths('journal'):
+            if _segment_number(path) < from_segment:
+                continue
+            with open(path, 'rb') as f:
+                for line_number, line in enumerate(f, 1):
+                    try:
+                        yield _loads(line)
+                    except ValueError:
+                        logger.warning(f"Ignoring torn journal record at {path}:{line_number}")
+                        break
+
+    # Writing
+
+    def open(self):
+        """Start a fresh segment after everything already on disk and start the flusher"""
+        existing = self._paths('journal') + self._paths('snapshot')
+        self.segment = max((_segment_number(p) for p in existing), default=0) + 1
+        self._file = open(self._segment_path(self.segment), 'ab')
+        if self.fsync != 'always':
+            self._flusher = threading.Thread(target=self._flush_loop, name='session-journal', daemon=True)
+            self._flusher.start()
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"journal-{segment:06d}.log")
+
+    def append(self, record: Dict[str, Any]) -> int:
+        """Buffer a record; returns the number of records in the current segment"""
+        line = _dumps(record) + b'\n'
+        with self._lock:
+            self._pending.append(line)
+            self._pending_bytes += len(line)
+            self.segment_records += 1
+            records = self.segment_records
+            # Durable-per-record mode, or back-pressure when the disk falls behind
+            must_write = self.fsync == 'always' or self._pending_bytes >= self.max_pending_bytes
+        if must_write:
+            self.flush()
+        return records
+
+    def _take_pending(self) -> bytes:
+        """Detach the buffered records; caller holds the buffer lock"""
+        batch = b''.join(self._pending)
+        self._pending = []
+        self._pending_bytes = 0
+        return batch
+
+    def _write(self, batch: bytes):
+        """Write a batch to the current segment; caller holds the I/O lock"""
+        if not batch or self._file is None:
+            return
+        self._file.write(batch)
+        self._file.flush()
+        if self.fsync != 'never':
+            os.fsync(self._file.fileno())
+
+    def flush(self):
+        # The I/O lock keeps batches in order; appenders only ever wait for the buffer lock
+        with self._io_lock:
+            with self._lock:
+                batch = self._take_pending()
+            self._write(batch)
+
+    def _flush_loop(self):
+        while True:
+            with self._lock:
+                if self._closed:
+                    return
+                self._wakeup.wait(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Session journal flush failed: {e}")
+
+    def rotate(self) -> int:
+        """Close the current segment and start the next one; returns the new segment number"""
+        with self._io_lock:
+            with self._lock:
+                batch = self._take_pending()
+                self._write(batch)
+                self._file.close()
+                self.segment += 1
+                self.segment_records = 0
+                self._file = open(self._segment_path(self.segment), 'ab')
+                return self.segment
+
+    def write_snapshot(self, segment: int, sessions: Iterable[Tuple[str, Dict[str, Any]]], count: int,
+                       background: bool = True):
+        """Persist `count` sessions (state as of the start of `segment`) and drop what it supersedes.
+
+        `sessions` may be a lazy iterator; it is consumed by whichever thread
+        writes the file. A snapshot still being written is waited for first.
+        """
+        if self._snapshotter is not None and self._snapshotter.is_alive():
+            self._snapshotter.join()
+        if background:
+            self._snapshotter = threading.Thread(
+                target=self._write_snapshot, args=(segment, sessions, count), name='session-snapshot', daemon=True
+            )
+            self._snapshotter.start()
+        else:
+            self._write_snapshot(segment, sessions, count)
+
+    def _write_snapshot(self, segment: int, sessions: Iterable[Tuple[str, Dict[str, Any]]], count: int):
+        path = os.path.join(self.directory, f"snapshot-{segment:06d}.jsonl")
+        tmp_path = path + '.tmp'
+        started = time.time()
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(_dumps({'segment': segment, 'sessions': count, 'created_at': started}) + b'\n')
+                for session_id, session in sessions:
+                    f.write(_dumps({'sid': session_id, 'session': session}) + b'\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"Session snapshot {segment} failed: {e}")
+            return
+
+        # Older snapshots and the segments they cover are no longer needed
+        for old in self._paths('snapshot') + self._paths('journal'):
+            if _segment_number(old) < segment:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+        logger.info(f"Session snapshot {segment} written ({count} sessions, {time.time() - started:.2f}s)")
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify_all()
+        if self._flusher is not None:
+            self._flusher.join()
+        if self._snapshotter is not None:
+            self._snapshotter.join()
+        with self._io_lock:
+            with self._lock:
+                batch = self._take_pending()
+            self._write(batch)
+            if self._file is not None:
+                if self.fsync == 'never':
+                    os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+
+
+class JournaledSessionBackend(InMemorySessionBackend):
+    """In-memory sessions whose mutations are journaled for recovery after a restart.
+
+    A mutation and its journal record happen under the session's shard
+    lock; a snapshot takes every shard lock while it rotates the segment and
+    copies the state, so each snapshot matches an exact journal position.
+    """
+
+    def __init__(self, journal: SessionJournal, snapshot_every: int = 100000, shards: int = 64,
+                 spill: Optional[SpillStore] = None):
+        super().__init__(shards, spill)
+        self.journal = journal
+        self.snapshot_every = snapshot_every
+        self.recovery_seconds = 0.0
+        self._snapshot_lock = threading.Lock()
+        self._snapshotter: Optional[threading.Thread] = None
+
+        replayed = self._recover()
+        self.journal.open()
+        if self.snapshot_every and replayed >= self.snapshot_every:
+            self.snapshot()
+
+    def _recover(self) -> int:
+        started = time.time()
+        # Recovery allocates millions of long-lived objects; cyclic GC passes over them are wasted work
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            replayed = self._load()
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+        self.recovery_seconds = time.time() - started
+        if self.count():
+            logger.info(f"Recovered {self.count()} sessions in {self.recovery_seconds:.2f}s")
+        return replayed
+
+    def _load(self) -> int:
+        from_segment = 0
+        snapshot = self.journal.latest_snapshot()
+        if snapshot:
+            from_segment, path = snapshot
+            for session_id, session in self.journal.read_snapshot(path):
+                InMemorySessionBackend.create(self, session_id, session)
+
+        replayed = 0
+        for record in self.journal.read_records(from_segment):
+            self._apply(record)
+            replayed += 1
+        return replayed
+
+    def _apply(self, record: Dict[str, Any]):
+        op = record['op']
+        session_id = record['sid']
+        if op == 'create':
+            super().create(session_id, record['session'])
+        elif op == 'update':
+            super().update(session_id, record['updates'], record['t'])
+        elif op == 'append':
+            super().append(session_id, record['items'], record['t'])
+        elif op == 'delete':
+            super().delete(session_id)
+
+    def _record(self, record: Dict[str, Any]) -> bool:
+        """Journal a mutation (caller holds the shard lock); True when a snapshot is due"""
+        records = self.journal.append(record)
+        return bool(self.snapshot_every) and records >= self.snapshot_every
+
+    def _maybe_snapshot(self, due: bool):
+        # Runs after the shard lock is released; concurrent triggers collapse into one snapshot
+        if due and self.journal.segment_records >= self.snapshot_every:
+            self.snapshot(wait=False)
+
+    def snapshot(self, background: bool = True, wait: bool = True):
+        """Rotate the journal and write a compacted snapshot of the current state.
+
+        With `background` all of the work, including copying the records
+        under the shard locks, happens on a snapshot thread, so the write
+        that triggers a snapshot does not pay for it. Without `wait`, a
+        snapshot is skipped while the previous one is still running; the
+        next write past the threshold tries again.
+        """
+        if not self._snapshot_lock.acquire(blocking=wait):
+            return
+        try:
+            if self._snapshotter is not None and self._snapshotter.is_alive():
+                if not wait:
+                    return
+                self._snapshotter.join()
+            if background:
+                self._snapshotter = threading.Thread(target=self._snapshot_logged, name='session-snapshot',
+                                                     daemon=True)
+                self._snapshotter.start()
+            else:
+                self._snapshot()
+        finally:
+            self._snapshot_lock.release()
+
+    def _snapshot_logged(self):
+        try:
+            self._snapshot()
+        except Exception as e:
+            logger.error(f"Session snapshot failed: {e}")
+
+    def _snapshot(self):
+        for lock in self.locks:
+            lock.acquire()
+        try:
+            segment = self.journal.rotate()
+            records = [
+                (session_id, record.copy())
+                for shard in self.shards
+                for session_id, record in shard.items()
+            ]
+        finally:
+            for lock in reversed(self.locks):
+                lock.release()
+        # Spilled items are read back here, outside the locks
+        spill = self.spill
+        sessions = ((session_id, record.to_dict(spill)) for session_id, record in records)
+        self.journal.write_snapshot(segment, sessions, len(records), background=False)
+
+    def create(self, session_id: str, session_data: Dict[str, Any]) -> None:
+        record = SessionRecord(session_data, self.spill)
+        shard, lock = self._shard(session_id)
+        with lock:
+            shard[session_id] = record
+            due = self._record({'op': 'create', 'sid': session_id, 'session': session_data})
+        self._maybe_snapshot(due)
+
+    def update(self, session_id: str, updates: Dict[str, Any], now: float) -> bool:
+        shard, lock = self._shard(session_id)
+        with lock:
+            if not self._update_locked(shard, session_id, updates, now):
+                return False
+            due = self._record({'op': 'update', 'sid': session_id, 'updates': updates, 't': now})
+        self._maybe_snapshot(due)
+        return True
+
+    def append(self, session_id: str, items: Dict[str, List[Dict[str, Any]]], now: float) -> bool:
+        shard, lock = self._shard(session_id)
+        with lock:
+            if not self._append_locked(shard, session_id, items, now):
+                return False
+            due = self._record({'op': 'append', 'sid': session_id, 'items': items, 't': now})
+        self._maybe_snapshot(due)
+        return True
+
+    def delete(self, session_id: str) -> bool:
+        shard, lock = self._shard(session_id)
+        with lock:
+            record = shard.pop(session_id, None)
+            if record is None:
+                return False
+            due = self._record({'op': 'delete', 'sid': session_id})
+        self._release(session_id, record)
+        self._maybe_snapshot(due)
+        return True
+
+    def pop_expired(self, session_id: str, now: float, timeout: float) -> Optional[Dict[str, Any]]:
+        shard, lock = self._shard(session_id)
+        with lock:
+            record = self._pop_expired_locked(shard, session_id, now, timeout)
+            if record is None:
+                return None
+            due = self._record({'op': 'delete', 'sid': session_id})
+        session = record.to_dict(self.spill)
+        self._release(session_id, record)
+        self._maybe_snapshot(due)
+        return session
+
+    def close(self):
+        with self._snapshot_lock:
+            if self._snapshotter is not None:
+                self._snapshotter.join()
+        self.journal.close()
+        super().close()
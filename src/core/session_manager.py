@@ -3,20 +3,50 @@
 Simple Session Manager for Interview System
 """
 import json
+import os
 import uuid
 import time
 import logging
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
+
+from src.core.session_backends import SessionBackend, InMemorySessionBackend, RedisSessionBackend
+from src.core.session_expiry import SessionExpiryScheduler, ExpiryHook
+from src.core.session_journal import SessionJournal, JournaledSessionBackend
+from src.core.session_record import LIST_FIELDS
+from src.core.session_spill import SpillStore
+from src.utils.config import config
+from src.utils.metrics import timed
 
 logger = logging.getLogger(__name__)
 
+def encode_cursor(positions: List[int]) -> str:
+    """Cursor for the next page: the position reached in each list field"""
+    return '.'.join(str(position) for position in positions)
+
+def decode_cursor(cursor: Optional[str]) -> List[int]:
+    if not cursor:
+        return [0] * len(LIST_FIELDS)
+    try:
+        positions = [int(part) for part in cursor.split('.')]
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    if len(positions) != len(LIST_FIELDS) or min(positions) < 0:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return positions
+
 class SessionManager:
-    """Simple in-memory session manager"""
+    """Session manager delegating storage to a pluggable backend"""
     
-    def __init__(self):
-        self.sessions = {}
-        self.session_timeout = 3600  # 1 hour
+    def __init__(self, backend: Optional[SessionBackend] = None, session_timeout: int = 3600):
+        self.backend = backend or InMemorySessionBackend()
+        self.session_timeout = session_timeout  # 1 hour
+        self.expiry = SessionExpiryScheduler(self.backend, session_timeout)
+        
+        # Sessions restored by the backend (e.g. from a journal) need deadlines too
+        for session_id, last_activity in self.backend.activity():
+            self.expiry.schedule(session_id, last_activity)
     
+    @timed('session_manager.create_session')
     def create_session(self, session_id: str, initial_data: Dict[str, Any]) -> bool:
         """Create a new session"""
         try:
@@ -30,26 +60,29 @@ class SessionManager:
                 'conversation_history': []
             }
             
-            self.sessions[session_id] = session_data
-            logger.info(f"Session {session_id} created")
+            self.backend.create(session_id, session_data)
+            self.expiry.schedule(session_id, session_data['last_activity'])
+            logger.info("Session %s created", session_id)
             return True
             
         except Exception as e:
             logger.error(f"Error creating session {session_id}: {e}")
             return False
     
+    @timed('session_manager.get_session')
     def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
-        """Get session data"""
-        return self.sessions.get(session_id)
+        """Get a consistent copy of the session data"""
+        return self.backend.get(session_id)
+    
+    def session_exists(self, session_id: str) -> bool:
+        """Check for a session without copying it"""
+        return self.backend.exists(session_id)
     
+    @timed('session_manager.update_session')
     def update_session(self, session_id: str, updates: Dict[str, Any]) -> bool:
         """Update session data"""
         try:
-            if session_id in self.sessions:
-                self.sessions[session_id].update(updates)
-                self.sessions[session_id]['last_activity'] = time.time()
-                return True
-            return False
+            return self.backend.update(session_id, updates, time.time())
         except Exception as e:
             logger.error(f"Error updating session {session_id}: {e}")
             return False
@@ -57,14 +90,7 @@ class SessionManager:
     def add_question(self, session_id: str, question: Dict[str, Any]) -> bool:
         """Add a question to the session"""
         try:
-            if session_id in self.sessions:
-                if 'questions_asked' not in self.sessions[session_id]:
-                    self.sessions[session_id]['questions_asked'] = []
-                
-                self.sessions[session_id]['questions_asked'].append(question)
-                self.sessions[session_id]['last_activity'] = time.time()
-                return True
-            return False
+            return self.backend.append(session_id, {'questions_asked': [question]}, time.time())
         except Exception as e:
             logger.error(f"Error adding question to session {session_id}: {e}")
             return False
@@ -72,14 +98,7 @@ class SessionManager:
     def add_response(self, session_id: str, response: Dict[str, Any]) -> bool:
         """Add a response to the session"""
         try:
-            if session_id in self.sessions:
-                if 'responses_received' not in self.sessions[session_id]:
-                    self.sessions[session_id]['responses_received'] = []
-                
-                self.sessions[session_id]['responses_received'].append(response)
-                self.sessions[session_id]['last_activity'] = time.time()
-                return True
-            return False
+            return self.backend.append(session_id, {'responses_received': [response]}, time.time())
         except Exception as e:
             logger.error(f"Error adding response to session {session_id}: {e}")
             return False
@@ -87,49 +106,135 @@ class SessionManager:
     def add_conversation_turn(self, session_id: str, turn: Dict[str, Any]) -> bool:
         """Add a conversation turn"""
         try:
-            if session_id in self.sessions:
-                if 'conversation_history' not in self.sessions[session_id]:
-                    self.sessions[session_id]['conversation_history'] = []
-                
-                self.sessions[session_id]['conversation_history'].append(turn)
-                self.sessions[session_id]['last_activity'] = time.time()
-                return True
-            return False
+            return self.backend.append(session_id, {'conversation_history': [turn]}, time.time())
         except Exception as e:
             logger.error(f"Error adding conversation turn to session {session_id}: {e}")
             return False
     
-    def get_session_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
-        """Get session summary"""
-        session = self.sessions.get(session_id)
-        if not session:
+    @timed('session_manager.add_chat_turn')
+    def add_chat_turn(self, session_id: str, turns: List[Dict[str, Any]],
+                      response: Optional[Dict[str, Any]] = None,
+                      question: Optional[Dict[str, Any]] = None) -> bool:
+        """Record a whole chat exchange (turns, response, follow-up question) in one write"""
+        items = {'conversation_history': turns}
+        if response is not None:
+            items['responses_received'] = [response]
+        if question is not None:
+            items['questions_asked'] = [question]
+        try:
+            return self.backend.append(session_id, items, time.time())
+        except Exception as e:
+            logger.error(f"Error recording chat turn for session {session_id}: {e}")
+            return False
+    
+    def get_conversation(self, session_id: str) -> List[Dict[str, Any]]:
+        """Get the conversation turns of a session"""
+        return self.backend.get_list(session_id, 'conversation_history')
+    
+    @timed('session_manager.get_conversation_page')
+    def get_conversation_page(self, session_id: str, cursor: Optional[str] = None,
+                              limit: int = 100) -> Optional[Dict[str, Any]]:
+        """Up to `limit` items of each list field from the positions in `cursor`.
+
+        Items keep their positions once appended, so a cursor stays valid
+        while the session grows; `next_cursor` is None once every list has
+        been read to the end. Raises ValueError for a malformed cursor.
+        """
+        positions = decode_cursor(cursor)
+        summary = self.backend.summary(session_id)
+        if summary is None:
             return None
+        totals = [summary['total_questions'], summary['total_responses'], summary['conversation_turns']]
         
-        return {
-            'session_id': session_id,
-            'total_questions': len(session.get('questions_asked', [])),
-            'total_responses': len(session.get('responses_received', [])),
-            'conversation_turns': len(session.get('conversation_history', [])),
-            'created_at': session.get('created_at', 0),
-            'last_activity': session.get('last_activity', 0)
-        }
+        page = {'session_id': session_id}
+        next_positions = []
+        for field, start, total in zip(LIST_FIELDS, positions, totals):
+            items = self.backend.get_range(session_id, field, start, min(start + limit, total)) if start < total else []
+            page[field] = items
+            next_positions.append(start + len(items))
+        more = any(position < total for position, total in zip(next_positions, totals))
+        page['next_cursor'] = encode_cursor(next_positions) if more else None
+        return page
+    
+    def get_session_version(self, session_id: str) -> Optional[Tuple[int, float]]:
+        """(version, last_activity) of a session without reading its content; None if it does not exist"""
+        return self.backend.version(session_id)
     
+    @timed('session_manager.get_session_summary')
+    def get_session_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Get session summary"""
+        return self.backend.summary(session_id)
+    
+    def count_sessions(self) -> int:
+        """Number of live sessions"""
+        return self.backend.count()
+    
+    def add_expiry_hook(self, hook: ExpiryHook):
+        """Register hook(session_id, session) to run after a session expires"""
+        self.expiry.add_hook(hook)
+    
+    def start_expiry(self):
+        """Start the background expiry task on the running event loop"""
+        self.expiry.start()
+    
+    async def stop_expiry(self):
+        await self.expiry.stop()
+    
+    @timed('session_manager.cleanup_expired_sessions')
     def cleanup_expired_sessions(self) -> int:
-        """Clean up expired sessions"""
-        current_time = time.time()
-        expired_sessions = []
-        
-        for session_id, session_data in self.sessions.items():
-            if current_time - session_data.get('last_activity', 0) > self.session_timeout:
-                expired_sessions.append(session_id)
-        
-        for session_id in expired_sessions:
-            del self.sessions[session_id]
+        """Expire every session whose deadline has passed"""
+        expired_sessions = self.expiry.run_due()
         
         if expired_sessions:
-            logger.info(f"Cleaned up {len(expired_sessions)} expired sessions")
+            logger.info("Cleaned up %d expired sessions", len(expired_sessions))
         
         return len(expired_sessions)
+    
+    def close(self):
+        """Flush and release the storage backend"""
+        self.backend.close()
+
+def create_spill_store() -> Optional[SpillStore]:
+    """Spill files for long session histories, per `session.history` (None when disabled)"""
+    history_config = config.get('session.history', {}) or {}
+    hot_items = history_config.get('hot_items', 256)
+    if not hot_items:
+        return None
+    try:
+        return SpillStore(history_config.get('spill_directory', 'data/sessions/spill'), hot_items=hot_items)
+    except OSError as e:
+        logger.error(f"Session history spill directory unavailable, keeping full history in memory: {e}")
+        return None
+
+def create_session_manager() -> SessionManager:
+    """Build the session manager selected by `session.backend` (or SESSION_BACKEND)"""
+    redis_config = config.get_redis_config()
+    session_timeout = redis_config.get('session_timeout', 3600)
+    backend_name = os.environ.get('SESSION_BACKEND', config.get('session.backend', 'memory'))
+    
+    shards = config.get('session.shards', 64)
+    
+    backend = None
+    if backend_name == 'redis':
+        try:
+            backend = RedisSessionBackend.from_config(redis_config, session_timeout)
+            logger.info("Using Redis session backend")
+        except Exception as e:
+            logger.error(f"Redis session backend unavailable, falling back to memory: {e}")
+    elif backend_name == 'journal':
+        journal_config = config.get('session.journal', {}) or {}
+        journal = SessionJournal(
+            journal_config.get('directory', 'data/sessions'),
+            fsync=journal_config.get('fsync', 'interval'),
+            flush_interval=journal_config.get('flush_interval', 0.05)
+        )
+        backend = JournaledSessionBackend(journal, snapshot_every=journal_config.get('snapshot_every', 100000),
+                                          shards=shards, spill=create_spill_store())
+        logger.info(f"Using journaled session backend in {journal.directory}")
+    
+    if backend is None:
+        backend = InMemorySessionBackend(shards, spill=create_spill_store())
+    return SessionManager(backend=backend, session_timeout=session_timeout)
 
 # Global instance
-session_manager = SessionManager()
+session_manager = create_session_manager()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Compact in-memory representation of interview sessions
+"""
+import sys
+import threading
+from array import array
+from typing import Dict, List, Any, Optional, Tuple
+
+from src.core.session_spill import SpillStore
+from src.utils.metrics import metrics
+
+# Per-session lists that only ever grow by appending
+LIST_FIELDS = ('questions_asked', 'responses_received', 'conversation_history')
+
+# SessionRecord slots holding the length of each list field
+_COUNT_SLOTS = ('question_count', 'response_count', 'turn_count')
+
+# Top-level keys held in SessionRecord slots rather than in `extra`
+_SLOT_KEYS = ('session_id', 'data', 'created_at', 'last_activity', 'version') + LIST_FIELDS
+
+# String values up to this length are interned rather than shared per session
+_INTERN_MAX_LENGTH = 16
+
+# Recent items whose strings later items in the session can share
+_SHARE_WINDOW = 8
+
+# History items served from the in-memory log vs read back from spill files
+_HISTORY_READS = metrics.counter('nishu_session_history_items_read',
+                                 'Session history items read, by where they were held', ('source',))
+_MEMORY_READS = _HISTORY_READS.labels('memory')
+_SPILL_READS = _HISTORY_READS.labels('spill')
+
+# (list field index, item keys in insertion order, position of the column-stored timestamp or -1)
+Shape = Tuple[int, Tuple[str, ...], int]
+
+
+class _Shapes:
+    """Process-wide table of item shapes.
+
+    Items of the same list with the same keys share one shape, so each
+    stored item only needs a small integer instead of its own hash table
+    of keys.
+    """
+
+    def __init__(self):
+        self._index: Dict[Shape, int] = {}
+        self.shapes: List[Shape] = []
+        self._lock = threading.Lock()
+
+    def code(self, field: int, keys: Tuple[str, ...], timestamp_at: int) -> int:
+        shape = (field, keys, timestamp_at)
+        code = self._index.get(shape)
+        if code is None:
+            with self._lock:
+                code = self._index.get(shape)
+                if code is None:
+                    code = len(self.shapes)
+                    self.shapes.append((field, tuple(sys.intern(key) for key in keys), timestamp_at))
+                    self._index[shape] = code
+        return code
+
+
+_shapes = _Shapes()
+
+
+class ItemLog:
+    """The list fields of one session, stored column-wise in append order.
+
+    Each item is a shape code, an offset into one flat list of values and a
+    float timestamp in a typed array; dicts are only built again on read.
+    """
+
+    __slots__ = ('codes', 'offsets', 'timestamps', 'values')
+
+    def __init__(self):
+        self.codes = array('I')
+        self.offsets = array('I')
+        self.timestamps = array('d')
+        self.values: List[Any] = []
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def append(self, field: int, item: Dict[str, Any], shared: Dict[str, str]):
+        keys = tuple(item)
+        values = list(item.values())
+        timestamp_at = -1
+        if type(item.get('timestamp')) is float:
+            timestamp_at = keys.index('timestamp')
+            self.timestamps.append(values.pop(timestamp_at))
+        else:
+            self.timestamps.append(0.0)
+        for position, value in enumerate(values):
+            if type(value) is str:
+                if len(value) <= _INTERN_MAX_LENGTH:
+                    # Turn types, question types and other short labels repeat in every session
+                    values[position] = sys.intern(value)
+                else:
+                    # Reuse an equal string already held by this session
+                    values[position] = shared.setdefault(value, value)
+        self.codes.append(_shapes.code(field, keys, timestamp_at))
+        self.offsets.append(len(self.values))
+        self.values.extend(values)
+
+    def _build(self, index: int) -> Dict[str, Any]:
+        _, keys, timestamp_at = _shapes.shapes[self.codes[index]]
+        offset = self.offsets[index]
+        if timestamp_at < 0:
+            return dict(zip(keys, self.values[offset:offset + len(keys)]))
+        row = self.values[offset:offset + len(keys) - 1]
+        row.insert(timestamp_at, self.timestamps[index])
+        return dict(zip(keys, row))
+
+    def items(self, field: int, start: int = 0, stop: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Items of one list field, sliced like that list"""
+        shapes = _shapes.shapes
+        indexes = [index for index, code in enumerate(self.codes) if shapes[code][0] == field]
+        return [self._build(index) for index in indexes[start:stop]]
+
+    def rows(self, count: int) -> List[Tuple[int, Dict[str, Any]]]:
+        """(field index, item) for the oldest `count` items"""
+        return [(_shapes.shapes[self.codes[index]][0], self._build(index)) for index in range(count)]
+
+    def drop(self, count: int):
+        """Forget the oldest `count` items"""
+        base = self.offsets[count] if count < len(self) else len(self.values)
+        del self.codes[:count]
+        del self.timestamps[:count]
+        del self.values[:base]
+        self.offsets = array('I', [offset - base for offset in self.offsets[count:]])
+
+    def strings(self, start: int) -> Dict[str, str]:
+        """Map of the long string values of items from `start` on, for sharing with new items"""
+        begin = self.offsets[start] if start < len(self) else len(self.values)
+        return {value: value for value in self.values[begin:]
+                if type(value) is str and len(value) > _INTERN_MAX_LENGTH}
+
+    def copy(self) -> 'ItemLog':
+        """Copy of the columns; cheap enough to take under a lock and read afterwards"""
+        log = ItemLog()
+        log.codes = self.codes[:]
+        log.offsets = self.offsets[:]
+        log.timestamps = self.timestamps[:]
+        log.values = self.values[:]
+        return log
+
+
+class SessionRecord:
+    """One session held in slots, with all three lists in a single ItemLog.
+
+    `to_dict()` returns the same shape SessionManager has always exposed.
+    Strings repeated across the lists of a chat exchange (the candidate's
+    message in its turn and its response, the AI question in its turn and
+    in questions_asked) are stored once.
+
+    Given a SpillStore, the log is capped: once it holds twice the store's
+    hot_items, the oldest items move to the session's spill files and
+    `spilled` counts how many of each list live there. List positions never
+    change, so reads splice the spilled prefix back in front.
+
+    `version` counts the mutations applied by the backend; it is kept in
+    `to_dict()` so snapshots carry it across restarts.
+    """
+
+    __slots__ = ('session_id', 'data', 'created_at', 'last_activity', 'version', 'log', 'spilled',
+                 'extra') + _COUNT_SLOTS
+
+    def __init__(self, session_data: Dict[str, Any], spill: Optional[SpillStore] = None):
+        self.session_id = session_data.get('session_id')
+        self.data = session_data.get('data', {})
+        self.created_at = session_data.get('created_at', 0)
+        self.last_activity = session_data.get('last_activity', 0)
+        self.version = session_data.get('version', 0)
+        self.extra = {key: value for key, value in session_data.items() if key not in _SLOT_KEYS} or None
+        self._reset_lists({field: session_data.get(field) or [] for field in LIST_FIELDS}, spill)
+
+    def _reset_lists(self, lists: Dict[str, List[Dict[str, Any]]], spill: Optional[SpillStore]):
+        self.log = ItemLog()
+        self.spilled = None
+        for slot in _COUNT_SLOTS:
+            setattr(self, slot, 0)
+        self.append(lists, spill=spill)
+
+    def length(self, field: str) -> int:
+        return getattr(self, _COUNT_SLOTS[LIST_FIELDS.index(field)])
+
+    def items(self, field: str, start: int = 0, stop: Optional[int] = None,
+              spill: Optional[SpillStore] = None) -> List[Dict[str, Any]]:
+        """Slice of a list field, reading spilled items back from disk"""
+        index = LIST_FIELDS.index(field)
+        start, stop, _ = slice(start, stop).indices(self.length(field))
+        spilled = self.spilled[index] if self.spilled else 0
+        items = []
+        if start < spilled and spill is not None:
+            items = spill.read(self.session_id, index, start, min(stop, spilled))
+            _SPILL_READS.inc(len(items))
+        if stop > spilled:
+            hot = self.log.items(index, max(start - spilled, 0), stop - spilled)
+            _MEMORY_READS.inc(len(hot))
+            items.extend(hot)
+        return items
+
+    def update(self, updates: Dict[str, Any], now: float, spill: Optional[SpillStore] = None):
+        if any(key in LIST_FIELDS for key in updates):
+            # Replacing a list rebuilds the log; rare enough to pay for
+            lists = {field: updates[field] if field in updates else self.items(field, spill=spill)
+                     for field in LIST_FIELDS}
+            self._reset_lists(lists, spill)
+        for key, value in updates.items():
+            if key in LIST_FIELDS:
+                continue
+            if key in _SLOT_KEYS:
+                setattr(self, key, value)
+            else:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[key] = value
+        self.last_activity = now
+
+    def append(self, items: Dict[str, List[Dict[str, Any]]], now: Optional[float] = None,
+               spill: Optional[SpillStore] = None):
+        log = self.log
+        shared = log.strings(max(0, len(log) - _SHARE_WINDOW))
+        # Turns go first so responses and questions can point at their strings
+        for field in sorted(items, key=lambda name: name != 'conversation_history'):
+            index = LIST_FIELDS.index(field)
+            for item in items[field]:
+                log.append(index, item, shared)
+            slot = _COUNT_SLOTS[index]
+            setattr(self, slot, getattr(self, slot) + len(items[field]))
+        if now is not None:
+            self.last_activity = now
+        if spill is not None and len(log) >= 2 * spill.hot_items:
+            self._spill(spill, len(log) - spill.hot_items)
+
+    def _spill(self, spill: SpillStore, count: int):
+        rows = self.log.rows(count)
+        spill.write(self.session_id, rows, truncate=self.spilled is None)
+        spilled = list(self.spilled or (0, 0, 0))
+        for field, _ in rows:
+            spilled[field] += 1
+        self.spilled = spilled
+        self.log.drop(count)
+
+    def copy(self) -> 'SessionRecord':
+        record = SessionRecord.__new__(SessionRecord)
+        for slot in SessionRecord.__slots__:
+            setattr(record, slot, getattr(self, slot))
+        record.log = self.log.copy()
+        if self.spilled:
+            record.spilled = list(self.spilled)
+        if self.extra:
+            record.extra = dict(self.extra)
+        return record
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'session_id': self.session_id,
+            'total_questions': self.question_count,
+            'total_responses': self.response_count,
+            'conversation_turns': self.turn_count,
+            'created_at': self.created_at,
+            'last_activity': self.last_activity
+        }
+
+    def to_dict(self, spill: Optional[SpillStore] = None) -> Dict[str, Any]:
+        session = {
+            'session_id': self.session_id,
+            'data': self.data,
+            'created_at': self.created_at,
+            'last_activity': self.last_activity,
+            'version': self.version
+        }
+        for field in LIST_FIELDS:
+            session[field] = self.items(field, spill=spill)
+        if self.extra:
+            session.update(self.extra)
+        return session
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+On-disk overflow for the oldest items of long sessions
+"""
+import atexit
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+from array import array
+from typing import Dict, List, Any, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # optional: faster encoding of spilled items
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# List fields a session spills, by their index in session_record.LIST_FIELDS
+_FIELDS = 3
+
+# Per-process spill directories are named spill-<pid>-<random>
+_OWNER = re.compile(r'^spill-(\d+)-')
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # Exists, but belongs to another user
+        return True
+    return True
+
+
+def _dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=str)
+    return json.dumps(obj, separators=(',', ':'), default=str).encode('utf-8')
+
+
+def _loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class SpillStore:
+    """Per-session append-only files holding items evicted from memory.
+
+    ``<key>.log`` has one JSON item per line and ``<key>.<field>.idx`` one
+    8-byte offset into it per item of that list field, so a slice of a
+    spilled list is one seek into its index plus one seek per item.
+
+    Spill files only back live in-memory sessions, so each process writes
+    under its own ``spill-<pid>-*`` subdirectory. It is created on the
+    first spill and removed on close() or at interpreter exit; directories
+    left behind by processes that no longer exist (crashes, kills) are
+    swept when the next store is created.
+    """
+
+    def __init__(self, directory: str, hot_items: int = 256):
+        if hot_items <= 0:
+            raise ValueError("hot_items must be positive")
+        os.makedirs(directory, exist_ok=True)
+        self.root = directory
+        self.directory: Optional[str] = None
+        self.hot_items = hot_items
+        self._lock = threading.Lock()
+        self.sweep()
+
+    def sweep(self) -> int:
+        """Remove spill directories whose owning process is gone; returns how many"""
+        removed = 0
+        for name in os.listdir(self.root):
+            if not name.startswith('spill-'):
+                continue
+            owner = _OWNER.match(name)
+            # Directories named without a pid predate this scheme and have no live owner
+            if owner is not None and _process_alive(int(owner.group(1))):
+                continue
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+            removed += 1
+        if removed:
+            logger.info(f"Removed {removed} stale session spill directories from {self.root}")
+        return removed
+
+    def _directory(self) -> str:
+        if self.directory is None:
+            with self._lock:
+                if self.directory is None:
+                    directory = tempfile.mkdtemp(prefix=f'spill-{os.getpid()}-', dir=self.root)
+                    atexit.register(shutil.rmtree, directory, True)
+                    self.directory = directory
+        return self.directory
+
+    def _base(self, session_id: str, directory: str) -> str:
+        # Hashed so arbitrary session ids map to safe file names
+        return os.path.join(directory, hashlib.sha1(session_id.encode('utf-8')).hexdigest())
+
+    def write(self, session_id: str, rows: List[Tuple[int, Dict[str, Any]]], truncate: bool = False):
+        """Append (field index, item) rows; truncate starts the session's files afresh"""
+        base = self._base(session_id, self._directory())
+        if truncate:
+            self.remove(session_id)
+        offsets: Dict[int, array] = {}
+        # The data is written before the index entries pointing at it
+        with open(base + '.log', 'ab') as data:
+            offset = data.seek(0, os.SEEK_END)
+            lines = []
+            for field, item in rows:
+                line = _dumps(item) + b'\n'
+                offsets.setdefault(field, array('Q')).append(offset)
+                offset += len(line)
+                lines.append(line)
+            data.write(b''.join(lines))
+        for field, entries in offsets.items():
+            with open(f"{base}.{field}.idx", 'ab') as index:
+                index.write(entries.tobytes())
+
+    def read(self, session_id: str, field: int, start: int, stop: int) -> List[Dict[str, Any]]:
+        """Spilled items of one list field at positions [start, stop)"""
+        if stop <= start or self.directory is None:
+            return []
+        base = self._base(session_id, self.directory)
+        entries = array('Q')
+        try:
+            with open(f"{base}.{field}.idx", 'rb') as index:
+                index.seek(start * entries.itemsize)
+                raw = index.read((stop - start) * entries.itemsize)
+            entries.frombytes(raw[:len(raw) - len(raw) % entries.itemsize])
+            items = []
+            with open(base + '.log', 'rb') as data:
+                for offset in entries:
+                    data.seek(offset)
+                    items.append(_loads(data.readline()))
+            return items
+        except FileNotFoundError:
+            # The session was deleted while a reader still held its copy
+            return []
+
+    def remove(self, session_id: str):
+        if self.directory is None:
+            return
+        base = self._base(session_id, self.directory)
+        for path in [base + '.log'] + [f"{base}.{field}.idx" for field in range(_FIELDS)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        with self._lock:
+            directory, self.directory = self.directory, None
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,55 @@
+"""
+Helpers for data-parallel CPU training with torchrun and the gloo backend.
+
+    torchrun --standalone --nproc_per_node 4 src/models/rlhf_train_reward_model.py --threads 8 ...
+
+Without torchrun the helpers fall back to a single process.
+"""
+import os
+import time
+from typing import Optional, Tuple
+
+import torch
+import torch.distributed as dist
+
+
+def setup_distributed(threads: Optional[int] = None) -> Tuple[int, int]:
+    """Join the gloo process group when launched by torchrun and set intra-op threads.
+
+    Returns (rank, world_size). By default the machine's cores are split evenly
+    between processes, since each one otherwise starts a thread per core and
+    they oversubscribe the CPU.
+    """
+    world_size = int(os.environ.get("WORLD_SIZE", "1"))
+    rank = int(os.environ.get("RANK", "0"))
+    if threads is None:
+        threads = max(1, (os.cpu_count() or 1) // world_size)
+    torch.set_num_threads(threads)
+    if world_size > 1 and not dist.is_initialized():
+        dist.init_process_group(backend="gloo")
+    return rank, world_size
+
+
+def is_main_process() -> bool:
+    return not dist.is_initialized() or dist.get_rank() == 0
+
+
+def shared_run_dir(root: str, prefix: str, run_dir: Optional[str] = None) -> str:
+    """Create the run directory; every process gets rank 0's timestamped name"""
+    if run_dir is None:
+        stamp = [int(time.time())]
+        if dist.is_initialized():
+            dist.broadcast_object_list(stamp, src=0)
+        run_dir = os.path.join(root, f"{prefix}-{stamp[0]}")
+    os.makedirs(run_dir, exist_ok=True)
+    return run_dir
+
+
+def barrier():
+    if dist.is_initialized():
+        dist.barrier()
+
+
+def cleanup_distributed():
+    if dist.is_initialized():
+        dist.destroy_process_group()
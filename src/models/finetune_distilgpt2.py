@@ -1,19 +1,28 @@
 import argparse
+import hashlib
 import json
 import os
 import time
 from dataclasses import dataclass
-from typing import List, Dict
+from itertools import islice
+from typing import Iterable, Iterator, List, Dict, Tuple
 
+import pyarrow as pa
+import pyarrow.compute as pc
 import torch
 from datasets import Dataset
 from transformers import (
     AutoTokenizer,
     AutoModelForCausalLM,
     Trainer,
+    TrainerState,
     TrainingArguments,
     DataCollatorForLanguageModeling,
+    default_data_collator,
 )
+from transformers.trainer_utils import get_last_checkpoint
+
+from cpu_distributed import barrier, cleanup_distributed, is_main_process, setup_distributed, shared_run_dir
 
 
 @dataclass
@@ -22,15 +31,33 @@ class ConversationSample:
     messages: List[Dict[str, str]]
 
 
-def read_jsonl(path: str) -> List[ConversationSample]:
-    samples: List[ConversationSample] = []
+# Bump when the cached token layout or format_conversation output changes
+CACHE_VERSION = 3
+
+TOKENIZED_SCHEMA = pa.schema([
+    ("input_ids", pa.list_(pa.int32())),
+    ("attention_mask", pa.list_(pa.int8())),
+    ("length", pa.int32()),
+])
+
+PACKED_SCHEMA = pa.schema([
+    ("input_ids", pa.list_(pa.int32())),
+    ("attention_mask", pa.list_(pa.int8())),
+    ("labels", pa.list_(pa.int32())),
+])
+
+
+def iter_jsonl(path: str) -> Iterator[ConversationSample]:
     with open(path, "r", encoding="utf-8") as f:
         for line in f:
             if not line.strip():
                 continue
             obj = json.loads(line)
-            samples.append(ConversationSample(id=obj["id"], messages=obj["messages"]))
-    return samples
+            yield ConversationSample(id=obj["id"], messages=obj["messages"])
+
+
+def read_jsonl(path: str) -> List[ConversationSample]:
+    return list(iter_jsonl(path))
 
 
 def format_conversation(sample: ConversationSample) -> str:
@@ -50,19 +77,152 @@ def format_conversation(sample: ConversationSample) -> str:
     return "\n".join(parts)
 
 
-def build_dataset(samples: List[ConversationSample], tokenizer: AutoTokenizer, max_length: int) -> Dataset:
-    texts = [format_conversation(s) for s in samples]
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def tokenizer_fingerprint(tokenizer: AutoTokenizer) -> str:
+    # The serialized fast tokenizer covers vocab, merges, normalizer and special tokens;
+    # its truncation/padding state changes with each call, so it is left out
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is not None:
+        spec = json.loads(backend.to_str())
+        spec.pop("truncation", None)
+        spec.pop("padding", None)
+        spec = json.dumps(spec, sort_keys=True)
+    else:
+        spec = json.dumps(sorted(tokenizer.get_vocab().items()))
+    spec += json.dumps([type(tokenizer).__name__, tokenizer.eos_token, tokenizer.bos_token])
+    return hashlib.sha256(spec.encode("utf-8")).hexdigest()
+
+
+def cache_path(cache_dir: str, data_path: str, tokenizer: AutoTokenizer, max_length: int) -> str:
+    key = hashlib.sha256(json.dumps([
+        CACHE_VERSION, file_digest(data_path), tokenizer_fingerprint(tokenizer), max_length
+    ]).encode("utf-8")).hexdigest()[:32]
+    return os.path.join(cache_dir, f"tokenized-{key}.arrow")
 
-    def tokenize(batch: Dict[str, List[str]]):
-        return tokenizer(
-            batch["text"],
-            truncation=True,
-            max_length=max_length,
-            padding=False,
-        )
 
-    dataset = Dataset.from_dict({"text": texts})
-    return dataset.map(tokenize, batched=True, remove_columns=["text"])
+def batched(items: Iterable, size: int) -> Iterator[List]:
+    it = iter(items)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def write_tokenized(samples: Iterable[ConversationSample], tokenizer: AutoTokenizer, max_length: int,
+                    path: str, batch_size: int = 1000) -> int:
+    # Tokenize a batch at a time straight into an Arrow stream file, so memory
+    # stays at one batch however large the corpus is
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    rows = 0
+    try:
+        with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_stream(sink, TOKENIZED_SCHEMA) as writer:
+            for batch in batched(samples, batch_size):
+                encoded = tokenizer(
+                    [format_conversation(s) for s in batch],
+                    truncation=True,
+                    max_length=max_length,
+                    padding=False,
+                )
+                writer.write_batch(pa.record_batch([
+                    pa.array(encoded["input_ids"], type=pa.list_(pa.int32())),
+                    pa.array(encoded["attention_mask"], type=pa.list_(pa.int8())),
+                    pa.array([len(ids) for ids in encoded["input_ids"]], type=pa.int32()),
+                ], schema=TOKENIZED_SCHEMA))
+                rows += len(batch)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return rows
+
+
+def build_dataset(data_path: str, tokenizer: AutoTokenizer, max_length: int, cache_dir: str,
+                  rebuild: bool = False) -> Dataset:
+    # Reruns on the same data, tokenizer and max_length reuse the cached tokens
+    os.makedirs(cache_dir, exist_ok=True)
+    path = cache_path(cache_dir, data_path, tokenizer, max_length)
+    if rebuild or not os.path.exists(path):
+        started = time.time()
+        rows = write_tokenized(iter_jsonl(data_path), tokenizer, max_length, path)
+        print(f"Tokenized {rows} conversations in {time.time() - started:.1f}s -> {path}")
+    else:
+        print(f"Using tokenized cache {path}")
+    # Memory-mapped: rows are paged in from disk as the trainer reads them
+    return Dataset.from_file(path)
+
+
+def write_packed(dataset: Dataset, eos_token_id: int, pad_token_id: int, max_length: int, path: str,
+                 batch_size: int = 1000) -> Tuple[int, int]:
+    # Concatenate conversations, each followed by EOS, and cut the stream into
+    # max_length blocks. Every EOS is a target, but the first token of a
+    # conversation is not: it would be predicted from the previous conversation.
+    # This is conventional packing: attention is causal over the whole block and
+    # positions run on through it (the model's defaults), so a conversation can
+    # attend to the ones before it in its block, separated by EOS. GPT-2 takes no
+    # per-document mask, and restarting positions under a block-wide causal mask
+    # would only add earlier tokens that reuse the same positions.
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    ids: List[int] = []
+    labels: List[int] = []
+    rows: Dict[str, List[List[int]]] = {name: [] for name in PACKED_SCHEMA.names}
+    blocks = tokens = 0
+
+    def emit(writer, block_ids, block_labels, mask):
+        rows["input_ids"].append(block_ids)
+        rows["attention_mask"].append(mask)
+        rows["labels"].append(block_labels)
+        if len(rows["input_ids"]) >= 256:
+            write_rows(writer)
+
+    def write_rows(writer):
+        if rows["input_ids"]:
+            writer.write_batch(pa.record_batch(
+                [pa.array(rows[field.name], type=field.type) for field in PACKED_SCHEMA], schema=PACKED_SCHEMA))
+            for values in rows.values():
+                values.clear()
+
+    try:
+        with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_stream(sink, PACKED_SCHEMA) as writer:
+            for batch in dataset.iter(batch_size=batch_size):
+                for sequence in batch["input_ids"]:
+                    sequence = list(sequence) + [eos_token_id]
+                    ids.extend(sequence)
+                    labels.append(-100)
+                    labels.extend(sequence[1:])
+                    tokens += len(sequence)
+                    while len(ids) >= max_length:
+                        emit(writer, ids[:max_length], labels[:max_length], [1] * max_length)
+                        del ids[:max_length], labels[:max_length]
+                        blocks += 1
+            if ids:
+                padding = max_length - len(ids)
+                emit(writer, ids + [pad_token_id] * padding, labels + [-100] * padding,
+                     [1] * len(ids) + [0] * padding)
+                blocks += 1
+            write_rows(writer)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return blocks, tokens
+
+
+def pack_dataset(dataset: Dataset, tokenizer: AutoTokenizer, max_length: int, rebuild: bool = False) -> Dataset:
+    # Cached next to the tokenized file it was built from
+    path = dataset.cache_files[0]["filename"][:-len(".arrow")] + "-packed.arrow"
+    if rebuild or not os.path.exists(path):
+        blocks, tokens = write_packed(dataset, tokenizer.eos_token_id, tokenizer.pad_token_id, max_length, path)
+        print(f"Packed {tokens} tokens into {blocks} blocks of {max_length} "
+              f"({1 - tokens / max(blocks * max_length, 1):.1%} padding)")
+    return Dataset.from_file(path)
 
 
 def main():
@@ -75,11 +235,27 @@ def main():
     parser.add_argument("--lr", type=float, default=5e-5)
     parser.add_argument("--max_length", type=int, default=512)
     parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--cache_dir", type=str, default="models/training_data/cache", help="Directory for tokenized datasets")
+    parser.add_argument("--rebuild_cache", action="store_true", help="Re-tokenize even if a cached dataset exists")
+    batching = parser.add_mutually_exclusive_group()
+    batching.add_argument("--packing", action="store_true",
+                          help="Concatenate conversations into full max_length blocks instead of padding batches")
+    batching.add_argument("--group_by_length", action="store_true",
+                          help="Batch conversations of similar length together to reduce padding")
+    parser.add_argument("--grad_accum", type=int, default=1, help="Micro-batches per optimizer step")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Intra-op threads per process (default: CPU cores / processes)")
+    parser.add_argument("--save_steps", type=int, default=50, help="Optimizer steps between checkpoints")
+    parser.add_argument("--run_dir", type=str, default=None,
+                        help="Run directory to use, e.g. an earlier run to --resume (default: new timestamped dir)")
+    parser.add_argument("--resume", action="store_true", help="Resume from the latest checkpoint in --run_dir")
     args = parser.parse_args()
+    if args.resume and args.run_dir is None:
+        parser.error("--resume needs --run_dir")
 
-    os.makedirs(args.output_dir, exist_ok=True)
-    run_dir = os.path.join(args.output_dir, f"distilgpt2-finetuned-{int(time.time())}")
-    os.makedirs(run_dir, exist_ok=True)
+    # Under torchrun each process trains on its own shard over gloo
+    _, world_size = setup_distributed(args.threads)
+    run_dir = shared_run_dir(args.output_dir, "distilgpt2-finetuned", args.run_dir)
 
     tokenizer = AutoTokenizer.from_pretrained(args.model)
     if tokenizer.pad_token is None:
@@ -87,24 +263,41 @@ def main():
 
     model = AutoModelForCausalLM.from_pretrained(args.model)
 
-    samples = read_jsonl(args.data)
-    dataset = build_dataset(samples, tokenizer, args.max_length)
+    # Rank 0 builds the token cache while the other processes wait, then they all map it
+    main_process = is_main_process()
+    rebuild = args.rebuild_cache and main_process
+    if not main_process:
+        barrier()
+    dataset = build_dataset(args.data, tokenizer, args.max_length, args.cache_dir, rebuild=rebuild)
+    # Tokens the model learns from per epoch, for the tokens/sec report
+    train_tokens = pc.sum(dataset.data.column("length")).as_py() or 0
 
-    data_collator = DataCollatorForLanguageModeling(tokenizer=tokenizer, mlm=False)
+    if args.packing:
+        dataset = pack_dataset(dataset, tokenizer, args.max_length, rebuild=rebuild)
+        data_collator = default_data_collator
+    else:
+        data_collator = DataCollatorForLanguageModeling(tokenizer=tokenizer, mlm=False)
+    if main_process:
+        barrier()
 
     training_args = TrainingArguments(
         output_dir=run_dir,
         overwrite_output_dir=True,
         num_train_epochs=args.epochs,
         per_device_train_batch_size=args.batch_size,
+        gradient_accumulation_steps=args.grad_accum,
         learning_rate=args.lr,
         warmup_steps=0,
         weight_decay=0.0,
         logging_steps=10,
-        save_steps=50,
+        save_steps=args.save_steps,
         save_total_limit=2,
         evaluation_strategy="no",
+        group_by_length=args.group_by_length,
+        length_column_name="length",
         fp16=torch.cuda.is_available(),
+        ddp_backend="gloo" if world_size > 1 and not torch.cuda.is_available() else None,
+        ddp_find_unused_parameters=False,
         seed=args.seed,
         push_to_hub=False,
         report_to=[],
@@ -117,11 +310,29 @@ def main():
         data_collator=data_collator,
     )
 
-    trainer.train()
-    trainer.save_model(run_dir)
-    tokenizer.save_pretrained(run_dir)
+    checkpoint = None
+    epochs_to_train = args.epochs
+    if args.resume:
+        checkpoint = get_last_checkpoint(run_dir)
+        if checkpoint is None:
+            raise FileNotFoundError(f"No checkpoint to resume from in {run_dir}")
+        epochs_to_train -= TrainerState.load_from_json(os.path.join(checkpoint, "trainer_state.json")).epoch
+        if main_process:
+            print(f"Resuming from {checkpoint}")
 
-    print(f"Saved fine-tuned model to: {run_dir}")
+    metrics = trainer.train(resume_from_checkpoint=checkpoint).metrics
+    if main_process:
+        mode = "packed" if args.packing else "length-grouped" if args.group_by_length else "padded"
+        trained_tokens = int(train_tokens * epochs_to_train)
+        tokens_per_second = trained_tokens / metrics["train_runtime"]
+        print(f"Trained on {trained_tokens} tokens in {metrics['train_runtime']:.1f}s "
+              f"({tokens_per_second:.0f} tokens/s, {mode} batches, {world_size} process(es), "
+              f"effective batch {args.batch_size * args.grad_accum * world_size})")
+    trainer.save_model(run_dir)
+    if main_process:
+        tokenizer.save_pretrained(run_dir)
+        print(f"Saved fine-tuned model to: {run_dir}")
+    cleanup_distributed()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,58 @@
+"""
+Reward model network and loader
+
+Shared by the RLHF scripts (imported as ``reward_network`` from this
+directory) and by answer scoring in the API (``src.models.reward_network``),
+so it only depends on torch and transformers.
+"""
+import json
+import os
+from typing import Optional
+
+import torch
+import torch.nn as nn
+from transformers import AutoConfig, AutoModel, AutoTokenizer
+
+
+class RewardModel(nn.Module):
+    def __init__(self, base_model_name: str = "distilbert-base-uncased", pretrained: bool = True):
+        super().__init__()
+        if pretrained:
+            self.encoder = AutoModel.from_pretrained(base_model_name)
+        else:
+            # Only the architecture, for weights loaded from a saved reward model
+            self.encoder = AutoModel.from_config(AutoConfig.from_pretrained(base_model_name))
+        hidden_size = self.encoder.config.hidden_size
+        self.scorer = nn.Linear(hidden_size, 1)
+
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        out = self.encoder(input_ids=input_ids, attention_mask=attention_mask)
+        pooled = out.last_hidden_state[:, 0]  # CLS token embedding
+        score = self.scorer(pooled)
+        return score.squeeze(-1)
+
+
+def resolve_model_dir(model_dir: str) -> str:
+    """A reward model run directory, or the newest `reward_model-*` run inside `model_dir`"""
+    if os.path.exists(os.path.join(model_dir, "config.json")):
+        return model_dir
+    runs = sorted(name for name in os.listdir(model_dir) if name.startswith("reward_model-")
+                  and os.path.exists(os.path.join(model_dir, name, "pytorch_model.bin")))
+    if not runs:
+        raise FileNotFoundError(f"No trained reward model in {model_dir}")
+    return os.path.join(model_dir, runs[-1])
+
+
+def load_reward_model(model_dir: str, device: Optional[torch.device] = None):
+    """Load a reward model saved by rlhf_train_reward_model.py; returns (model, tokenizer) in eval mode.
+
+    `model_dir` is a run directory, or a directory of runs, in which case the
+    newest `reward_model-*` run is used.
+    """
+    model_dir = resolve_model_dir(model_dir)
+    with open(os.path.join(model_dir, "config.json"), "r", encoding="utf-8") as f:
+        base_encoder = json.load(f)["base_encoder"]
+    model = RewardModel(base_encoder, pretrained=False)
+    model.load_state_dict(torch.load(os.path.join(model_dir, "pytorch_model.bin"), map_location="cpu"))
+    model.to(device or torch.device("cpu")).eval()
+    return model, AutoTokenizer.from_pretrained(base_encoder)
@@ -2,14 +2,16 @@ import argparse
 import json
 import os
 import time
-from typing import List
+from typing import Iterator, List
 
 import torch
 from transformers import AutoTokenizer, AutoModelForCausalLM
 
+from finetune_distilgpt2 import batched
+from reward_network import load_reward_model
 
-def load_prompts(path: str) -> List[str]:
-    prompts: List[str] = []
+
+def iter_prompts(path: str) -> Iterator[str]:
     with open(path, "r", encoding="utf-8") as f:
         for line in f:
             if not line.strip():
@@ -17,16 +19,49 @@ def load_prompts(path: str) -> List[str]:
             obj = json.loads(line)
             parts = [m["content"] for m in obj.get("messages", []) if m.get("role") in ("system", "interviewer", "user")]
             if parts:
-                prompts.append("\n".join(parts))
-    return prompts
+                yield "\n".join(parts)
+
+
+def load_prompts(path: str) -> List[str]:
+    return list(iter_prompts(path))
+
+
+@torch.no_grad()
+def generate(policy, tokenizer, prompts: List[str], max_prompt_length: int, max_new_tokens: int,
+             device: torch.device) -> List[str]:
+    # Left padding lines every prompt up against its first generated token; left truncation
+    # keeps the end of a long prompt, the interviewer question being answered
+    inputs = tokenizer(prompts, return_tensors="pt", padding=True, truncation=True,
+                       max_length=max_prompt_length).to(device)
+    out = policy.generate(**inputs, max_new_tokens=max_new_tokens, pad_token_id=tokenizer.pad_token_id)
+    return tokenizer.batch_decode(out[:, inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+
+
+@torch.no_grad()
+def score(reward_model, reward_tokenizer, prompts: List[str], responses: List[str], batch_size: int,
+          device: torch.device) -> List[float]:
+    # Same "prompt\nresponse" layout the reward model was trained on
+    texts = [p + "\n" + r for p, r in zip(prompts, responses)]
+    rewards: List[float] = []
+    for chunk in batched(texts, batch_size):
+        inputs = reward_tokenizer(chunk, padding=True, truncation=True, max_length=512, return_tensors="pt").to(device)
+        rewards.extend(reward_model(inputs["input_ids"], inputs["attention_mask"]).tolist())
+    return rewards
 
 
 def main():
-    parser = argparse.ArgumentParser(description="Minimal PPO RLHF scaffold (non-functional stub).")
+    parser = argparse.ArgumentParser(description="Minimal PPO RLHF scaffold: batched rollouts scored by the reward model "
+                                                 "(no policy update yet).")
     parser.add_argument("--data", type=str, default="models/training_data/sample_conversations.jsonl")
     parser.add_argument("--policy", type=str, default="distilgpt2")
-    parser.add_argument("--reward_model_dir", type=str, default="models/rlhf")
+    parser.add_argument("--reward_model_dir", type=str, default="models/rlhf",
+                        help="Reward model run, or a directory of runs to take the newest from")
     parser.add_argument("--out_dir", type=str, default="models/rlhf")
+    parser.add_argument("--batch_size", type=int, default=16, help="Prompts generated per batch")
+    parser.add_argument("--reward_batch_size", type=int, default=32, help="Generations scored per batch")
+    parser.add_argument("--max_prompt_length", type=int, default=256)
+    parser.add_argument("--max_new_tokens", type=int, default=64)
+    parser.add_argument("--max_prompts", type=int, default=None, help="Stop after this many prompts")
     args = parser.parse_args()
 
     os.makedirs(args.out_dir, exist_ok=True)
@@ -35,27 +70,33 @@ def main():
 
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-    tokenizer = AutoTokenizer.from_pretrained(args.policy)
+    tokenizer = AutoTokenizer.from_pretrained(args.policy, padding_side="left", truncation_side="left")
     if tokenizer.pad_token is None:
         tokenizer.pad_token = tokenizer.eos_token
     policy = AutoModelForCausalLM.from_pretrained(args.policy).to(device)
+    reward_model, reward_tokenizer = load_reward_model(args.reward_model_dir, device)
 
-    prompts = load_prompts(args.data)
+    prompts = iter_prompts(args.data)
+    if args.max_prompts is not None:
+        prompts = (prompt for _, prompt in zip(range(args.max_prompts), prompts))
 
-    # Stub loop: generate one response per prompt and "score" using a dummy constant
+    # Rollouts: generate a batch, score it, and append it to disk before the next one
     policy.eval()
-    generations: List[str] = []
-    for prompt in prompts[:4]:
-        inputs = tokenizer(prompt, return_tensors="pt").to(device)
-        with torch.no_grad():
-            out = policy.generate(**inputs, max_new_tokens=64)
-        text = tokenizer.decode(out[0], skip_special_tokens=True)
-        generations.append(text)
-
-    # Save stub checkpoint artifacts
-    with open(os.path.join(run_dir, "generations.txt"), "w", encoding="utf-8") as f:
-        for g in generations:
-            f.write(g + "\n\n---\n\n")
+    count, reward_sum = 0, 0.0
+    started = time.time()
+    generations_path = os.path.join(run_dir, "generations.jsonl")
+    with open(generations_path, "w", encoding="utf-8") as f:
+        for batch in batched(prompts, args.batch_size):
+            responses = generate(policy, tokenizer, batch, args.max_prompt_length, args.max_new_tokens, device)
+            rewards = score(reward_model, reward_tokenizer, batch, responses, args.reward_batch_size, device)
+            for prompt, response, reward in zip(batch, responses, rewards):
+                f.write(json.dumps({"prompt": prompt, "response": response, "reward": reward}, ensure_ascii=False) + "\n")
+            f.flush()
+            count += len(batch)
+            reward_sum += sum(rewards)
+    elapsed = time.time() - started
+    print(f"Generated and scored {count} prompts in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.2f} prompts/s, "
+          f"mean reward {reward_sum / max(count, 1):.4f}) -> {generations_path}")
 
     policy.save_pretrained(run_dir)
     tokenizer.save_pretrained(run_dir)
@@ -64,4 +105,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
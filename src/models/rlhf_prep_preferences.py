@@ -1,44 +1,237 @@
 import argparse
+import glob
+import hashlib
 import json
+import math
 import os
-from typing import List, Dict
+import time
+from collections import deque
+from multiprocessing import Pool
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+import numpy as np
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def preference_pair(conv: Dict) -> Optional[Dict]:
+    messages = conv.get("messages", [])
+    # Toy heuristic: mark longer candidate response as preferred over shorter one in same convo if exists
+    candidate_replies = [m for m in messages if m.get("role") in ("assistant", "candidate")]
+    if len(candidate_replies) < 2:
+        return None
+    a = candidate_replies[0]["content"]
+    b = candidate_replies[1]["content"]
+    preferred = a if len(a) >= len(b) else b
+    rejected = b if preferred is a else a
+    return {
+        "id": conv.get("id"),
+        "prompt": "\n".join([m["content"] for m in messages if m.get("role") in ("system", "interviewer", "user")]),
+        "chosen": preferred,
+        "rejected": rejected
+    }
+
+
+def extract_chunk(lines: List[str]) -> Tuple[List[str], np.ndarray, int]:
+    """Pairs in a chunk of JSONL lines: (output lines, 64-bit content hashes, conversations read)"""
+    records: List[str] = []
+    digests: List[bytes] = []
+    conversations = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        conversations += 1
+        pref = preference_pair(json.loads(line))
+        if pref is None:
+            continue
+        records.append(json.dumps(pref, ensure_ascii=False) + "\n")
+        # Duplicates are judged on content; the same pair logged under another id is still a duplicate
+        key = "\x1f".join((pref["prompt"], pref["chosen"], pref["rejected"])).encode("utf-8")
+        digests.append(hashlib.blake2b(key, digest_size=8).digest())
+    hashes = np.frombuffer(b"".join(digests), dtype="<u8").astype(np.uint64)
+    return records, hashes, conversations
+
+
+class PairDeduplicator:
+    """Remembers pair hashes, exactly up to `exact_limit` pairs and approximately beyond.
+
+    Exact mode keeps 64-bit hashes in a sorted numpy array (8 bytes per pair)
+    with a small set in front of it for recent ones. Past `exact_limit` all
+    hashes move into a Bloom filter sized for `bloom_capacity` pairs, which
+    may drop a unique pair with probability about `bloom_error` but never
+    keeps a duplicate.
+    """
+
+    def __init__(self, exact_limit: int = 10_000_000, bloom_capacity: int = 100_000_000,
+                 bloom_error: float = 0.001, merge_size: int = 1_000_000):
+        self.exact_limit = exact_limit
+        self.bloom_capacity = bloom_capacity
+        self.bloom_error = bloom_error
+        self.merge_size = merge_size
+        self._sorted = np.empty(0, dtype=np.uint64)
+        self._recent: set = set()
+        self._bits: Optional[np.ndarray] = None
+        self._hashes = 0
+        self.count = 0
+
+    @property
+    def approximate(self) -> bool:
+        return self._bits is not None
+
+    def keep(self, keys: np.ndarray) -> np.ndarray:
+        """Mask of the `keys` not seen before (nor earlier in `keys`), and remember them"""
+        if self._bits is not None:
+            return self._keep_approximate(keys)
+        # Vectorized lookup in the sorted array, then the recent set in order
+        seen = np.zeros(len(keys), dtype=bool)
+        if len(self._sorted):
+            positions = np.minimum(np.searchsorted(self._sorted, keys), len(self._sorted) - 1)
+            seen = self._sorted[positions] == keys
+        mask = np.zeros(len(keys), dtype=bool)
+        recent = self._recent
+        for i, key in enumerate(keys.tolist()):
+            if not seen[i] and key not in recent:
+                recent.add(key)
+                mask[i] = True
+        self.count += int(mask.sum())
+        if len(recent) >= self.merge_size:
+            self._merge()
+        if self.count > self.exact_limit:
+            self._switch_to_bloom()
+        return mask
+
+    def _merge(self):
+        new = np.fromiter(self._recent, dtype=np.uint64, count=len(self._recent))
+        new.sort()
+        # Two sorted runs: the stable (timsort) merge is linear
+        self._sorted = np.sort(np.concatenate([self._sorted, new]), kind="stable")
+        self._recent = set()
+
+    def _switch_to_bloom(self):
+        bits = math.ceil(-self.bloom_capacity * math.log(self.bloom_error) / math.log(2) ** 2)
+        self._hashes = max(1, round(bits / self.bloom_capacity * math.log(2)))
+        self._bits = np.zeros((bits + 7) // 8, dtype=np.uint8)
+        self._merge()
+        for start in range(0, len(self._sorted), self.merge_size):
+            self._set(self._positions(self._sorted[start:start + self.merge_size]))
+        self._sorted = np.empty(0, dtype=np.uint64)
+
+    def _keep_approximate(self, keys: np.ndarray) -> np.ndarray:
+        # Duplicates within the chunk first; the filter only sees each key once
+        _, first = np.unique(keys, return_index=True)
+        candidates = np.sort(first)
+        positions = self._positions(keys[candidates])
+        present = ((self._bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1).all(axis=1)
+        fresh = candidates[~present]
+        self._set(positions[~present])
+        mask = np.zeros(len(keys), dtype=bool)
+        mask[fresh] = True
+        self.count += len(fresh)
+        return mask
+
+    def _positions(self, keys: np.ndarray) -> np.ndarray:
+        # Double hashing: bit i of a key is h1 + i * h2 (mod filter size), with
+        # h2 an odd multiplicative rehash of the key
+        h2 = keys * np.uint64(0x9E3779B97F4A7C15) | np.uint64(1)
+        size = np.uint64(len(self._bits) * 8)
+        steps = np.arange(self._hashes, dtype=np.uint64)
+        return (keys[:, None] + steps[None, :] * h2[:, None]) % size
+
+    def _set(self, positions: np.ndarray):
+        positions = positions.ravel()
+        np.bitwise_or.at(self._bits, positions >> np.uint64(3),
+                         np.left_shift(1, positions & np.uint64(7)).astype(np.uint8))
+
+
+def expand_inputs(patterns: List[str]) -> List[str]:
+    """Files named or matched by `patterns`, in the order given, each once"""
+    paths: List[str] = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        if not matches or not all(os.path.isfile(path) for path in matches):
+            raise FileNotFoundError(f"No input files match {pattern}")
+        paths.extend(path for path in matches if path not in paths)
+    return paths
+
+
+def read_chunks(paths: List[str], lines_per_chunk: int) -> Iterator[List[str]]:
+    chunk: List[str] = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as fin:
+            for line in fin:
+                chunk.append(line)
+                if len(chunk) >= lines_per_chunk:
+                    yield chunk
+                    chunk = []
+    if chunk:
+        yield chunk
+
+
+def ordered_map(function: Callable[[T], R], items: Iterable[T], workers: int,
+                initializer: Optional[Callable] = None, initargs: tuple = ()) -> Iterator[Tuple[T, R]]:
+    """(item, function(item)) in input order, with at most a few items in flight per worker"""
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for item in items:
+            yield item, function(item)
+        return
+    with Pool(workers, initializer=initializer, initargs=initargs) as pool:
+        # Pool.imap would read ahead without limit; a bounded window keeps memory flat
+        pending = deque()
+        for item in items:
+            pending.append((item, pool.apply_async(function, (item,))))
+            if len(pending) >= workers * 4:
+                item, result = pending.popleft()
+                yield item, result.get()
+        while pending:
+            item, result = pending.popleft()
+            yield item, result.get()
 
 
 def main():
     parser = argparse.ArgumentParser(description="Prepare preference data for RLHF from conversations.")
-    parser.add_argument("--input", type=str, default="models/training_data/sample_conversations.jsonl", help="Input JSONL conversations")
+    parser.add_argument("--input", type=str, nargs="+", default=["models/training_data/sample_conversations.jsonl"],
+                        help="Input JSONL conversations: files or glob patterns")
     parser.add_argument("--output", type=str, default="models/rlhf/preferences.jsonl", help="Output JSONL preferences path")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Extraction processes")
+    parser.add_argument("--chunk_lines", type=int, default=2000, help="Input lines per unit of work")
+    parser.add_argument("--exact_dedup_limit", type=int, default=10_000_000,
+                        help="Unique pairs tracked exactly before switching to a Bloom filter")
+    parser.add_argument("--bloom_capacity", type=int, default=100_000_000)
+    parser.add_argument("--bloom_error", type=float, default=0.001)
     args = parser.parse_args()
 
-    os.makedirs(os.path.dirname(args.output), exist_ok=True)
-
-    preferences: List[Dict] = []
-    with open(args.input, "r", encoding="utf-8") as fin:
-        for line in fin:
-            if not line.strip():
-                continue
-            conv = json.loads(line)
-            messages = conv.get("messages", [])
-            # Toy heuristic: mark longer candidate response as preferred over shorter one in same convo if exists
-            candidate_replies = [m for m in messages if m.get("role") in ("assistant", "candidate")]
-            if len(candidate_replies) >= 2:
-                a = candidate_replies[0]["content"]
-                b = candidate_replies[1]["content"]
-                preferred = a if len(a) >= len(b) else b
-                rejected = b if preferred is a else a
-                preferences.append({
-                    "id": conv.get("id"),
-                    "prompt": "\n".join([m["content"] for m in messages if m.get("role") in ("system", "interviewer", "user")]),
-                    "chosen": preferred,
-                    "rejected": rejected
-                })
-
-    with open(args.output, "w", encoding="utf-8") as fout:
-        for pref in preferences:
-            fout.write(json.dumps(pref, ensure_ascii=False) + "\n")
-
-    print(f"Wrote {len(preferences)} preference pairs to {args.output}")
+    try:
+        paths = expand_inputs(args.input)
+    except FileNotFoundError as e:
+        parser.error(str(e))
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+
+    dedup = PairDeduplicator(args.exact_dedup_limit, args.bloom_capacity, args.bloom_error)
+    conversations = pairs = 0
+    started = time.time()
+    tmp_path = f"{args.output}.tmp-{os.getpid()}"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as fout:
+            for _, (records, hashes, read) in ordered_map(extract_chunk, read_chunks(paths, args.chunk_lines),
+                                                          args.workers):
+                conversations += read
+                pairs += len(records)
+                if records:
+                    keep = dedup.keep(hashes)
+                    fout.writelines(record for record, kept in zip(records, keep) if kept)
+        os.replace(tmp_path, args.output)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    mode = "approximate" if dedup.approximate else "exact"
+    print(f"Read {conversations} conversations from {len(paths)} file(s) in {time.time() - started:.1f}s; "
+          f"dropped {pairs - dedup.count} duplicate pairs ({mode} dedup)")
+    print(f"Wrote {dedup.count} preference pairs to {args.output}")
 
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
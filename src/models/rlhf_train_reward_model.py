@@ -1,35 +1,169 @@
 import argparse
+import hashlib
 import json
 import os
+import random
 import time
-from typing import List, Dict
+from contextlib import nullcontext
+from typing import Iterable, Iterator, List, Dict, Optional
 
+import pyarrow as pa
 import torch
 import torch.nn as nn
-from transformers import AutoTokenizer, AutoModel
+from datasets import Dataset
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader
+from transformers import AutoTokenizer
 
+from cpu_distributed import barrier, cleanup_distributed, is_main_process, setup_distributed, shared_run_dir
+from finetune_distilgpt2 import batched, file_digest, tokenizer_fingerprint
+from reward_network import RewardModel
 
-class RewardModel(nn.Module):
-    def __init__(self, base_model_name: str = "distilbert-base-uncased"):
-        super().__init__()
-        self.encoder = AutoModel.from_pretrained(base_model_name)
-        hidden_size = self.encoder.config.hidden_size
-        self.scorer = nn.Linear(hidden_size, 1)
+# Bump when the cached pair layout changes
+PAIR_CACHE_VERSION = 1
 
-    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
-        out = self.encoder(input_ids=input_ids, attention_mask=attention_mask)
-        pooled = out.last_hidden_state[:, 0]  # CLS token embedding
-        score = self.scorer(pooled)
-        return score.squeeze(-1)
+# The prompt is tokenized once per pair; responses carry the "\n" that joined them to it
+PAIR_SCHEMA = pa.schema([
+    ("prompt_ids", pa.list_(pa.int32())),
+    ("chosen_ids", pa.list_(pa.int32())),
+    ("rejected_ids", pa.list_(pa.int32())),
+    ("length", pa.int32()),
+])
 
 
-def load_preferences(path: str) -> List[Dict]:
-    prefs: List[Dict] = []
+def iter_preferences(path: str) -> Iterator[Dict]:
     with open(path, "r", encoding="utf-8") as f:
         for line in f:
             if line.strip():
-                prefs.append(json.loads(line))
-    return prefs
+                yield json.loads(line)
+
+
+def load_preferences(path: str) -> List[Dict]:
+    return list(iter_preferences(path))
+
+
+def special_tokens(tokenizer: AutoTokenizer):
+    """Ids the tokenizer puts before and after a single sequence, e.g. [CLS] and [SEP]"""
+    marker = -1
+    wrapped = tokenizer.build_inputs_with_special_tokens([marker])
+    split = wrapped.index(marker)
+    return wrapped[:split], wrapped[split + 1:]
+
+
+def pair_cache_path(cache_dir: str, prefs_path: str, tokenizer: AutoTokenizer, max_length: int) -> str:
+    key = hashlib.sha256(json.dumps([
+        PAIR_CACHE_VERSION, file_digest(prefs_path), tokenizer_fingerprint(tokenizer), max_length
+    ]).encode("utf-8")).hexdigest()[:32]
+    return os.path.join(cache_dir, f"pairs-{key}.arrow")
+
+
+def write_pairs(prefs: Iterable[Dict], tokenizer: AutoTokenizer, max_length: int, path: str,
+                batch_size: int = 1000) -> int:
+    # Same streaming layout as the fine-tuning token cache: one batch in memory at a time
+    prefix, suffix = special_tokens(tokenizer)
+    budget = max_length - len(prefix) - len(suffix)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    rows = 0
+    try:
+        with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_stream(sink, PAIR_SCHEMA) as writer:
+            for batch in batched(prefs, batch_size):
+                def encode(texts: List[str]) -> List[List[int]]:
+                    # Anything past the budget would be truncated away when the pair is assembled
+                    return [ids[:budget] for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+                prompts = encode([b["prompt"] for b in batch])
+                chosen = encode(["\n" + b["chosen"] for b in batch])
+                rejected = encode(["\n" + b["rejected"] for b in batch])
+                lengths = [min(budget, len(p) + max(len(c), len(r))) + len(prefix) + len(suffix)
+                           for p, c, r in zip(prompts, chosen, rejected)]
+                writer.write_batch(pa.record_batch([
+                    pa.array(prompts, type=pa.list_(pa.int32())),
+                    pa.array(chosen, type=pa.list_(pa.int32())),
+                    pa.array(rejected, type=pa.list_(pa.int32())),
+                    pa.array(lengths, type=pa.int32()),
+                ], schema=PAIR_SCHEMA))
+                rows += len(batch)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return rows
+
+
+def build_pair_dataset(prefs_path: str, tokenizer: AutoTokenizer, max_length: int, cache_dir: str,
+                       rebuild: bool = False) -> Dataset:
+    # Tokenized once per preferences file, tokenizer and max_length; later runs and epochs reuse it
+    os.makedirs(cache_dir, exist_ok=True)
+    path = pair_cache_path(cache_dir, prefs_path, tokenizer, max_length)
+    if rebuild or not os.path.exists(path):
+        started = time.time()
+        rows = write_pairs(iter_preferences(prefs_path), tokenizer, max_length, path)
+        print(f"Tokenized {rows} preference pairs in {time.time() - started:.1f}s -> {path}")
+    else:
+        print(f"Using tokenized cache {path}")
+    # Memory-mapped, so DataLoader workers share the pages instead of copying rows
+    return Dataset.from_file(path)
+
+
+class PairCollator:
+    """Assembles `[prefix] prompt response [suffix]` for both responses of each pair.
+
+    Returns one batch of 2 * len(rows) sequences, chosen first then rejected,
+    padded to a common length so both are scored in a single forward pass.
+    """
+
+    def __init__(self, tokenizer: AutoTokenizer, max_length: int):
+        self.prefix, self.suffix = special_tokens(tokenizer)
+        self.budget = max_length - len(self.prefix) - len(self.suffix)
+        self.pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else 0
+
+    def __call__(self, rows: List[Dict]) -> Dict[str, torch.Tensor]:
+        sequences = [self.prefix + (row["prompt_ids"] + row[key])[:self.budget] + self.suffix
+                     for key in ("chosen_ids", "rejected_ids") for row in rows]
+        width = max(len(ids) for ids in sequences)
+        input_ids = torch.full((len(sequences), width), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(sequences), width), dtype=torch.long)
+        for i, ids in enumerate(sequences):
+            input_ids[i, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+            attention_mask[i, :len(ids)] = 1
+        return {"input_ids": input_ids, "attention_mask": attention_mask}
+
+
+def bucketed_batches(indices: List[int], lengths: List[int], batch_size: int, seed: int,
+                     bucket_batches: int = 50) -> List[List[int]]:
+    """Shuffled batches of similar-length pairs.
+
+    Indices are shuffled, cut into buckets of `bucket_batches` batches, and
+    sorted by length within each bucket; the batches are shuffled again so
+    lengths vary from step to step.
+    """
+    rng = random.Random(seed)
+    order = list(indices)
+    rng.shuffle(order)
+    result = []
+    bucket = batch_size * bucket_batches
+    for start in range(0, len(order), bucket):
+        chunk = sorted(order[start:start + bucket], key=lengths.__getitem__)
+        result.extend(chunk[i:i + batch_size] for i in range(0, len(chunk), batch_size))
+    rng.shuffle(result)
+    return result
+
+
+def save_checkpoint(path: str, model: nn.Module, optimizer: torch.optim.Optimizer, state: Dict):
+    """Write model, optimizer and progress atomically, so an interrupted save keeps the previous one"""
+    tmp_path = path + ".tmp"
+    torch.save({"model": model.state_dict(), "optimizer": optimizer.state_dict(),
+                "rng": torch.get_rng_state(), **state}, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path: str, model: nn.Module, optimizer: torch.optim.Optimizer) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    checkpoint = torch.load(path, map_location="cpu", weights_only=False)
+    model.load_state_dict(checkpoint.pop("model"))
+    optimizer.load_state_dict(checkpoint.pop("optimizer"))
+    torch.set_rng_state(checkpoint.pop("rng"))
+    return checkpoint
 
 
 def main():
@@ -40,11 +174,26 @@ def main():
     parser.add_argument("--lr", type=float, default=2e-5)
     parser.add_argument("--batch_size", type=int, default=4)
     parser.add_argument("--base_encoder", type=str, default="distilbert-base-uncased")
+    parser.add_argument("--grad_accum", type=int, default=1, help="Micro-batches per optimizer step")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Intra-op threads per process (default: CPU cores / processes)")
+    parser.add_argument("--save_steps", type=int, default=100, help="Optimizer steps between checkpoints")
+    parser.add_argument("--run_dir", type=str, default=None,
+                        help="Run directory to use, e.g. an earlier run to --resume (default: new timestamped dir)")
+    parser.add_argument("--resume", action="store_true", help="Resume from checkpoint.pt in --run_dir")
+    parser.add_argument("--max_length", type=int, default=512)
+    parser.add_argument("--cache_dir", type=str, default="models/rlhf/cache", help="Directory for tokenized pairs")
+    parser.add_argument("--rebuild_cache", action="store_true", help="Re-tokenize even if cached pairs exist")
+    parser.add_argument("--num_workers", type=int, default=2, help="DataLoader worker processes")
+    parser.add_argument("--seed", type=int, default=42)
     args = parser.parse_args()
+    if args.resume and args.run_dir is None:
+        parser.error("--resume needs --run_dir")
 
-    os.makedirs(args.out_dir, exist_ok=True)
-    run_dir = os.path.join(args.out_dir, f"reward_model-{int(time.time())}")
-    os.makedirs(run_dir, exist_ok=True)
+    # Under torchrun each process trains on its own shard over gloo
+    rank, world_size = setup_distributed(args.threads)
+    run_dir = shared_run_dir(args.out_dir, "reward_model", args.run_dir)
+    checkpoint_path = os.path.join(run_dir, "checkpoint.pt")
 
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
@@ -53,45 +202,94 @@ def main():
     optimizer = torch.optim.AdamW(model.parameters(), lr=args.lr)
     loss_fn = nn.BCEWithLogitsLoss()
 
-    prefs = load_preferences(args.prefs)
+    # Progress is counted in micro-batches of this process's shard, so a
+    # resumed run must keep the same process count and batch settings
+    layout = {"world_size": world_size, "batch_size": args.batch_size, "grad_accum": args.grad_accum,
+              "seed": args.seed}
+    start_epoch, start_batch, steps = 0, 0, 0
+    if args.resume:
+        checkpoint = load_checkpoint(checkpoint_path, model, optimizer)
+        if checkpoint is None:
+            raise FileNotFoundError(f"No checkpoint to resume from at {checkpoint_path}")
+        if checkpoint["layout"] != layout:
+            raise ValueError(f"Checkpoint was written with {checkpoint['layout']}, not {layout}")
+        start_epoch, start_batch, steps = checkpoint["epoch"], checkpoint["batch"], checkpoint["steps"]
+        if is_main_process():
+            print(f"Resuming from epoch {start_epoch}, batch {start_batch} ({steps} optimizer steps done)")
 
-    def batches(lst: List[Dict], n: int):
-        for i in range(0, len(lst), n):
-            yield lst[i:i + n]
+    # DataLoader workers fork after tokenization; they never tokenize, so skip the tokenizers warning
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    # Rank 0 tokenizes while the other processes wait, then they all map the cache
+    if not is_main_process():
+        barrier()
+    dataset = build_pair_dataset(args.prefs, tokenizer, args.max_length, args.cache_dir,
+                                 rebuild=args.rebuild_cache and is_main_process())
+    if is_main_process():
+        barrier()
+    lengths = dataset.data.column("length").to_pylist()
+    # Equal-sized shards keep every process on the same number of steps
+    shard = list(range(rank, len(dataset), world_size))[:len(dataset) // world_size]
+    collator = PairCollator(tokenizer, args.max_length)
+
+    train_model = DistributedDataParallel(model) if world_size > 1 else model
+    batches_per_epoch = (len(shard) + args.batch_size - 1) // args.batch_size
+    pairs = 0
+    started = time.time()
 
     model.train()
-    for _ in range(args.epochs):
-        for batch in batches(prefs, args.batch_size):
-            prompts = [b["prompt"] for b in batch]
-            chosen = [b["chosen"] for b in batch]
-            rejected = [b["rejected"] for b in batch]
+    for epoch in range(start_epoch, args.epochs):
+        first_batch = start_batch if epoch == start_epoch else 0
+        # Same order on every run for a given seed and epoch, so a resumed run can skip ahead
+        epoch_batches = bucketed_batches(shard, lengths, args.batch_size, args.seed + epoch * world_size + rank)
+        loader = DataLoader(dataset, batch_sampler=epoch_batches[first_batch:], collate_fn=collator,
+                            num_workers=args.num_workers)
+        for index, batch in enumerate(loader, start=first_batch):
+            batch = {key: value.to(device) for key, value in batch.items()}
 
-            # Build paired inputs: [prompt + response]
-            chosen_texts = [p + "\n" + c for p, c in zip(prompts, chosen)]
-            rejected_texts = [p + "\n" + r for p, r in zip(prompts, rejected)]
+            # Step after every grad_accum micro-batches and at the end of the epoch
+            group_start = index - index % args.grad_accum
+            group_size = min(args.grad_accum, batches_per_epoch - group_start)
+            step = index + 1 == group_start + group_size
 
-            tok_chosen = tokenizer(chosen_texts, padding=True, truncation=True, return_tensors="pt").to(device)
-            tok_rejected = tokenizer(rejected_texts, padding=True, truncation=True, return_tensors="pt").to(device)
+            # Gradients are only all-reduced on the micro-batch that steps
+            with nullcontext() if step or world_size == 1 else train_model.no_sync():
+                # Chosen and rejected sequences are scored in one stacked forward pass
+                score_chosen, score_rejected = train_model(**batch).chunk(2)
+
+                # Turn pairwise preference into binary labels by margin
+                margin = score_chosen - score_rejected
+                labels = torch.ones_like(margin)
+                loss = loss_fn(margin, labels) / group_size
+                loss.backward()
+            pairs += len(margin)
+            if not step:
+                continue
 
-            optimizer.zero_grad()
-            score_chosen = model(**tok_chosen)
-            score_rejected = model(**tok_rejected)
-
-            # Turn pairwise preference into binary labels by margin
-            margin = score_chosen - score_rejected
-            labels = torch.ones_like(margin)
-            loss = loss_fn(margin, labels)
-            loss.backward()
             optimizer.step()
+            optimizer.zero_grad()
+            steps += 1
+            end_of_epoch = index + 1 == batches_per_epoch
+            if is_main_process() and (steps % args.save_steps == 0 or end_of_epoch):
+                progress = (epoch + 1, 0) if end_of_epoch else (epoch, index + 1)
+                save_checkpoint(checkpoint_path, model, optimizer,
+                                {"epoch": progress[0], "batch": progress[1], "steps": steps, "layout": layout})
+
+    elapsed = time.time() - started
+    if is_main_process():
+        total = pairs * world_size
+        print(f"Trained on {total} preference pairs in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.1f} pairs/s, "
+              f"{world_size} process(es), effective batch {args.batch_size * args.grad_accum * world_size})")
 
-    # Save
-    model.eval()
-    torch.save(model.state_dict(), os.path.join(run_dir, "pytorch_model.bin"))
-    with open(os.path.join(run_dir, "config.json"), "w") as f:
-        json.dump({"base_encoder": args.base_encoder}, f)
+        # Save
+        model.eval()
+        torch.save(model.state_dict(), os.path.join(run_dir, "pytorch_model.bin"))
+        with open(os.path.join(run_dir, "config.json"), "w") as f:
+            json.dump({"base_encoder": args.base_encoder}, f)
 
-    print(f"Saved reward model to: {run_dir}")
+        print(f"Saved reward model to: {run_dir}")
+    barrier()
+    cleanup_distributed()
 
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
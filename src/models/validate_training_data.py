@@ -0,0 +1,128 @@
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import fastjsonschema
+
+from rlhf_prep_preferences import expand_inputs, ordered_map
+
+# (path, number of the chunk's first line, lines)
+Chunk = Tuple[str, int, List[str]]
+
+_validate = None
+
+
+def compile_schema(schema: Dict):
+    """Install the compiled validator for this process; run once per worker"""
+    global _validate
+    # fastjsonschema turns the schema into plain Python code, so each record costs one function call
+    _validate = fastjsonschema.compile(schema)
+
+
+def check_line(line: str) -> Optional[str]:
+    """Why a JSONL line is invalid, or None if it is valid"""
+    try:
+        record = json.loads(line)
+    except ValueError as e:
+        return f"invalid JSON: {e}"
+    try:
+        _validate(record)
+    except fastjsonschema.JsonSchemaValueException as e:
+        return e.message
+    return None
+
+
+def validate_chunk(chunk: Chunk) -> List[Tuple[int, str]]:
+    """(line number, error) for each invalid line of a chunk; blank lines are skipped"""
+    _, first_line, lines = chunk
+    errors = []
+    for offset, line in enumerate(lines):
+        if line.strip():
+            error = check_line(line)
+            if error is not None:
+                errors.append((first_line + offset, error))
+    return errors
+
+
+def read_chunks(paths: List[str], lines_per_chunk: int) -> Iterator[Chunk]:
+    # Chunks never span files, so line numbers stay per file
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as fin:
+            chunk: List[str] = []
+            first_line = 1
+            for line in fin:
+                chunk.append(line)
+                if len(chunk) >= lines_per_chunk:
+                    yield path, first_line, chunk
+                    first_line += len(chunk)
+                    chunk = []
+            if chunk:
+                yield path, first_line, chunk
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate training JSONL against the conversation schema.")
+    parser.add_argument("inputs", nargs="+", help="JSONL files or glob patterns")
+    parser.add_argument("--schema", type=str, default="models/training_data/schema.json")
+    parser.add_argument("--output", type=str, default=None, help="Write the valid lines to this file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Validation processes")
+    parser.add_argument("--chunk_lines", type=int, default=5000, help="Lines per unit of work")
+    parser.add_argument("--max_errors", type=int, default=100, help="Errors to print; all are counted")
+    args = parser.parse_args()
+
+    try:
+        paths = expand_inputs(args.inputs)
+    except FileNotFoundError as e:
+        parser.error(str(e))
+    with open(args.schema, "r", encoding="utf-8") as f:
+        schema = json.load(f)
+    # Fail on a broken schema here rather than in every worker
+    compile_schema(schema)
+
+    fout = None
+    tmp_path = None
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        tmp_path = f"{args.output}.tmp-{os.getpid()}"
+        fout = open(tmp_path, "w", encoding="utf-8")
+
+    lines = invalid = 0
+    started = time.time()
+    try:
+        chunks = read_chunks(paths, args.chunk_lines)
+        for (path, first_line, chunk), errors in ordered_map(validate_chunk, chunks, args.workers,
+                                                              initializer=compile_schema, initargs=(schema,)):
+            lines += len(chunk)
+            for line_number, error in errors:
+                invalid += 1
+                if invalid <= args.max_errors:
+                    print(f"{path}:{line_number}: {error}", file=sys.stderr)
+            if fout is not None:
+                bad = {line_number - first_line for line_number, _ in errors}
+                fout.writelines(line if line.endswith("\n") else line + "\n"
+                                for offset, line in enumerate(chunk) if offset not in bad and line.strip())
+        if fout is not None:
+            fout.close()
+            os.replace(tmp_path, args.output)
+    finally:
+        if fout is not None:
+            fout.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    elapsed = time.time() - started
+    if invalid > args.max_errors:
+        print(f"... {invalid - args.max_errors} more errors not shown", file=sys.stderr)
+    print(f"Checked {lines} lines in {len(paths)} file(s) in {elapsed:.1f}s "
+          f"({lines / max(elapsed, 1e-9):.0f} lines/s): {invalid} invalid")
+    if args.output:
+        print(f"Wrote the valid lines to {args.output}")
+    if invalid:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+Prosody analysis for recorded interview answers
+"""
+import logging
+import multiprocessing
+import os
+import struct
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RECORDINGS_DIR = os.environ.get("RECORDINGS_DIR", os.path.join(os.getcwd(), "recordings"))
+
+# Pause length histogram: one bucket per 100 ms, everything longer lands in the last bucket
+PAUSE_BUCKET_MS = 100
+PAUSE_BUCKETS = 100
+# Frames sampled across a file to estimate its noise floor before streaming
+NOISE_PROBE_FRAMES = 512
+
+# Worker processes shared by all analyze_many calls, started on first use
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+@dataclass
+class WavLayout:
+    """Location and encoding of the PCM payload inside a WAV file"""
+    data_offset: int
+    data_size: int
+    channels: int
+    sample_rate: int
+    dtype: str
+    scale: float
+    bias: float
+
+    @property
+    def num_frames(self) -> int:
+        return self.data_size // (np.dtype(self.dtype).itemsize * self.channels)
+
+
+def read_wav_layout(path: str) -> WavLayout:
+    """Parse the RIFF header without reading the sample data"""
+    with open(path, 'rb') as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+            raise ValueError(f"{path} is not a RIFF/WAVE file")
+
+        fmt = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                break
+            chunk_id, size = struct.unpack('<4sI', chunk)
+            if chunk_id == b'fmt ':
+                body = f.read(size)
+                audio_format, channels, sample_rate, _, _, bits = struct.unpack('<HHIIHH', body[:16])
+                if audio_format == 0xFFFE and size >= 26:
+                    # WAVE_FORMAT_EXTENSIBLE keeps the real format in the sub-format GUID
+                    audio_format = struct.unpack('<H', body[24:26])[0]
+                fmt = (audio_format, channels, sample_rate, bits)
+                if size & 1:
+                    f.seek(1, os.SEEK_CUR)
+            elif chunk_id == b'data':
+                if fmt is None:
+                    raise ValueError(f"{path} has a data chunk before its fmt chunk")
+                data_offset = f.tell()
+                file_size = os.fstat(f.fileno()).st_size
+                # Streamed writers often leave the size at 0 or 0xFFFFFFFF
+                if size == 0 or data_offset + size > file_size:
+                    size = file_size - data_offset
+                return _layout_for(fmt, data_offset, size)
+            else:
+                f.seek(size + (size & 1), os.SEEK_CUR)
+
+    raise ValueError(f"{path} has no data chunk")
+
+
+def _layout_for(fmt, data_offset: int, data_size: int) -> WavLayout:
+    audio_format, channels, sample_rate, bits = fmt
+    if audio_format == 1 and bits == 8:
+        dtype, scale, bias = 'u1', 1.0 / 128.0, -128.0
+    elif audio_format == 1 and bits == 16:
+        dtype, scale, bias = '<i2', 1.0 / 32768.0, 0.0
+    elif audio_format == 1 and bits == 32:
+        dtype, scale, bias = '<i4', 1.0 / 2147483648.0, 0.0
+    elif audio_format == 3 and bits == 32:
+        dtype, scale, bias = '<f4', 1.0, 0.0
+    elif audio_format == 3 and bits == 64:
+        dtype, scale, bias = '<f8', 1.0, 0.0
+    else:
+        raise ValueError(f"Unsupported WAV encoding (format={audio_format}, bits={bits})")
+    if channels < 1 or sample_rate < 1:
+        raise ValueError("WAV header has no channels or sample rate")
+    return WavLayout(data_offset, data_size, channels, sample_rate, dtype, scale, bias)
+
+
+def frame_levels_db(mono: np.ndarray, frame_len: int) -> np.ndarray:
+    """RMS level in dBFS of each complete frame in a mono float block"""
+    usable = (mono.size // frame_len) * frame_len
+    if usable == 0:
+        return np.empty(0, dtype=np.float64)
+    frames = mono[:usable].reshape(-1, frame_len)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return 20.0 * np.log10(np.maximum(rms, 1e-10))
+
+
+def _runs(mask: np.ndarray):
+    """Run-length encode a boolean array into (values, lengths)"""
+    change = np.flatnonzero(mask[1:] != mask[:-1]) + 1
+    starts = np.concatenate(([0], change))
+    lengths = np.diff(np.concatenate((starts, [mask.size])))
+    return mask[starts], lengths
+
+
+class _ProsodyState:
+    """Running statistics carried from one block of frames to the next"""
+
+    def __init__(self, frame_ms: int):
+        self.frame_ms = frame_ms
+        self.total_frames = 0
+        self.voiced_frames = 0
+        self.syllables = 0
+        self.threshold_db = 0.0
+        # Current (unfinished) voiced/unvoiced run
+        self.run_voiced = False
+        self.run_length = 0
+        self.seen_voice = False
+        self.first_voice_frame = -1
+        self.last_voice_frame = -1
+        # Completed pauses between speech
+        self.pause_histogram = np.zeros(PAUSE_BUCKETS, dtype=np.int64)
+        self.pause_frames = 0
+        # Welford accumulator over voiced frame levels
+        self.level_count = 0
+        self.level_mean = 0.0
+        self.level_m2 = 0.0
+        # Last frames of the previous block, needed for peak picking across block edges
+        self.tail_db = np.empty(0, dtype=np.float64)
+        self.tail_voiced = np.empty(0, dtype=bool)
+
+
+class ProsodyAnalyzer:
+    """Streaming prosody features from memory-mapped WAV recordings"""
+
+    def __init__(self, frame_ms: int = 20, block_frames: int = 4096,
+                 silence_threshold_db: float = -40.0, noise_margin_db: float = 12.0,
+                 min_pause_ms: int = 150, hesitation_max_ms: int = 1000,
+                 peak_prominence_db: float = 2.0):
+        self.frame_ms = frame_ms
+        self.block_frames = block_frames
+        self.silence_threshold_db = silence_threshold_db
+        self.noise_margin_db = noise_margin_db
+        self.min_pause_frames = max(1, min_pause_ms // frame_ms)
+        self.hesitation_max_frames = max(self.min_pause_frames, hesitation_max_ms // frame_ms)
+        self.peak_prominence_db = peak_prominence_db
+
+    def analyze_file(self, path: str, word_count: Optional[int] = None) -> Dict[str, Any]:
+        """Analyze a WAV file block by block; memory use does not depend on its length"""
+        layout = read_wav_layout(path)
+        frame_len = max(1, layout.sample_rate * self.frame_ms // 1000)
+        state = _ProsodyState(self.frame_ms)
+
+        num_frames = layout.num_frames
+        if num_frames:
+            samples = np.memmap(path, dtype=layout.dtype, mode='r', offset=layout.data_offset,
+                                shape=(num_frames * layout.channels,))
+            try:
+                state.threshold_db = self._voicing_threshold(samples, layout, frame_len)
+                block_len = frame_len * self.block_frames
+                for start in range(0, num_frames, block_len):
+                    end = min(start + block_len, num_frames)
+                    block = self._to_mono(samples[start * layout.channels:end * layout.channels], layout)
+                    self._update(state, frame_levels_db(block, frame_len))
+            finally:
+                del samples
+
+        return self._finalize(state, word_count)
+
+    @staticmethod
+    def _to_mono(raw: np.ndarray, layout: WavLayout) -> np.ndarray:
+        block = np.array(raw, dtype=np.float64)
+        if layout.channels > 1:
+            block = block.reshape(-1, layout.channels).mean(axis=1)
+        if layout.bias:
+            block += layout.bias
+        block *= layout.scale
+        return block
+
+    def _voicing_threshold(self, samples: np.ndarray, layout: WavLayout, frame_len: int) -> float:
+        """Estimate the noise floor from frames sampled evenly across the whole file"""
+        total = layout.num_frames // frame_len
+        if total == 0:
+            return self.silence_threshold_db
+        picks = np.unique(np.linspace(0, total - 1, num=min(total, NOISE_PROBE_FRAMES)).astype(np.int64))
+        levels = np.empty(picks.size, dtype=np.float64)
+        step = frame_len * layout.channels
+        for i, frame in enumerate(picks.tolist()):
+            block = self._to_mono(samples[frame * step:(frame + 1) * step], layout)
+            levels[i] = frame_levels_db(block, frame_len)[0]
+        noise_floor = float(np.percentile(levels, 10))
+        return max(self.silence_threshold_db, noise_floor + self.noise_margin_db)
+
+    def _update(self, state: _ProsodyState, levels: np.ndarray):
+        if levels.size == 0:
+            return
+
+        voiced = levels > state.threshold_db
+
+        self._update_runs(state, voiced)
+        self._update_peaks(state, levels, voiced)
+
+        voiced_levels = levels[voiced]
+        if voiced_levels.size:
+            # Chan et al. parallel merge of the block statistics into the running ones
+            n_b = voiced_levels.size
+            mean_b = float(voiced_levels.mean())
+            m2_b = float(((voiced_levels - mean_b) ** 2).sum())
+            n = state.level_count + n_b
+            delta = mean_b - state.level_mean
+            state.level_mean += delta * n_b / n
+            state.level_m2 += m2_b + delta * delta * state.level_count * n_b / n
+            state.level_count = n
+
+        state.total_frames += levels.size
+
+    def _update_runs(self, state: _ProsodyState, voiced: np.ndarray):
+        values, lengths = _runs(voiced)
+        position = state.total_frames
+        for value, length in zip(values.tolist(), lengths.tolist()):
+            if state.run_length and value == state.run_voiced:
+                state.run_length += length
+            else:
+                self._close_run(state)
+                state.run_voiced = value
+                state.run_length = length
+            position += length
+            if value:
+                if not state.seen_voice:
+                    state.seen_voice = True
+                    state.first_voice_frame = position - length
+                state.last_voice_frame = position - 1
+                state.voiced_frames += length
+
+    def _close_run(self, state: _ProsodyState):
+        """Record the finished run; only silence between two voiced runs counts as a pause"""
+        if state.run_length and not state.run_voiced and state.seen_voice:
+            if state.run_length >= self.min_pause_frames:
+                bucket = min(state.run_length * self.frame_ms // PAUSE_BUCKET_MS, PAUSE_BUCKETS - 1)
+                state.pause_histogram[bucket] += 1
+                state.pause_frames += state.run_length
+        state.run_length = 0
+
+    def _update_peaks(self, state: _ProsodyState, levels: np.ndarray, voiced: np.ndarray):
+        """Count syllable nuclei as prominent local level maxima over a +/-2 frame window"""
+        db = np.concatenate((state.tail_db, levels))
+        is_voiced = np.concatenate((state.tail_voiced, voiced))
+        state.tail_db = db[-4:]
+        state.tail_voiced = is_voiced[-4:]
+        if db.size < 5:
+            return
+
+        center = db[2:-2]
+        left = np.maximum(db[:-4], db[1:-3])
+        right = np.maximum(db[3:-1], db[4:])
+        floor = np.minimum(np.minimum(db[:-4], db[1:-3]), np.minimum(db[3:-1], db[4:]))
+        peaks = ((center > left) & (center >= right) & is_voiced[2:-2]
+                 & (center - floor >= self.peak_prominence_db))
+        state.syllables += int(np.count_nonzero(peaks))
+
+    def _finalize(self, state: _ProsodyState, word_count: Optional[int]) -> Dict[str, Any]:
+        # A trailing silent run is not a pause; a trailing voiced run needs no bookkeeping
+        state.run_length = 0
+
+        seconds_per_frame = self.frame_ms / 1000.0
+        duration = state.total_frames * seconds_per_frame
+        speech_sec = state.voiced_frames * seconds_per_frame
+        if state.seen_voice:
+            span_sec = (state.last_voice_frame - state.first_voice_frame + 1) * seconds_per_frame
+        else:
+            span_sec = 0.0
+
+        histogram = state.pause_histogram
+        pause_count = int(histogram.sum())
+        hesitation_buckets = min(self.hesitation_max_frames * self.frame_ms // PAUSE_BUCKET_MS, PAUSE_BUCKETS)
+        hesitation_count = int(histogram[:hesitation_buckets].sum())
+        pause_sec = state.pause_frames * seconds_per_frame
+        span_min = span_sec / 60.0 if span_sec else 0.0
+
+        if pause_count:
+            cumulative = np.cumsum(histogram)
+            p90_bucket = int(np.searchsorted(cumulative, 0.9 * pause_count))
+            p90_pause = (p90_bucket + 1) * PAUSE_BUCKET_MS / 1000.0
+        else:
+            p90_pause = 0.0
+
+        loudness_std = (state.level_m2 / state.level_count) ** 0.5 if state.level_count > 1 else 0.0
+
+        features = {
+            'duration_sec': round(duration, 3),
+            'speech_sec': round(speech_sec, 3),
+            'speaking_span_sec': round(span_sec, 3),
+            'speech_rate_sps': round(state.syllables / span_sec, 3) if span_sec else 0.0,
+            'articulation_rate_sps': round(state.syllables / speech_sec, 3) if speech_sec else 0.0,
+            'pause_ratio': round(pause_sec / span_sec, 4) if span_sec else 0.0,
+            'pause_count': pause_count,
+            'mean_pause_sec': round(pause_sec / pause_count, 3) if pause_count else 0.0,
+            'p90_pause_sec': round(p90_pause, 3),
+            'hesitation_count': hesitation_count,
+            'hesitation_rate_per_min': round(hesitation_count / span_min, 3) if span_min else 0.0,
+            'long_pause_count': pause_count - hesitation_count,
+            'loudness_mean_db': round(state.level_mean, 2),
+            'loudness_std_db': round(loudness_std, 2),
+            'loudness_stability': round(1.0 - min(loudness_std / 12.0, 1.0), 4) if state.level_count else 0.0,
+        }
+        if word_count is not None:
+            features['words_per_minute'] = round(word_count / span_min, 1) if span_min else 0.0
+        return features
+
+
+def _band(value: float, zero_lo: float, lo: float, hi: float, zero_hi: float) -> float:
+    """1.0 inside [lo, hi], falling linearly to 0.0 at zero_lo / zero_hi"""
+    if lo <= value <= hi:
+        return 1.0
+    if value < lo:
+        return max(0.0, (value - zero_lo) / (lo - zero_lo)) if lo > zero_lo else 0.0
+    return max(0.0, (zero_hi - value) / (zero_hi - hi)) if zero_hi > hi else 0.0
+
+
+def delivery_score(features: Dict[str, Any]) -> float:
+    """Map prosody features onto the 0-10 scale used by the text criteria"""
+    if not features.get('speech_sec'):
+        return 0.0
+
+    pace = _band(features.get('speech_rate_sps', 0.0), 1.5, 3.0, 5.5, 8.0)
+    pauses = _band(features.get('pause_ratio', 0.0), -1.0, 0.0, 0.35, 0.7)
+    hesitation = _band(features.get('hesitation_rate_per_min', 0.0), -1.0, 0.0, 6.0, 30.0)
+    stability = features.get('loudness_stability', 0.0)
+
+    return round(2.5 * (pace + pauses + hesitation + stability), 2)
+
+
+def resolve_recording_path(name: str, recordings_dir: Optional[str] = None) -> str:
+    """Resolve a recording name relative to RECORDINGS_DIR, refusing paths outside it"""
+    base = os.path.realpath(recordings_dir or RECORDINGS_DIR)
+    path = os.path.realpath(os.path.join(base, name))
+    if os.path.commonpath([base, path]) != base:
+        raise ValueError(f"Recording {name!r} is outside the recordings directory")
+    return path
+
+
+def _analyze_job(job):
+    settings, path, word_count = job
+    try:
+        return ProsodyAnalyzer(**settings).analyze_file(path, word_count)
+    except Exception as e:
+        return {'error': str(e)}
+
+
+def _analysis_pool(workers: int) -> ProcessPoolExecutor:
+    """The shared analysis pool; its size is fixed by the first call that needs it.
+
+    Workers are spawned rather than forked: the server process already runs
+    threads (logging, expiry, batching), and forking those is unsafe.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def shutdown_analysis_pool():
+    """Stop the shared worker processes; the next analyze_many starts new ones"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+def analyze_many(analyzer: ProsodyAnalyzer, paths: List[str],
+                 word_counts: Optional[List[Optional[int]]] = None,
+                 max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Analyze several recordings in the shared worker processes, preserving input order"""
+    global _pool
+    settings = {
+        'frame_ms': analyzer.frame_ms,
+        'block_frames': analyzer.block_frames,
+        'silence_threshold_db': analyzer.silence_threshold_db,
+        'noise_margin_db': analyzer.noise_margin_db,
+        'min_pause_ms': analyzer.min_pause_frames * analyzer.frame_ms,
+        'hesitation_max_ms': analyzer.hesitation_max_frames * analyzer.frame_ms,
+        'peak_prominence_db': analyzer.peak_prominence_db,
+    }
+    word_counts = word_counts or [None] * len(paths)
+    jobs = [(settings, path, count) for path, count in zip(paths, word_counts)]
+
+    if len(jobs) <= 1 or max_workers == 1:
+        return [_analyze_job(job) for job in jobs]
+
+    pool = _analysis_pool(max_workers or os.cpu_count() or 1)
+    try:
+        return list(pool.map(_analyze_job, jobs))
+    except BrokenProcessPool as e:
+        # A worker died (e.g. killed for memory); drop the pool and finish these jobs here
+        logger.error("Prosody worker pool failed, analyzing in process: %s", e)
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None
+        return [_analyze_job(job) for job in jobs]
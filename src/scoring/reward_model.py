@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Reward model inference for answer scoring
+
+Loads a reward model saved by ``src/models/rlhf_train_reward_model.py``
+(``pytorch_model.bin`` + ``config.json``) once per process and scores
+"question\\nanswer" texts with it. Concurrent callers are micro-batched:
+a worker thread waits up to ``max_wait_ms`` after the first queued text
+for more to arrive, then scores up to ``max_batch`` of them in one forward
+pass. Scores are cached by text hash.
+"""
+import hashlib
+import logging
+import math
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import List, Optional, Sequence, Tuple
+
+try:
+    import torch
+    from src.models.reward_network import load_reward_model, resolve_model_dir
+except ImportError:  # optional: the reward criterion is disabled without torch/transformers
+    torch = None
+
+from src.utils.config import config
+from src.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_TEXTS = metrics.counter('nishu_reward_model_texts', 'Texts scored by the reward model', ('source',))
+_BATCHES = metrics.counter('nishu_reward_model_batches', 'Reward model forward passes')
+_BATCH_SECONDS = metrics.histogram('nishu_reward_model_batch_seconds', 'Reward model forward pass time')
+_CACHE_HITS = _TEXTS.labels('cache')
+_MODEL_TEXTS = _TEXTS.labels('model')
+
+
+class RewardScorer:
+    """Scores texts with a trained reward model, batching concurrent requests.
+
+    `score` and `score_many` are thread-safe; they queue uncached texts for
+    the worker thread and block until their results are ready. Async
+    callers run them in a thread (the API uses `asyncio.to_thread`), which
+    is also what lets concurrent requests share a batch. The worker only
+    holds a batch open for the wait window while other callers are waiting
+    too, so a lone caller is never delayed. Raw rewards are mapped to
+    the 0-10 criterion scale with `10 * sigmoid((reward - offset) / scale)`.
+    """
+
+    def __init__(self, model_dir: str, max_batch: int = 8, max_wait_ms: float = 5.0, cache_size: int = 10000,
+                 max_length: int = 512, offset: float = 0.0, scale: float = 1.0, threads: Optional[int] = None):
+        if torch is None:
+            raise RuntimeError("The reward model scorer requires torch and transformers")
+        if threads:
+            torch.set_num_threads(threads)
+        self.model_dir = resolve_model_dir(model_dir)
+        self.model, self.tokenizer = load_reward_model(self.model_dir)
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_length = max_length
+        self.offset = offset
+        self.scale = scale
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[bytes, float]' = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._callers = 0
+        self._queue: 'queue.Queue' = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name='reward-model', daemon=True)
+        self._worker.start()
+        logger.info("Loaded reward model from %s", model_dir)
+
+    def score(self, text: str) -> float:
+        """Criterion score (0-10) for one text"""
+        return self.score_many([text])[0]
+
+    def score_many(self, texts: Sequence[str]) -> List[float]:
+        """Criterion scores for several texts; uncached ones are queued together"""
+        return [self._to_criterion(reward) for reward in self.rewards(texts)]
+
+    def rewards(self, texts: Sequence[str]) -> List[float]:
+        """Raw reward model outputs"""
+        keys = [hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest() for text in texts]
+        results: List[Optional[float]] = [None] * len(texts)
+        waiting: List[Tuple[int, bytes, Future]] = []
+        with self._cache_lock:
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    results[i] = cached
+        hits = sum(result is not None for result in results)
+        if hits:
+            _CACHE_HITS.inc(hits)
+        if hits == len(texts):
+            return results
+        with self._cache_lock:
+            self._callers += 1
+        try:
+            for i, key in enumerate(keys):
+                if results[i] is None:
+                    future = Future()
+                    self._queue.put((texts[i], future))
+                    waiting.append((i, key, future))
+            for i, key, future in waiting:
+                results[i] = future.result()
+        finally:
+            with self._cache_lock:
+                self._callers -= 1
+        if waiting:
+            with self._cache_lock:
+                for i, key, _ in waiting:
+                    self._cache[key] = results[i]
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return results
+
+    def _to_criterion(self, reward: float) -> float:
+        return 10.0 / (1.0 + math.exp(-(reward - self.offset) / self.scale))
+
+    def _run(self):
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                return
+            batch = [entry]
+            # Take what is already queued; wait out the window only if other callers may add more
+            deadline = time.perf_counter() + (self.max_wait if self._callers > 1 else 0.0)
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is None:
+                    self._queue.put(None)
+                    break
+                batch.append(entry)
+            self._score_batch(batch)
+
+    def _score_batch(self, batch: List[Tuple[str, Future]]):
+        try:
+            started = time.perf_counter()
+            inputs = self.tokenizer([text for text, _ in batch], padding=True, truncation=True,
+                                    max_length=self.max_length, return_tensors='pt')
+            with torch.inference_mode():
+                rewards = self.model(inputs['input_ids'], inputs['attention_mask']).tolist()
+            _BATCH_SECONDS.observe(time.perf_counter() - started)
+            _BATCHES.inc()
+            _MODEL_TEXTS.inc(len(batch))
+        except Exception as e:
+            logger.error("Reward model batch of %d failed: %s", len(batch), e)
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), reward in zip(batch, rewards):
+            future.set_result(reward)
+
+    def close(self):
+        """Score what is queued, then stop the worker"""
+        self._queue.put(None)
+        self._worker.join()
+
+
+def create_reward_scorer() -> Optional[RewardScorer]:
+    """Scorer configured by `scoring.reward_model`, or None when disabled or unavailable"""
+    reward_config = config.get('scoring.reward_model', {}) or {}
+    if not reward_config.get('enabled', False):
+        return None
+    if torch is None:
+        logger.warning("scoring.reward_model is enabled but torch/transformers are not installed")
+        return None
+    try:
+        return RewardScorer(
+            reward_config.get('model_dir', 'models/rlhf'),
+            max_batch=reward_config.get('max_batch', 8),
+            max_wait_ms=reward_config.get('max_wait_ms', 5.0),
+            cache_size=reward_config.get('cache_size', 10000),
+            max_length=reward_config.get('max_length', 512),
+            offset=reward_config.get('offset', 0.0),
+            scale=reward_config.get('scale', 1.0),
+            threads=reward_config.get('threads')
+        )
+    except Exception as e:
+        logger.error(f"Reward model criterion disabled: {e}")
+        return None
@@ -7,6 +7,11 @@ import re
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 
+from src.scoring.prosody import ProsodyAnalyzer, analyze_many, delivery_score, resolve_recording_path
+from src.scoring.reward_model import create_reward_scorer
+from src.utils.config import config
+from src.utils.metrics import timed
+
 logger = logging.getLogger(__name__)
 
 class VoiceInterviewScorer:
@@ -35,20 +40,80 @@ class VoiceInterviewScorer:
                 'indicators': ['excited', 'passionate', 'love', 'enjoy', 'interesting', 'fascinating', 'amazing', 'great', 'awesome', 'motivated']
             }
         }
+        
+        # Optional criteria only count towards the total when their input is available
+        delivery_config = config.get('scoring.delivery', {}) or {}
+        reward_config = config.get('scoring.reward_model', {}) or {}
+        self.optional_criteria = {
+            'delivery': {
+                'weight': delivery_config.get('weight', 0.15)
+            },
+            'reward_model': {
+                'weight': reward_config.get('weight', 0.2)
+            }
+        }
+        self.prosody_analyzer = ProsodyAnalyzer(
+            frame_ms=delivery_config.get('frame_ms', 20),
+            silence_threshold_db=delivery_config.get('silence_threshold_db', -40.0)
+        )
+        self.max_audio_workers = delivery_config.get('max_workers', 4)
+        # Trained reward model, when enabled; shared by all threads scoring answers
+        self.reward_scorer = create_reward_scorer()
     
-    def score_response(self, response_text: str, question_context: str = "") -> Dict[str, Any]:
-        """Score a candidate's response"""
+    @timed('scorer.analyze_recording')
+    def analyze_recording(self, recording: str, word_count: Optional[int] = None) -> Dict[str, Any]:
+        """Extract prosody features from a recording under RECORDINGS_DIR"""
+        try:
+            return self.prosody_analyzer.analyze_file(resolve_recording_path(recording), word_count)
+        except Exception as e:
+            logger.warning("Could not analyze recording %s: %s", recording, e)
+            return {'error': str(e)}
+    
+    @timed('scorer.score_response')
+    def score_response(self, response_text: str, question_context: str = "",
+                       recording: Optional[str] = None,
+                       prosody: Optional[Dict[str, Any]] = None,
+                       reward_score: Optional[float] = None, score_reward: bool = True) -> Dict[str, Any]:
+        """Score a candidate's response, including delivery when a recording is given
+        and the reward model's score when it is enabled.
+
+        Without `reward_score`, the reward model is asked here unless `score_reward`
+        is False (the caller already tried, e.g. in one batch for a session).
+        """
         try:
             response_lower = response_text.lower()
             
             # Calculate scores for each criterion
             scores = {}
             total_score = 0
+            total_weight = 0
             
-            for criterion, config in self.scoring_criteria.items():
-                score = self._calculate_criterion_score(response_lower, config)
+            for criterion, criterion_config in self.scoring_criteria.items():
+                score = self._calculate_criterion_score(response_lower, criterion_config)
                 scores[criterion] = score
-                total_score += score * config['weight']
+                total_score += score * criterion_config['weight']
+                total_weight += criterion_config['weight']
+            
+            # Delivery from the answer audio, if any
+            if prosody is None and recording:
+                prosody = self.analyze_recording(recording, len(response_text.split()))
+            if prosody and 'error' not in prosody:
+                weight = self.optional_criteria['delivery']['weight']
+                scores['delivery'] = delivery_score(prosody)
+                total_score += scores['delivery'] * weight
+                total_weight += weight
+            
+            # Reward model score of the answer to its question, if the model is loaded
+            if reward_score is None and score_reward and self.reward_scorer is not None:
+                reward_score = self._reward_scores([(question_context, response_text)])[0]
+            if reward_score is not None:
+                weight = self.optional_criteria['reward_model']['weight']
+                scores['reward_model'] = reward_score
+                total_score += reward_score * weight
+                total_weight += weight
+            
+            if total_weight:
+                total_score /= total_weight
             
             # Determine overall rating
             rating = self._get_rating(total_score)
@@ -56,7 +121,7 @@ class VoiceInterviewScorer:
             # Generate feedback
             feedback = self._generate_feedback(scores, response_text)
             
-            return {
+            result = {
                 'overall_score': round(total_score, 2),
                 'rating': rating,
                 'criterion_scores': scores,
@@ -65,6 +130,9 @@ class VoiceInterviewScorer:
                 'response_length': len(response_text),
                 'word_count': len(response_text.split())
             }
+            if prosody:
+                result['delivery_features'] = prosody
+            return result
             
         except Exception as e:
             logger.error(f"Error scoring response: {e}")
@@ -77,6 +145,28 @@ class VoiceInterviewScorer:
                 'error': str(e)
             }
     
+    def _reward_scores(self, pairs: List[tuple]) -> List[Optional[float]]:
+        """Reward model criterion scores for (question, answer) pairs; None for all if it fails"""
+        try:
+            # Same "prompt\nresponse" layout the reward model was trained on
+            return self.reward_scorer.score_many([f"{question}\n{answer}" for question, answer in pairs])
+        except Exception as e:
+            logger.warning("Reward model scoring failed: %s", e)
+            return [None] * len(pairs)
+    
+    @staticmethod
+    def _question_answer_pairs(conversation_history: List[Dict]) -> List[tuple]:
+        """Each non-empty candidate answer with the interviewer turn before it"""
+        pairs = []
+        question = ""
+        for turn in conversation_history:
+            if turn.get('type') == 'candidate':
+                if turn.get('content', '').strip():
+                    pairs.append((question, turn['content']))
+            else:
+                question = turn.get('content', '') or ''
+        return pairs
+    
     def _calculate_criterion_score(self, response_text: str, config: Dict) -> float:
         """Calculate score for a specific criterion"""
         keywords = config.get('keywords', [])
@@ -148,21 +238,56 @@ class VoiceInterviewScorer:
         else:
             feedback_parts.append("Consider sharing more specific project experiences.")
         
+        # Delivery feedback (only when a recording was scored)
+        if 'delivery' in scores:
+            if scores['delivery'] >= 7:
+                feedback_parts.append("Clear, well-paced delivery.")
+            elif scores['delivery'] >= 5:
+                feedback_parts.append("Steady delivery with some hesitation.")
+            else:
+                feedback_parts.append("Work on pacing and reducing long or frequent pauses.")
+        
         return " ".join(feedback_parts)
     
+    @timed('scorer.score_interview_session')
     def score_interview_session(self, conversation_history: List[Dict]) -> Dict[str, Any]:
         """Score an entire interview session"""
         try:
             all_scores = []
             total_responses = 0
             
-            for turn in conversation_history:
-                if turn.get('type') == 'candidate':
-                    response_text = turn.get('content', '')
-                    if response_text.strip():
-                        score_data = self.score_response(response_text)
-                        all_scores.append(score_data)
-                        total_responses += 1
+            candidate_turns = [
+                turn for turn in conversation_history
+                if turn.get('type') == 'candidate' and turn.get('content', '').strip()
+            ]
+            
+            # Analyze all answer recordings up front, in parallel
+            prosody_by_turn = {}
+            recorded = [i for i, turn in enumerate(candidate_turns) if turn.get('recording')]
+            if recorded:
+                paths, word_counts = [], []
+                for i in recorded:
+                    try:
+                        paths.append(resolve_recording_path(candidate_turns[i]['recording']))
+                    except ValueError as e:
+                        logger.warning("Skipping recording: %s", e)
+                        paths.append('')
+                    word_counts.append(len(candidate_turns[i]['content'].split()))
+                features = analyze_many(self.prosody_analyzer, paths, word_counts,
+                                        max_workers=self.max_audio_workers)
+                prosody_by_turn = dict(zip(recorded, features))
+            
+            # Reward model scores for all answers in one request, so they share forward passes.
+            # If that fails the criterion is left out for the session, not retried per answer
+            reward_scores = [None] * len(candidate_turns)
+            if self.reward_scorer is not None and candidate_turns:
+                reward_scores = self._reward_scores(self._question_answer_pairs(conversation_history))
+            
+            for i, turn in enumerate(candidate_turns):
+                score_data = self.score_response(turn['content'], prosody=prosody_by_turn.get(i),
+                                                 reward_score=reward_scores[i], score_reward=False)
+                all_scores.append(score_data)
+                total_responses += 1
             
             if not all_scores:
                 return {
@@ -180,6 +305,13 @@ class VoiceInterviewScorer:
                 criterion_scores = [score['criterion_scores'].get(criterion, 0) for score in all_scores]
                 avg_scores[criterion] = sum(criterion_scores) / len(criterion_scores) if criterion_scores else 0
             
+            # Optional criteria are averaged over the responses that have them
+            for criterion in self.optional_criteria.keys():
+                criterion_scores = [score['criterion_scores'][criterion] for score in all_scores
+                                    if criterion in score['criterion_scores']]
+                if criterion_scores:
+                    avg_scores[criterion] = sum(criterion_scores) / len(criterion_scores)
+            
             # Calculate overall session score
             session_score = sum(score['overall_score'] for score in all_scores) / len(all_scores)
             session_rating = self._get_rating(session_score)
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Streaming ingestion of candidate answer audio
+
+Raw PCM arrives in chunks (an HTTP chunked upload) and goes straight to a
+WAV file under RECORDINGS_DIR; nothing holds more than one chunk in
+memory. As it is written, an energy-based voice-activity detector splits
+the answer into utterances, and each finished utterance is handed to the
+configured transcription engine on a worker thread while the upload
+continues.
+"""
+import bisect
+import logging
+import os
+import struct
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.scoring.prosody import frame_levels_db
+from src.speech_interface.transcription import Transcriber, create_transcriber
+from src.utils.config import config
+from src.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Upload encoding -> (WAV format tag, bits per sample, numpy dtype, scale to [-1, 1])
+ENCODINGS = {
+    's16le': (1, 16, '<i2', 1.0 / 32768.0),
+    'f32le': (3, 32, '<f4', 1.0),
+}
+
+# Seconds of unvoiced frame levels the noise floor is estimated from
+NOISE_WINDOW_SEC = 10.0
+# Unvoiced time needed before the estimated floor replaces silence_threshold_db
+NOISE_MIN_SEC = 0.5
+# Uninterrupted voiced time after which a steady level is taken to be noise
+STEADY_SEC = 10.0
+
+_AUDIO_SECONDS = metrics.counter('nishu_audio_ingested_seconds', 'Seconds of answer audio received')
+_UTTERANCES = metrics.counter('nishu_audio_utterances', 'Utterances found by voice-activity detection')
+_TRANSCRIBE_SECONDS = metrics.histogram('nishu_transcription_seconds', 'Time to transcribe one utterance')
+
+
+def wav_header(encoding: str, channels: int, sample_rate: int, data_size: int = 0xFFFFFFFF) -> bytes:
+    """44-byte WAV header; the default sizes mark a stream still being written"""
+    format_tag, bits, _, _ = ENCODINGS[encoding]
+    block_align = channels * bits // 8
+    riff_size = min(data_size + 36, 0xFFFFFFFF)
+    return (struct.pack('<4sI4s', b'RIFF', riff_size, b'WAVE')
+            + struct.pack('<4sIHHIIHH', b'fmt ', 16, format_tag, channels, sample_rate,
+                          sample_rate * block_align, block_align, bits)
+            + struct.pack('<4sI', b'data', data_size))
+
+
+@dataclass
+class Utterance:
+    """One stretch of speech in an answer"""
+    start_sec: float
+    end_sec: float
+    transcript: Optional[str] = None
+
+
+class VoiceActivityDetector:
+    """Streaming energy VAD over fixed-length frames.
+
+    Each frame is voiced when its RMS level is above the threshold:
+    `silence_threshold_db`, or `noise_margin_db` above the noise floor when
+    that is higher. The floor is the 10th percentile of the levels of the
+    last NOISE_WINDOW_SEC of unvoiced frames, so speech never raises it;
+    until NOISE_MIN_SEC of them have been seen, `silence_threshold_db`
+    alone decides, so answers that open with speech keep their start.
+    Noise louder than the threshold would never be seen that way, so every
+    STEADY_SEC of uninterrupted voiced frames is checked: speech varies by
+    well over `noise_margin_db`, and a stretch whose levels stay within
+    half of it is noise. It becomes the floor, and an utterance that
+    opened inside it is dropped.
+
+    An utterance starts after `min_speech_ms` of voiced frames and ends
+    after `min_silence_ms` of silence, so short clicks and pauses between
+    words do not split it; utterances reaching `max_utterance_ms` are cut
+    there. Every decision is made frame by frame in stream order, so the
+    result does not depend on how the audio was chunked.
+    """
+
+    def __init__(self, sample_rate: int, frame_ms: int = 20, silence_threshold_db: float = -45.0,
+                 noise_margin_db: float = 10.0, min_speech_ms: int = 120, min_silence_ms: int = 600,
+                 max_utterance_ms: int = 30000):
+        self.frame_ms = frame_ms
+        self.frame_len = max(1, sample_rate * frame_ms // 1000)
+        self.silence_threshold_db = silence_threshold_db
+        self.noise_margin_db = noise_margin_db
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.min_silence_frames = max(1, min_silence_ms // frame_ms)
+        self.max_utterance_frames = max(1, max_utterance_ms // frame_ms)
+        self.frames = 0
+        self._threshold_db = silence_threshold_db
+        self._remainder = np.empty(0, dtype=np.float64)
+        self._window_frames = max(1, int(NOISE_WINDOW_SEC * 1000) // frame_ms)
+        self._min_noise_frames = max(1, int(NOISE_MIN_SEC * 1000) // frame_ms)
+        self._steady_frames = max(1, int(STEADY_SEC * 1000) // frame_ms)
+        # Unvoiced levels in arrival order and sorted, for a running percentile
+        self._noise: deque = deque()
+        self._noise_sorted: List[float] = []
+        # Levels of the voiced frames since the last unvoiced one or steadiness check
+        self._voiced_levels: List[float] = []
+        self._start: Optional[int] = None  # first frame of the open utterance
+        self._last_voiced = 0  # frame after the open utterance's last voiced frame
+        self._voiced_run = 0
+        self._voiced_start = 0
+        self._silent_run = 0
+
+    def _add_noise(self, level: float):
+        self._noise.append(level)
+        bisect.insort(self._noise_sorted, level)
+        if len(self._noise) > self._window_frames:
+            oldest = self._noise.popleft()
+            del self._noise_sorted[bisect.bisect_left(self._noise_sorted, oldest)]
+
+    def _update_threshold(self):
+        if len(self._noise_sorted) < self._min_noise_frames:
+            self._threshold_db = self.silence_threshold_db
+            return
+        floor = self._noise_sorted[len(self._noise_sorted) // 10]
+        self._threshold_db = max(self.silence_threshold_db, floor + self.noise_margin_db)
+
+    def _classify(self, level: float) -> bool:
+        if level <= self._threshold_db:
+            self._voiced_levels = []
+            self._add_noise(level)
+            self._update_threshold()
+            return False
+        self._voiced_levels.append(level)
+        if len(self._voiced_levels) < self._steady_frames:
+            return True
+        levels = sorted(self._voiced_levels)
+        self._voiced_levels = []
+        if levels[len(levels) * 9 // 10] - levels[len(levels) // 10] >= self.noise_margin_db / 2:
+            return True
+        # The room is louder than the threshold: this stretch is its noise
+        self._noise.clear()
+        self._noise_sorted = []
+        for noise_level in levels:
+            self._add_noise(noise_level)
+        self._update_threshold()
+        if self._start is not None and self._start > self.frames - len(levels):
+            self._start = None
+            self._voiced_run = 0
+        return level > self._threshold_db
+
+    def feed(self, mono: np.ndarray) -> List[Tuple[int, int]]:
+        """Add mono float samples; returns the utterances finished by them as (start, end) frames"""
+        if self._remainder.size:
+            mono = np.concatenate((self._remainder, mono))
+        usable = (mono.size // self.frame_len) * self.frame_len
+        self._remainder = mono[usable:].copy()
+        levels = frame_levels_db(mono[:usable], self.frame_len)
+
+        finished = []
+        for level in levels.tolist():
+            voiced = self._classify(level)
+            if self._start is None:
+                if voiced:
+                    if not self._voiced_run:
+                        self._voiced_start = self.frames
+                    self._voiced_run += 1
+                    if self._voiced_run >= self.min_speech_frames:
+                        self._start = self._voiced_start
+                        self._silent_run = 0
+                else:
+                    self._voiced_run = 0
+            elif voiced:
+                self._silent_run = 0
+            else:
+                self._silent_run += 1
+                if self._silent_run >= self.min_silence_frames:
+                    self._close(finished)
+            self.frames += 1
+            if voiced and self._start is not None:
+                self._last_voiced = self.frames
+            if self._start is not None and self.frames - self._start >= self.max_utterance_frames:
+                self._close(finished)
+                if voiced:
+                    # Still speaking: the next utterance picks up where this one was cut
+                    self._start = self._voiced_start = self._last_voiced = self.frames
+                    self._voiced_run = self.min_speech_frames
+        return finished
+
+    def finish(self) -> List[Tuple[int, int]]:
+        """Close the utterance still open at the end of the stream"""
+        finished = []
+        if self._start is not None:
+            self._close(finished)
+        return finished
+
+    def _close(self, finished: List[Tuple[int, int]]):
+        if self._last_voiced > self._start:
+            finished.append((self._start, self._last_voiced))
+        self._start = None
+        self._voiced_run = 0
+        self._silent_run = 0
+
+    def seconds(self, frame: int) -> float:
+        return round(frame * self.frame_ms / 1000.0, 3)
+
+
+class AudioStream:
+    """One answer being uploaded: appends PCM to its WAV file and segments it as it goes.
+
+    Not thread-safe; `write` calls must come one at a time, in order.
+    """
+
+    def __init__(self, path: str, sample_rate: int, channels: int, encoding: str,
+                 vad: VoiceActivityDetector, transcriber: Optional[Transcriber],
+                 executor: Optional[ThreadPoolExecutor]):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unsupported encoding {encoding!r}; expected one of {', '.join(ENCODINGS)}")
+        _, bits, dtype, scale = ENCODINGS[encoding]
+        self.path = path
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.encoding = encoding
+        self.vad = vad
+        self.transcriber = transcriber
+        self.executor = executor
+        self.dtype = np.dtype(dtype)
+        self.scale = scale
+        self.frame_bytes = channels * bits // 8
+        self.data_bytes = 0
+        self.utterances: List[Utterance] = []
+        self._pending = b''
+        self._transcripts: List[Tuple[Utterance, Future]] = []
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'wb')
+        self._file.write(wav_header(encoding, channels, sample_rate))
+
+    def write(self, chunk: bytes) -> List[Utterance]:
+        """Append a chunk of PCM; returns utterances that ended within it"""
+        if not chunk:
+            return []
+        self._file.write(chunk)
+        self.data_bytes += len(chunk)
+        # Chunks need not end on a sample boundary; the partial frame waits for the next one
+        data = self._pending + chunk if self._pending else chunk
+        usable = len(data) - len(data) % self.frame_bytes
+        self._pending = data[usable:]
+        samples = np.frombuffer(data[:usable], dtype=self.dtype).astype(np.float64)
+        if self.channels > 1:
+            samples = samples.reshape(-1, self.channels).mean(axis=1)
+        samples *= self.scale
+        _AUDIO_SECONDS.inc(samples.size / self.sample_rate)
+        return self._add(self.vad.feed(samples))
+
+    def _add(self, segments: List[Tuple[int, int]]) -> List[Utterance]:
+        added = []
+        if segments and self.transcriber is not None:
+            # Utterances are read back from the file by the transcription worker
+            self._file.flush()
+        for start, end in segments:
+            utterance = Utterance(self.vad.seconds(start), self.vad.seconds(end))
+            self.utterances.append(utterance)
+            added.append(utterance)
+            if self.transcriber is not None:
+                self._transcripts.append((utterance, self.executor.submit(
+                    self._transcribe, start * self.vad.frame_len, end * self.vad.frame_len)))
+        _UTTERANCES.inc(len(added))
+        return added
+
+    def _transcribe(self, first_sample: int, end_sample: int) -> str:
+        started = time.perf_counter()
+        audio = np.fromfile(self.path, dtype=self.dtype, count=(end_sample - first_sample) * self.channels,
+                            offset=44 + first_sample * self.frame_bytes)
+        audio = audio.astype(np.float32)
+        if self.channels > 1:
+            audio = audio.reshape(-1, self.channels).mean(axis=1)
+        audio *= self.scale
+        text = self.transcriber.transcribe(audio, self.sample_rate)
+        _TRANSCRIBE_SECONDS.observe(time.perf_counter() - started)
+        return text
+
+    def close(self) -> Dict[str, Any]:
+        """Finish the file and wait for outstanding transcriptions"""
+        self._add(self.vad.finish())
+        self._file.seek(0)
+        self._file.write(wav_header(self.encoding, self.channels, self.sample_rate, self.data_bytes))
+        self._file.close()
+        for utterance, future in self._transcripts:
+            try:
+                utterance.transcript = future.result()
+            except Exception as e:
+                logger.error(f"Transcribing {self.path} at {utterance.start_sec}s failed: {e}")
+        duration = self.data_bytes // self.frame_bytes / self.sample_rate
+        return {
+            'duration_sec': round(duration, 3),
+            'speech_sec': round(sum(u.end_sec - u.start_sec for u in self.utterances), 3),
+            'utterances': [{'start_sec': u.start_sec, 'end_sec': u.end_sec, 'transcript': u.transcript}
+                           for u in self.utterances],
+            'transcript': ' '.join(u.transcript.strip() for u in self.utterances if u.transcript and u.transcript.strip()),
+        }
+
+    def abort(self):
+        """Drop a failed upload and its file"""
+        for _, future in self._transcripts:
+            future.cancel()
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class AudioIngestor:
+    """Opens answer uploads with shared VAD settings, transcriber and transcription threads"""
+
+    def __init__(self, transcriber: Optional[Transcriber] = None, max_workers: int = 2, **vad_settings):
+        self.transcriber = transcriber
+        self.vad_settings = vad_settings
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='transcribe') \
+            if transcriber is not None else None
+
+    def open(self, path: str, sample_rate: int, channels: int = 1, encoding: str = 's16le') -> AudioStream:
+        vad = VoiceActivityDetector(sample_rate, **self.vad_settings)
+        return AudioStream(path, sample_rate, channels, encoding, vad, self.transcriber, self.executor)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+
+def create_audio_ingestor() -> AudioIngestor:
+    """Ingestor configured by `audio`"""
+    audio_config = config.get('audio', {}) or {}
+    transcription_config = audio_config.get('transcription', {}) or {}
+    return AudioIngestor(
+        transcriber=create_transcriber(),
+        max_workers=transcription_config.get('max_workers', 2),
+        frame_ms=audio_config.get('frame_ms', 20),
+        silence_threshold_db=audio_config.get('silence_threshold_db', -45.0),
+        noise_margin_db=audio_config.get('noise_margin_db', 10.0),
+        min_speech_ms=audio_config.get('min_speech_ms', 120),
+        min_silence_ms=audio_config.get('min_silence_ms', 600),
+        max_utterance_ms=audio_config.get('max_utterance_ms', 30000)
+    )
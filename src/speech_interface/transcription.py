@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Pluggable speech-to-text engines for server-side transcription
+
+An engine turns one utterance (mono float32 samples in [-1, 1]) into
+text. Engines are registered by name and selected with
+`audio.transcription.engine`; the built-in ``stub`` engine needs no model
+and returns an empty transcript, so the ingestion and scoring paths run
+end to end before a real recognizer is plugged in:
+
+    from src.speech_interface.transcription import Transcriber, register_transcriber
+
+    class WhisperTranscriber(Transcriber):
+        def transcribe(self, audio, sample_rate):
+            ...
+
+    register_transcriber('whisper', WhisperTranscriber)
+"""
+import logging
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from src.utils.config import config
+
+logger = logging.getLogger(__name__)
+
+
+class Transcriber:
+    """Speech-to-text engine; `transcribe` may be called from several threads at once"""
+
+    name = 'base'
+
+    def transcribe(self, audio: np.ndarray, sample_rate: int) -> str:
+        raise NotImplementedError
+
+
+class StubTranscriber(Transcriber):
+    """Local placeholder engine: no model, empty transcripts"""
+
+    name = 'stub'
+
+    def transcribe(self, audio: np.ndarray, sample_rate: int) -> str:
+        return ''
+
+
+_ENGINES: Dict[str, Callable[..., Transcriber]] = {'stub': StubTranscriber}
+
+
+def register_transcriber(name: str, factory: Callable[..., Transcriber]):
+    """Make an engine available as `audio.transcription.engine: <name>`; `options` become its keyword arguments"""
+    _ENGINES[name] = factory
+
+
+def create_transcriber() -> Optional[Transcriber]:
+    """Engine configured by `audio.transcription`, or None when disabled or unknown"""
+    transcription_config = config.get('audio.transcription', {}) or {}
+    name = transcription_config.get('engine', 'stub')
+    if not name:
+        return None
+    factory = _ENGINES.get(name)
+    if factory is None:
+        logger.error(f"Unknown transcription engine {name!r}; answers will not be transcribed")
+        return None
+    try:
+        return factory(**(transcription_config.get('options') or {}))
+    except Exception as e:
+        logger.error(f"Transcription engine {name!r} unavailable: {e}")
+        return None
@@ -9,6 +9,8 @@ from typing import Optional
 import pyttsx3
 import threading
 
+from src.utils.metrics import span, timed
+
 logger = logging.getLogger(__name__)
 
 class TTSModule:
@@ -77,6 +79,7 @@ class TTSModule:
             self.engine = None
             self.initialized = False
     
+    @timed('tts.speak')
     def speak(self, text: str) -> bool:
         """Convert text to speech with ultra-clean quality"""
         if not self.initialized or not self.engine:
@@ -94,9 +97,10 @@ class TTSModule:
             self._speaking = True
         
         try:
-            logger.info(f"Speaking: {clean_text[:50]}...")
-            self.engine.say(clean_text)
-            self.engine.runAndWait()
+            logger.info("Speaking: %.50s...", clean_text)
+            with span('tts.synthesis'):
+                self.engine.say(clean_text)
+                self.engine.runAndWait()
             return True
         except Exception as e:
             logger.error(f"Error in TTS: {e}")
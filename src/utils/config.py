@@ -49,17 +49,36 @@ class Config:
                     "sentence_transformer": "all-MiniLM-L6-v2"
                 }
             },
+            "session": {
+                "backend": "memory",
+                "shards": 64,
+                "journal": {
+                    "directory": "data/sessions",
+                    "fsync": "interval",
+                    "flush_interval": 0.05,
+                    "snapshot_every": 100000
+                },
+                "history": {
+                    "hot_items": 256,
+                    "spill_directory": "data/sessions/spill",
+                    "page_size": 100,
+                    "max_page_size": 1000
+                }
+            },
             "redis": {
                 "host": "localhost",
                 "port": 6379,
                 "db": 0,
-                "session_timeout": 3600
+                "session_timeout": 3600,
+                "expiry_grace": 300
             },
             "api": {
                 "host": "0.0.0.0",
                 "port": 8000,
                 "cors_origins": ["http://localhost:3000"],
-                "max_file_size": 10485760
+                "max_file_size": 10485760,
+                "gzip_minimum_size": 1024,
+                "gzip_level": 1
             },
             "tts": {
                 "default_method": "pyttsx3",
@@ -67,6 +86,18 @@ class Config:
                 "volume": 0.9,
                 "language": "en"
             },
+            "audio": {
+                "frame_ms": 20,
+                "silence_threshold_db": -45.0,
+                "noise_margin_db": 10.0,
+                "min_speech_ms": 120,
+                "min_silence_ms": 600,
+                "max_utterance_ms": 30000,
+                "transcription": {
+                    "engine": "stub",
+                    "max_workers": 2
+                }
+            },
             "interview": {
                 "max_questions": 15,
                 "initial_questions": 3,
@@ -79,10 +110,61 @@ class Config:
                     "closing"
                 ]
             },
+            "scoring": {
+                "delivery": {
+                    "weight": 0.15,
+                    "frame_ms": 20,
+                    "silence_threshold_db": -40.0,
+                    "max_workers": 4
+                },
+                "reward_model": {
+                    "enabled": False,
+                    "model_dir": "models/rlhf",
+                    "weight": 0.2,
+                    "max_batch": 8,
+                    "max_wait_ms": 5,
+                    "cache_size": 10000,
+                    "max_length": 512,
+                    "offset": 0.0,
+                    "scale": 1.0
+                }
+            },
+            "analytics": {
+                "archive": {
+                    "enabled": True,
+                    "directory": "data/archive",
+                    "batch_size": 500,
+                    "flush_interval": 30,
+                    "compression": "zstd"
+                },
+                "training_export": {
+                    "enabled": False,
+                    "path": "models/training_data/live_conversations.jsonl",
+                    "score": True,
+                    "batch_size": 100,
+                    "flush_interval": 30,
+                    "fsync": True,
+                    "dedup_window": 604800
+                }
+            },
+            "profiling": {
+                "sample_rate": 0.0,
+                "header": "X-Profile-Token",
+                "token": "",
+                "mode": "cprofile",
+                "directory": "data/profiles",
+                "max_profiles": 100
+            },
             "logging": {
                 "level": "INFO",
                 "format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-                "file": "logs/ai_interview_system.log"
+                "file": "logs/ai_interview_system.log",
+                "json": True,
+                "console_json": False,
+                "max_bytes": 10485760,
+                "backup_count": 5,
+                "queue_size": 10000,
+                "rate_limit_interval": 60
             }
         }
     
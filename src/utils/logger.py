@@ -1,25 +1,167 @@
 #!/usr/bin/env python3
 """
 Logging utility for the interview system
+
+Records are put on a bounded queue by the calling thread and written by a
+background listener, so file and console I/O never run on the request path.
 """
+import atexit
+import datetime
+import json
 import logging
+import logging.handlers
 import os
-from datetime import datetime
+import queue
+import sys
+import threading
+from typing import Dict, Optional, Tuple
+
+from src.utils.config import config
+from src.utils.metrics import metrics
+from src.utils.request_context import current
+
+# Attributes every LogRecord has; anything else came from `extra=` and is emitted as a field
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_DROPPED = metrics.counter('nishu_log_records_dropped', 'Log records dropped because the log queue was full')
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request and session ids, extras"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and value is not None:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps records with the request and session id of the request being handled"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = current()
+        record.request_id = context.get('request_id')
+        record.session_id = context.get('session_id')
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets a repeated warning through once per `interval` seconds.
+
+    Only records at exactly `level` are limited. Repeats are keyed by logger
+    and unformatted message, so a warning logged on every turn is written
+    once per interval, together with the number of repeats suppressed since
+    the last one written. Errors are never limited: distinct failures often
+    share a message template and differ only in their arguments.
+    """
+
+    def __init__(self, interval: float = 60.0, level: int = logging.WARNING, max_keys: int = 1024):
+        super().__init__()
+        self.interval = interval
+        self.level = level
+        self.max_keys = max_keys
+        self._last: Dict[Tuple[str, int, str], Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno != self.level or not self.interval:
+            return True
+        key = (record.name, record.levelno, str(record.msg))
+        with self._lock:
+            if key not in self._last and len(self._last) >= self.max_keys:
+                # Messages formatted before logging never repeat exactly; forget the stale ones
+                self._last = {k: v for k, v in self._last.items() if record.created - v[0] < self.interval}
+                if len(self._last) >= self.max_keys:
+                    self._last.clear()
+            last, suppressed = self._last.get(key, (0.0, 0))
+            if record.created - last < self.interval:
+                self._last[key] = (last, suppressed + 1)
+                return False
+            self._last[key] = (record.created, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Never blocks: records are dropped (and counted) when the queue is full"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Interpolate now, since args may change after the call returns; JSON
+        # encoding and I/O happen on the listener thread
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DROPPED.inc()
+
 
 def setup_logging():
-    """Setup logging configuration"""
-    
-    # Create logs directory if it doesn't exist
-    os.makedirs('logs', exist_ok=True)
-    
-    # Configure logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(f'logs/interview_system_{datetime.now().strftime("%Y%m%d")}.log'),
-            logging.StreamHandler()
-        ]
-    )
-    
+    """Setup logging configuration from the `logging` config block.
+
+    Safe to call more than once; later calls return without reconfiguring.
+    """
+    global _listener
+    if _listener is not None:
+        return logging.getLogger(__name__)
+
+    logging_config = config.get('logging', {}) or {}
+    level = getattr(logging, str(logging_config.get('level', 'INFO')).upper(), logging.INFO)
+    text_format = logging.Formatter(logging_config.get('format', '%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    handlers = []
+    log_file = logging_config.get('file')
+    if log_file:
+        os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=logging_config.get('max_bytes', 10 * 1024 * 1024),
+            backupCount=logging_config.get('backup_count', 5), encoding='utf-8')
+        file_handler.setFormatter(JsonFormatter() if logging_config.get('json', True) else text_format)
+        handlers.append(file_handler)
+    console = logging.StreamHandler(sys.stderr)
+    console.setFormatter(JsonFormatter() if logging_config.get('console_json', False) else text_format)
+    handlers.append(console)
+
+    queue_handler = _QueueHandler(queue.Queue(maxsize=logging_config.get('queue_size', 10000)))
+    queue_handler.addFilter(RateLimitFilter(logging_config.get('rate_limit_interval', 60)))
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
     return logging.getLogger(__name__)
+
+
+def shutdown_logging():
+    """Write out queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Low-overhead metrics with Prometheus text exposition
+"""
+import functools
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Seconds; spans from sub-millisecond session operations to multi-second TTS
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base for metrics with optional labels; one child per label-value tuple"""
+
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str):
+        """Child for these label values; resolve once and keep it on hot paths"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}_total{_labels(self.labelnames, values)} {_number(child.value)}"
+                for values, child in list(self._children.items())]
+
+
+class _GaugeChild:
+    __slots__ = ('value', 'function')
+
+    def __init__(self):
+        self.value = 0.0
+        self.function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float):
+        self.value = value
+
+    def set_function(self, function: Callable[[], float]):
+        """Read the value from `function` at scrape time instead"""
+        self.function = function
+
+    def get(self) -> float:
+        return self.function() if self.function is not None else self.value
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def set_function(self, function: Callable[[], float]):
+        self.labels().set_function(function)
+
+    def _samples(self) -> List[str]:
+        samples = []
+        for values, child in list(self._children.items()):
+            try:
+                value = child.get()
+            except Exception:
+                # A failing callback must not break the whole scrape
+                continue
+            samples.append(f"{self.name}{_labels(self.labelnames, values)} {_number(value)}")
+        return samples
+
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', '_lock')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self) -> '_Span':
+        return _Span(self)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _samples(self) -> List[str]:
+        samples = []
+        for values, child in list(self._children.items()):
+            with child._lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="%s"' % _number(bound)
+                samples.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}")
+            samples.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_number(total)}")
+            samples.append(f"{self.name}_count{_labels(self.labelnames, values)} {cumulative}")
+        return samples
+
+
+class _Span:
+    """Context manager recording its duration into a histogram child"""
+
+    __slots__ = ('child', 'started')
+
+    def __init__(self, child: _HistogramChild):
+        self.child = child
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.started)
+        return False
+
+
+class MetricsRegistry:
+    """Named metrics rendered together in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} already registered with a different type or labels")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+
+SPAN_SECONDS = metrics.histogram('nishu_span_seconds', 'Time spent in instrumented operations', ('span',))
+
+
+def span(name: str) -> _Span:
+    """Time a block: `with span('tts.speak'): ...`"""
+    return _Span(SPAN_SECONDS.labels(name))
+
+
+def timed(name: str):
+    """Decorator recording each call's duration under span `name`, including calls that raise"""
+    child = SPAN_SECONDS.labels(name)
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Opt-in per-request profiling, triggered by an admin header or by sampling
+"""
+import cProfile
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, Mapping, Optional
+
+try:
+    from pyinstrument import Profiler as SamplingProfiler
+except ImportError:  # optional: only needed for mode "sampling"
+    SamplingProfiler = None
+
+from src.utils.config import config
+
+logger = logging.getLogger(__name__)
+
+
+class _Profile:
+    """A running profile and why it was started"""
+
+    __slots__ = ('profiler', 'reason')
+
+    def __init__(self, profiler, reason: str):
+        self.profiler = profiler
+        self.reason = reason
+
+
+class RequestProfiler:
+    """Profiles selected requests and keeps the newest `max_profiles` on disk.
+
+    A request is profiled when it carries `header` with the configured token,
+    or with probability `sample_rate`. Only one request is profiled at a time
+    (others run unprofiled), and a profile covers everything the event loop
+    thread ran meanwhile, including interleaved requests.
+
+    Mode "cprofile" is deterministic and writes pstats files (`.prof`, open
+    with `python -m pstats` or snakeviz); mode "sampling" uses pyinstrument
+    and writes HTML. Each profile has a `.json` sidecar with the request id,
+    session id, endpoint, status and duration.
+    """
+
+    def __init__(self, directory: str, sample_rate: float = 0.0, token: Optional[str] = None,
+                 header: str = 'X-Profile-Token', max_profiles: int = 100, mode: str = 'cprofile'):
+        if mode not in ('cprofile', 'sampling'):
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        if mode == 'sampling' and SamplingProfiler is None:
+            raise RuntimeError("Profiling mode 'sampling' requires pyinstrument")
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.token = token or None
+        self.header = header.lower()
+        self.max_profiles = max_profiles
+        self.mode = mode
+        self._busy = threading.Lock()
+        self._prune_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self, headers: Mapping[str, str]) -> Optional[_Profile]:
+        """Begin profiling this request if it is selected; None otherwise"""
+        reason = None
+        if self.token is not None:
+            supplied = headers.get(self.header)
+            if supplied is not None and hmac.compare_digest(supplied.encode('utf-8'), self.token.encode('utf-8')):
+                reason = 'header'
+        if reason is None and self.sample_rate and random.random() < self.sample_rate:
+            reason = 'sample'
+        if reason is None or not self._busy.acquire(blocking=False):
+            return None
+        try:
+            if self.mode == 'sampling':
+                profiler = SamplingProfiler(async_mode='disabled')
+                profiler.start()
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+        except Exception as e:
+            # e.g. another profiler is already attached to this thread
+            self._busy.release()
+            logger.warning(f"Could not start request profiler: {e}")
+            return None
+        return _Profile(profiler, reason)
+
+    def stop(self, profile: _Profile):
+        """Stop profiling; call from the thread that started it"""
+        try:
+            if self.mode == 'sampling':
+                profile.profiler.stop()
+            else:
+                profile.profiler.disable()
+        finally:
+            self._busy.release()
+
+    def save(self, profile: _Profile, info: Dict[str, Any]):
+        """Write a stopped profile and its metadata, then drop the oldest beyond the cap"""
+        endpoint = re.sub(r'[^A-Za-z0-9]+', '-', info.get('endpoint') or 'unmatched').strip('-') or 'root'
+        now = time.time()
+        stamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime(now)) + f"{int(now % 1 * 1000):03d}"
+        stem = os.path.join(self.directory, f"{stamp}-{endpoint}-{info.get('request_id', '')}")
+        try:
+            if self.mode == 'sampling':
+                with open(stem + '.html', 'w', encoding='utf-8') as f:
+                    f.write(profile.profiler.output_html())
+            else:
+                profile.profiler.dump_stats(stem + '.prof')
+            with open(stem + '.json', 'w', encoding='utf-8') as f:
+                json.dump(dict(info, mode=self.mode, reason=profile.reason), f, indent=2)
+            self._prune()
+        except OSError as e:
+            logger.error(f"Could not write request profile {stem}: {e}")
+
+    def _prune(self):
+        with self._prune_lock:
+            # Names start with a timestamp, so they sort oldest first
+            stems = sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith('.json'))
+            for stem in stems[:max(0, len(stems) - self.max_profiles)]:
+                for suffix in ('.json', '.prof', '.html'):
+                    try:
+                        os.remove(os.path.join(self.directory, stem + suffix))
+                    except FileNotFoundError:
+                        pass
+
+
+def create_request_profiler() -> Optional[RequestProfiler]:
+    """Profiler configured by `profiling` (token from PROFILE_TOKEN); None when nothing can trigger it"""
+    profiling_config = config.get('profiling', {}) or {}
+    token = os.environ.get('PROFILE_TOKEN', profiling_config.get('token'))
+    sample_rate = float(profiling_config.get('sample_rate', 0.0) or 0.0)
+    if not token and not sample_rate:
+        return None
+    try:
+        return RequestProfiler(
+            profiling_config.get('directory', 'data/profiles'),
+            sample_rate=sample_rate,
+            token=token,
+            header=profiling_config.get('header', 'X-Profile-Token'),
+            max_profiles=profiling_config.get('max_profiles', 100),
+            mode=profiling_config.get('mode', 'cprofile')
+        )
+    except (OSError, ValueError, RuntimeError) as e:
+        logger.error(f"Request profiling disabled: {e}")
+        return None
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Per-request context (request id, session id) shared by middleware and handlers
+"""
+import contextvars
+from typing import Any, Dict, Optional
+
+_context: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar('request_context', default=None)
+
+
+def begin_request(**fields) -> contextvars.Token:
+    """Start a context for the current request; pass the token to end_request"""
+    return _context.set(dict(fields))
+
+
+def end_request(token: contextvars.Token):
+    _context.reset(token)
+
+
+def current() -> Dict[str, Any]:
+    """Fields of the current request, or an empty dict outside of one"""
+    return _context.get() or {}
+
+
+def bind(**fields):
+    """Add fields to the current request's context.
+
+    The context dict is shared rather than copied, so fields bound inside a
+    handler are visible to the middleware that began the request even when
+    the handler runs in a child task.
+    """
+    context = _context.get()
+    if context is not None:
+        context.update(fields)
@@ -0,0 +1,174 @@
+"""
+RedisSessionBackend against the in-process Redis stand-in
+
+    python -m pytest tests
+"""
+import time
+
+from src.core.inprocess_redis import InProcessRedis
+from src.core.session_backends import RedisSessionBackend
+from src.core.session_expiry import SessionExpiryScheduler
+from src.core.session_record import LIST_FIELDS
+
+TIMEOUT = 60
+
+
+def make_backend() -> RedisSessionBackend:
+    return RedisSessionBackend(InProcessRedis(), session_timeout=TIMEOUT, expiry_grace=30)
+
+
+def new_session(session_id: str, now: float) -> dict:
+    return {
+        'session_id': session_id,
+        'data': {'candidate_name': 'Candidate', 'position_applied': 'Software Engineer'},
+        'created_at': now,
+        'last_activity': now,
+        'questions_asked': [{'question': 'Tell me about yourself.', 'timestamp': now}],
+        'responses_received': [],
+        'conversation_history': []
+    }
+
+
+def exchange(answer: str, now: float) -> dict:
+    return {
+        'conversation_history': [{'type': 'candidate', 'content': answer, 'timestamp': now},
+                                 {'type': 'ai', 'content': 'Tell me more.', 'timestamp': now}],
+        'responses_received': [{'message': answer, 'timestamp': now}]
+    }
+
+
+def test_create_and_get():
+    backend = make_backend()
+    now = time.time()
+    backend.create('s1', new_session('s1', now))
+
+    session = backend.get('s1')
+    assert session['data']['candidate_name'] == 'Candidate'
+    assert session['questions_asked'] == [{'question': 'Tell me about yourself.', 'timestamp': now}]
+    assert session['conversation_history'] == []
+    assert backend.exists('s1')
+    assert backend.version('s1') == (0, now)
+    assert backend.count() == 1
+
+
+def test_append_adds_items_and_refreshes_ttl():
+    backend = make_backend()
+    now = time.time()
+    backend.create('s1', new_session('s1', now))
+
+    assert backend.append('s1', exchange('I built an API', now + 1), now + 1)
+    assert backend.append('s1', exchange('I fixed a leak', now + 2), now + 2)
+
+    session = backend.get('s1')
+    assert [turn['content'] for turn in session['conversation_history']] == \
+        ['I built an API', 'Tell me more.', 'I fixed a leak', 'Tell me more.']
+    assert backend.get_range('s1', 'conversation_history', 2, 3)[0]['content'] == 'I fixed a leak'
+    assert backend.version('s1') == (2, now + 2)
+    for key in backend._all_keys('s1'):
+        if backend.client.exists(key):
+            assert backend.client.ttl(key) == TIMEOUT + 30
+
+
+def test_append_to_missing_session_creates_nothing():
+    backend = make_backend()
+    now = time.time()
+
+    assert not backend.append('missing', exchange('hello', now), now)
+    assert backend.client.keys('*') == []
+    assert backend.get('missing') is None
+    assert backend.count() == 0
+
+
+def test_append_to_expired_session_creates_nothing():
+    backend = make_backend()
+    now = time.time()
+    backend.create('s1', new_session('s1', now))
+    for key in backend._all_keys('s1'):
+        backend.client.expire(key, 0)
+
+    assert not backend.append('s1', exchange('hello', now), now)
+    assert backend.get('s1') is None
+    assert backend.client.keys(backend._meta_key('s1') + '*') == []
+
+
+def test_append_to_session_removed_just_before_the_write_creates_nothing():
+    backend = make_backend()
+    now = time.time()
+    backend.create('s1', new_session('s1', now))
+    write = backend._write_script
+
+    def expire_then_write(keys, args):
+        # Another worker expires the session right before this write reaches Redis
+        backend.client.delete(*backend._all_keys('s1'))
+        return write(keys=keys, args=args)
+
+    backend._write_script = expire_then_write
+    assert not backend.append('s1', exchange('hello', now), now)
+    assert backend.client.keys(backend._meta_key('s1') + '*') == []
+
+
+def test_update():
+    backend = make_backend()
+    now = time.time()
+    backend.create('s1', new_session('s1', now))
+
+    assert backend.update('s1', {'status': 'completed', 'questions_asked': []}, now + 5)
+    session = backend.get('s1')
+    assert session['status'] == 'completed'
+    assert session['questions_asked'] == []
+    assert backend.version('s1') == (1, now + 5)
+
+    assert not backend.update('missing', {'status': 'completed'}, now)
+    assert backend.client.keys(backend._meta_key('missing') + '*') == []
+
+
+def test_pop_expired():
+    backend = make_backend()
+    now = time.time()
+    backend.create('s1', new_session('s1', now))
+    backend.append('s1', exchange('I built an API', now), now)
+
+    # Still inside the timeout
+    assert backend.pop_expired('s1', now + TIMEOUT - 1, TIMEOUT) is None
+    assert backend.exists('s1')
+
+    session = backend.pop_expired('s1', now + TIMEOUT + 1, TIMEOUT)
+    assert session['conversation_history'][0]['content'] == 'I built an API'
+    assert not backend.exists('s1')
+    assert all(not backend.client.exists(key) for key in backend._all_keys('s1'))
+    assert backend.pop_expired('s1', now + TIMEOUT + 1, TIMEOUT) is None
+
+
+def test_expired_session_is_popped_once():
+    backend = make_backend()
+    now = time.time()
+    backend.create('s1', new_session('s1', now))
+    first, second = (SessionExpiryScheduler(backend, TIMEOUT) for _ in range(2))
+    expired = []
+    for scheduler in (first, second):
+        # Two workers whose heaps both hold the session
+        scheduler.add_hook(lambda session_id, session: expired.append(session))
+        scheduler.schedule('s1', now)
+
+    first.run_due(now + TIMEOUT + 1)
+    second.run_due(now + TIMEOUT + 1)
+    assert [session is not None for session in expired] == [True, False]
+    assert not backend.append('s1', exchange('too late', now + TIMEOUT + 2), now + TIMEOUT + 2)
+    assert backend.count() == 0
+
+
+def test_expiry_hooks_receive_redis_sessions():
+    backend = make_backend()
+    scheduler = SessionExpiryScheduler(backend, TIMEOUT)
+    expired = []
+    scheduler.add_hook(lambda session_id, session: expired.append((session_id, session)))
+    now = time.time()
+    for session_id in ('s1', 's2'):
+        backend.create(session_id, new_session(session_id, now))
+        scheduler.schedule(session_id, now)
+    backend.append('s2', exchange('still here', now + 30), now + 30)
+
+    assert scheduler.run_due(now + TIMEOUT + 1) == ['s1']
+    assert expired[0][0] == 's1'
+    assert set(LIST_FIELDS) <= set(expired[0][1])
+    assert backend.exists('s2')
@@ -0,0 +1,68 @@
+"""
+TrainingDataExporter fed by the expiry scheduler
+
+    python -m pytest tests
+"""
+import json
+
+from src.analytics.training_export import TrainingDataExporter
+from src.core.session_backends import InMemorySessionBackend
+from src.core.session_expiry import SessionExpiryScheduler
+
+TIMEOUT = 60
+
+
+def new_session(session_id: str, now: float) -> dict:
+    return {
+        'session_id': session_id,
+        'data': {'position_applied': 'Software Engineer'},
+        'created_at': now,
+        'last_activity': now,
+        'questions_asked': [],
+        'responses_received': [],
+        'conversation_history': [{'type': 'ai', 'content': 'Tell me about yourself.', 'timestamp': now},
+                                 {'type': 'candidate', 'content': f'I am {session_id}.', 'timestamp': now}]
+    }
+
+
+def exported_ids(path) -> list:
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line)['id'] for line in f]
+
+
+def test_sessions_expiring_out_of_order_are_all_exported(tmp_path):
+    backend = InMemorySessionBackend()
+    scheduler = SessionExpiryScheduler(backend, TIMEOUT)
+    exporter = TrainingDataExporter(str(tmp_path / 'live.jsonl'), fsync=False)
+    scheduler.add_hook(exporter.export_session)
+
+    # X's heap entry still carries its creation time, so it expires before Y
+    backend.create('X', new_session('X', 100.0))
+    scheduler.schedule('X', 100.0)
+    backend.append('X', {'responses_received': [{'message': 'more', 'timestamp': 200.0}]}, 200.0)
+    backend.create('Y', new_session('Y', 150.0))
+    scheduler.schedule('Y', 150.0)
+
+    assert scheduler.run_due(now=1000.0) == ['X', 'Y']
+    exporter.close()
+
+    assert exporter.skipped == 0
+    assert sorted(exported_ids(exporter.path)) == ['X', 'Y']
+
+
+def test_redelivered_sessions_are_skipped_after_restart(tmp_path):
+    path = str(tmp_path / 'live.jsonl')
+    exporter = TrainingDataExporter(path, fsync=False)
+    for session_id, last_activity in (('B', 200.0), ('A', 100.0)):
+        exporter.export_session(session_id, new_session(session_id, last_activity))
+    exporter.close()
+
+    # Replayed after a restart, plus one session touched again since
+    exporter = TrainingDataExporter(path, fsync=False)
+    exporter.export_session('A', new_session('A', 100.0))
+    exporter.export_session('B', new_session('B', 300.0))
+    exporter.export_session('C', new_session('C', 50.0))
+    exporter.close()
+
+    assert exporter.skipped == 1
+    assert exported_ids(path) == ['B', 'A', 'B', 'C']